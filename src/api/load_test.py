@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import subprocess
+import sys
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+DEFAULT_PATHS = [
+    "/metrics?window=12",
+    "/components?window=all",
+    "/summary?window=6",
+]
+
+# Hammer the server from one keep-alive connection until the deadline
+def _worker(host: str, port: int, paths: list[str], deadline: float, use_etag: bool,
+            latencies: list[float], errors: list[int]) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags: dict[str, str] = {}
+    i = 0
+
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        headers = {"Accept-Encoding": "gzip"}
+        if use_etag and path in etags:
+            headers["If-None-Match"] = etags[path]
+
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+
+        latencies.append(time.perf_counter() - started)
+        if resp.status == 200 and resp.getheader("ETag"):
+            etags[path] = resp.getheader("ETag")
+        elif resp.status not in (200, 304):
+            errors.append(1)
+
+    conn.close()
+
+# Start the API in a subprocess pinned to a single CPU (where supported)
+def _spawn_server(port: int) -> subprocess.Popen:
+    def pin_to_one_core() -> None:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "src.api.server", "--port", str(port), "--quiet"],
+        cwd=project_root,
+        preexec_fn=pin_to_one_core if os.name == "posix" else None,
+    )
+
+    # Wait until it accepts connections
+    for _ in range(200):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+
+    proc.kill()
+    raise RuntimeError("API server did not start")
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(int(len(sorted_values) * pct), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the metrics API.")
+    parser.add_argument("--url", default=None, help="Target an already running server instead of spawning one")
+    parser.add_argument("--port", type=int, default=8599, help="Port for the spawned server")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--etag", action="store_true", help="Send If-None-Match (measures 304 path)")
+    args = parser.parse_args(argv)
+
+    proc = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        proc = _spawn_server(port)
+        print(f"Spawned server on port {port} (pinned to one core)")
+
+    try:
+        latencies: list[float] = []
+        errors: list[int] = []
+        deadline = time.perf_counter() + args.duration
+
+        threads = [
+            threading.Thread(
+                target=_worker,
+                args=(host, port, DEFAULT_PATHS, deadline, args.etag, latencies, errors),
+            )
+            for _ in range(args.connections)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    latencies.sort()
+    print(f"Requests:    {len(latencies)} in {elapsed:.1f}s ({len(errors)} errors)")
+    print(f"Throughput:  {len(latencies) / elapsed:,.0f} req/s")
+    print(f"Latency p50: {_percentile(latencies, 0.50) * 1000:.2f} ms")
+    print(f"Latency p99: {_percentile(latencies, 0.99) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
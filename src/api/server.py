@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import re
+import sys
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset, get_dataset, list_datasets, load_env
+from src.data_version import read_data_version
+from src.metrics.core import COMPONENT_COLUMNS, METRIC_OPTIONS, WINDOW_OPTIONS, compute_metrics, load_metric_anomalies
+
+# Columns served by /components
+COMPONENT_RESPONSE_COLUMNS = [*COMPONENT_COLUMNS.values(), "net_new_mrr"]
+
+# Short window names accepted in ?window= (labels from WINDOW_OPTIONS work too)
+WINDOW_ALIASES = {"6": "Last 6 months", "12": "Last 12 months", "24": "Last 24 months", "all": "All"}
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 512
+
+# Settings below may come from .env
+load_env()
+
+# Longest an /explain request waits for the shared LLM gateway (queue + generation)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+
+# Entity tags in an If-None-Match header: "*" or a list of (optionally weak) quoted tags
+_ETAG_RE = re.compile(r'\*|(?:W/)?"([^"]*)"')
+
+# Weak comparison (as If-None-Match requires): the W/ prefix is ignored, opaque tags must be equal
+def etag_matches(header: str, etag: str) -> bool:
+    opaque = etag.removeprefix("W/").strip('"')
+    return any(m.group(0) == "*" or m.group(1) == opaque for m in _ETAG_RE.finditer(header))
+
+# Error surfaced to the client as a JSON response
+class ApiError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# Pre-serialized response body with its ETag and gzip variant
+@dataclass(frozen=True)
+class Payload:
+    body: bytes
+    gzipped: bytes | None
+    etag: str
+
+    @classmethod
+    def from_obj(cls, obj, version: str) -> "Payload":
+        body = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        digest = hashlib.sha1(body).hexdigest()[:12]
+        return cls(body=body, gzipped=gzipped, etag=f'"{version}-{digest}"')
+
+# JSON-safe float (NaN/inf -> null)
+def _num(value) -> float | None:
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+# Plain-Python rows, converted once at build time
+def _records(df: pd.DataFrame, columns: list[str]) -> list[dict]:
+    month = df["month"].astype(str).tolist()
+    values = {col: [_num(v) for v in df[col].tolist()] for col in columns}
+    return [
+        {"month": m, **{col: values[col][i] for col in columns}}
+        for i, m in enumerate(month)
+    ]
+
+# Current/MoM/best/worst for each metric in a window
+def _window_summary(window_df: pd.DataFrame, start: str, end: str) -> dict:
+    metrics = {}
+    months = window_df["month"].astype(str).tolist()
+
+    for col in METRIC_OPTIONS.values():
+        series = window_df[col].astype(float).fillna(0.0).to_numpy()
+        current = float(series[-1])
+        prev = float(series[-2]) if len(series) >= 2 else current
+        metrics[col] = {
+            "start": _num(series[0]),
+            "current": _num(current),
+            "change_over_window": _num(current - series[0]),
+            "mom_change": _num(current - prev),
+            "mom_pct": _num((current - prev) / prev) if prev != 0 else 0.0,
+            "best_month": months[int(series.argmax())],
+            "worst_month": months[int(series.argmin())],
+        }
+
+    return {"start_month": start, "end_month": end, "metrics": metrics}
+
+# All precomputed responses for one dataset at one data version
+@dataclass
+class DatasetSnapshot:
+    version: str
+    metrics_df: pd.DataFrame
+    anomalies_df: pd.DataFrame
+    payloads: dict[tuple[str, str], Payload]
+    checked_at: float
+
+def build_snapshot(dataset: Dataset, version: str) -> DatasetSnapshot:
+    metrics_df = compute_metrics(dataset).reset_index(drop=True)
+    metric_cols = list(METRIC_OPTIONS.values())
+    payloads = {}
+
+    for label, n_months in WINDOW_OPTIONS.items():
+        window_df = metrics_df if n_months is None else metrics_df.tail(n_months)
+        start = str(window_df["month"].iloc[0])
+        end = str(window_df["month"].iloc[-1])
+        meta = {"dataset": dataset.name, "data_version": version, "window": label}
+
+        payloads[("/metrics", label)] = Payload.from_obj(
+            {**meta, "rows": _records(window_df, metric_cols)}, version
+        )
+        payloads[("/components", label)] = Payload.from_obj(
+            {**meta, "rows": _records(window_df, COMPONENT_RESPONSE_COLUMNS)}, version
+        )
+        payloads[("/summary", label)] = Payload.from_obj(
+            {**meta, **_window_summary(window_df, start, end)}, version
+        )
+
+    return DatasetSnapshot(version, metrics_df, load_metric_anomalies(dataset), payloads, time.monotonic())
+
+# In-memory snapshots per dataset, refreshed when the data version changes
+class MetricsStore:
+    def __init__(self, refresh_seconds: float = 5.0) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._snapshots: dict[str, DatasetSnapshot] = {}
+        self._lock = threading.Lock()
+        self._llm_client = None
+
+    # Snapshot for a dataset; the version is re-checked at most every refresh_seconds
+    def snapshot(self, dataset_name: str | None) -> DatasetSnapshot:
+        try:
+            dataset = get_dataset(dataset_name)
+        except ValueError as e:
+            raise ApiError(400, str(e)) from None
+
+        snapshot = self._snapshots.get(dataset.name)
+        now = time.monotonic()
+        if snapshot is not None and now - snapshot.checked_at < self.refresh_seconds:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(dataset.name)
+            if snapshot is not None and now - snapshot.checked_at < self.refresh_seconds:
+                return snapshot
+
+            if not dataset.processed_dir.is_dir():
+                raise ApiError(404, f"Unknown dataset: {dataset.name}")
+
+            version = read_data_version(dataset.processed_dir)
+            if snapshot is not None and snapshot.version == version:
+                snapshot.checked_at = now
+                return snapshot
+
+            try:
+                snapshot = build_snapshot(dataset, version)
+            except FileNotFoundError as e:
+                raise ApiError(503, f"Dataset {dataset.name} has no processed data yet ({os.path.basename(e.filename or '')})") from None
+            self._snapshots[dataset.name] = snapshot
+            return snapshot
+
+    # Memoized LLM client (only created on the first /explain call)
+    def llm_client(self):
+        with self._lock:
+            if self._llm_client is None:
+                from src.llm.factory import get_llm_client
+                self._llm_client = get_llm_client()
+            return self._llm_client
+
+# Resolve ?window= to a WINDOW_OPTIONS label
+def resolve_window(value: str | None) -> str:
+    if value is None:
+        return "Last 12 months"
+    label = WINDOW_ALIASES.get(value.strip().lower(), value.strip())
+    if label not in WINDOW_OPTIONS:
+        raise ApiError(400, f"Unknown window: {value}")
+    return label
+
+# Generate (or reuse a cached) explanation for one metric and window
+def explain(store: MetricsStore, dataset_name: str | None, metric_col: str, window: str, question: str | None) -> dict:
+    from src.llm.cache import ResponseCache, request_key
+    from src.llm.client import LLMRequest
+    from src.llm.factory import get_llm_provider, get_max_concurrency, get_request_options
+    from src.llm.gateway import PRIORITY_BACKGROUND, LLMGatewayTimeout, get_llm_gateway
+    from src.llm.formatting import cleanup_llm_output
+    from src.llm.prompts import build_metrics_prompt, build_executive_summary_prompt
+
+    snapshot = store.snapshot(dataset_name)
+    n_months = WINDOW_OPTIONS[window]
+    window_df = snapshot.metrics_df if n_months is None else snapshot.metrics_df.tail(n_months)
+
+    if metric_col == "summary":
+        prompt = build_executive_summary_prompt(
+            window_df=window_df,
+            user_question=question,
+            anomalies=snapshot.anomalies_df,
+            data_version=snapshot.version,
+        )
+    else:
+        labels = {col: label for label, col in METRIC_OPTIONS.items()}
+        if metric_col not in labels:
+            raise ApiError(400, f"Unknown metric: {metric_col}")
+        prompt = build_metrics_prompt(
+            window_df=window_df,
+            metric_label=labels[metric_col],
+            metric_col=metric_col,
+            user_question=question,
+            anomalies=snapshot.anomalies_df,
+            data_version=snapshot.version,
+        )
+
+    provider = get_llm_provider()
+    client = store.llm_client()
+    request = LLMRequest(prompt=prompt, **get_request_options(provider))
+
+    cache = ResponseCache()
+    key = request_key(client, request)
+    response = cache.get(key)
+    cached = response is not None
+    if not cached:
+        try:
+            # Shared with concurrent /explain calls: identical requests wait on one generation
+            response = get_llm_gateway().generate(
+                client,
+                request,
+                provider,
+                priority=PRIORITY_BACKGROUND,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_concurrency=get_max_concurrency(provider),
+            )
+        except LLMGatewayTimeout as e:
+            raise ApiError(504, f"LLM error: {e}") from None
+        except Exception as e:
+            raise ApiError(502, f"LLM error: {e}") from None
+        cache.put(key, response)
+
+    return {
+        "data_version": snapshot.version,
+        "metric": metric_col,
+        "window": window,
+        "cached": cached,
+        "explanation": cleanup_llm_output(response, provider),
+    }
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+    server_version = "MetricsAPI/1.0"
+    store: MetricsStore             # set by make_server
+    quiet = False
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, etag: str | None = None, gzipped: bytes | None = None) -> None:
+        use_gzip = gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if gzipped is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+            body = gzipped
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, obj) -> None:
+        self._send(status, json.dumps(obj).encode("utf-8"))
+
+    def _send_payload(self, payload: Payload) -> None:
+        if etag_matches(self.headers.get("If-None-Match", ""), payload.etag):
+            self.send_response(304)
+            self.send_header("ETag", payload.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(200, payload.body, payload.etag, payload.gzipped)
+
+    # Errors are always logged, even with --quiet
+    def log_error(self, format: str, *args) -> None:
+        super().log_message(format, *args)
+
+    # Run a route; ApiError becomes its JSON error, anything else a logged 500
+    def _handle(self, route) -> None:
+        try:
+            route()
+        except ApiError as e:
+            self._send_json(e.status, {"error": e.message})
+        except ConnectionError:
+            self.close_connection = True     # client went away mid-response
+        except Exception as e:
+            self.log_error("%s %s failed: %r", self.command, self.path, e)
+            traceback.print_exc()
+            self.close_connection = True
+            self._send_json(500, {"error": "Internal server error"})
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    do_HEAD = do_GET
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def _get(self) -> None:
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif url.path == "/datasets":
+            self._send_json(200, {"datasets": list_datasets()})
+        elif url.path in ("/metrics", "/components", "/summary"):
+            snapshot = self.store.snapshot(params.get("dataset"))
+            window = resolve_window(params.get("window"))
+            self._send_payload(snapshot.payloads[(url.path, window)])
+        elif url.path == "/explain":
+            self._send_json(200, self._explain(params))
+        else:
+            raise ApiError(404, f"Not found: {url.path}")
+
+    def _post(self) -> None:
+        url = urlparse(self.path)
+        if url.path != "/explain":
+            raise ApiError(404, f"Not found: {url.path}")
+
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True    # the body cannot be skipped
+            raise ApiError(400, "Invalid Content-Length")
+
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON") from None
+        if not isinstance(params, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        self._send_json(200, self._explain(params))
+
+    def _explain(self, params: dict) -> dict:
+        for name in ("metric", "dataset", "window", "question"):
+            if params.get(name) is not None and not isinstance(params[name], str):
+                raise ApiError(400, f"'{name}' must be a string")
+
+        metric = params.get("metric")
+        if not metric:
+            raise ApiError(400, "Missing 'metric' (column name or 'summary')")
+        return explain(
+            self.store,
+            params.get("dataset"),
+            metric,
+            resolve_window(params.get("window")),
+            params.get("question"),
+        )
+
+# Build a threaded server bound to a shared MetricsStore
+def make_server(host: str, port: int, store: MetricsStore | None = None, quiet: bool = False) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundMetricsRequestHandler",
+        (MetricsRequestHandler,),
+        {"store": store or MetricsStore(), "quiet": quiet},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve monthly metrics over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--refresh-seconds", type=float, default=5.0,
+                        help="How often to check for a new data version")
+    parser.add_argument("--quiet", action="store_true", help="Disable per-request logging")
+    args = parser.parse_args(argv)
+
+    store = MetricsStore(refresh_seconds=args.refresh_seconds)
+    store.snapshot(None)    # warm the default dataset before accepting traffic
+
+    server = make_server(args.host, args.port, store, quiet=args.quiet)
+    print(f"Serving metrics API on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,9 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 # Project root is the parent of the src folder
@@ -7,3 +13,56 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_RAW_DIR = PROJECT_ROOT / "data" / "raw"
 DATA_PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
+# Load .env into the environment once per process (later calls are no-ops)
+@lru_cache(maxsize=1)
+def load_env() -> bool:
+    from dotenv import load_dotenv
+    return load_dotenv(PROJECT_ROOT / ".env")
+
+# Per-tenant data roots live under <tenants dir>/<name>/{raw,processed}
+DEFAULT_TENANTS_DIR = PROJECT_ROOT / "data" / "tenants"
+
+# Tenants root, resolved on use so a DATA_TENANTS_DIR from .env (loaded by the entry point) is honoured
+def _tenants_dir() -> Path:
+    return Path(os.getenv("DATA_TENANTS_DIR", DEFAULT_TENANTS_DIR))
+
+DEFAULT_DATASET_NAME = "default"
+
+_DATASET_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+# Handle to one tenant's raw and processed data roots
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    raw_dir: Path
+    processed_dir: Path
+
+DEFAULT_DATASET = Dataset(DEFAULT_DATASET_NAME, DATA_RAW_DIR, DATA_PROCESSED_DIR)
+
+# Resolve a dataset by name (None = DATASET env var, then the default dataset)
+def get_dataset(name: str | None = None) -> Dataset:
+    if name is None:
+        name = os.getenv("DATASET", DEFAULT_DATASET_NAME)
+
+    name = name.strip()
+    if not name or name == DEFAULT_DATASET_NAME:
+        return DEFAULT_DATASET
+
+    # Names become directory names, so keep them path-safe
+    if not _DATASET_NAME_RE.match(name):
+        raise ValueError(f"Invalid dataset name: {name!r}")
+
+    tenant_dir = _tenants_dir() / name
+    return Dataset(name, tenant_dir / "raw", tenant_dir / "processed")
+
+# Names of all datasets with a processed directory
+def list_datasets() -> list[str]:
+    names = [DEFAULT_DATASET_NAME]
+    tenants_dir = _tenants_dir()
+    if tenants_dir.is_dir():
+        names += sorted(
+            path.name
+            for path in tenants_dir.iterdir()
+            if (path / "processed").is_dir() and _DATASET_NAME_RE.match(path.name)
+        )
+    return names
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.config import DATA_PROCESSED_DIR, get_dataset, load_env
+
+MANIFEST_NAME = "manifest.json"
+
+# Present while a pipeline rewrites the processed tables; readers keep the last manifest
+# version until it is gone. Markers older than this are left over from a crashed run.
+INGESTING_MARKER_NAME = ".ingesting"
+INGESTING_MARKER_MAX_AGE_SECONDS = 6 * 3600
+
+# Content hash of a file, read in chunks to keep memory flat
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Combine per-file hashes into a single data version
+def _version_from_files(files: dict[str, dict]) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+# Hash every processed table into a manifest
+def build_manifest(processed_dir: Path = DATA_PROCESSED_DIR) -> dict:
+    files = {}
+    for path in sorted(processed_dir.glob("*.csv")):
+        stat = path.stat()
+        files[path.name] = {
+            "sha256": file_sha256(path),
+            "bytes": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    return {
+        "version": _version_from_files(files),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "files": files,
+    }
+
+# Write the manifest next to the processed tables (atomic replace)
+def write_manifest(processed_dir: Path = DATA_PROCESSED_DIR) -> dict:
+    manifest = build_manifest(processed_dir)
+
+    manifest_path = processed_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+    return manifest
+
+# Pin the published data version while a multi-stage run rewrites the tables
+@contextmanager
+def ingestion_in_progress(processed_dir: Path = DATA_PROCESSED_DIR):
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    marker = processed_dir / INGESTING_MARKER_NAME
+    marker.write_text(str(os.getpid()), encoding="utf-8")
+    try:
+        yield
+    finally:
+        marker.unlink(missing_ok=True)
+
+def _ingesting(processed_dir: Path) -> bool:
+    try:
+        age = time.time() - (processed_dir / INGESTING_MARKER_NAME).stat().st_mtime
+    except OSError:
+        return False
+    return age < INGESTING_MARKER_MAX_AGE_SECONDS
+
+# Cheap fingerprint from file sizes and mtimes (used when no valid manifest)
+def _stat_fingerprint(processed_dir: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(processed_dir.glob("*.csv")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return "stat-" + digest.hexdigest()[:16]
+
+# Current data version of the processed tables
+def read_data_version(processed_dir: Path = DATA_PROCESSED_DIR) -> str:
+    """
+    Returns the manifest version written by ingestion. Only stats files,
+    so it is cheap enough to call on every dashboard rerun. Falls back to a
+    stat fingerprint if the manifest is missing or the files changed after
+    it was written (e.g. a CSV edited by hand). While a pipeline run is in
+    progress the last manifest version is returned as-is, so readers switch
+    versions once, when the run writes its manifest.
+    """
+    manifest_path = processed_dir / MANIFEST_NAME
+
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return _stat_fingerprint(processed_dir)
+
+    if _ingesting(processed_dir):
+        return str(manifest["version"])
+
+    files = manifest.get("files", {})
+    current = {path.name: path for path in processed_dir.glob("*.csv")}
+
+    if set(current) != set(files):
+        return _stat_fingerprint(processed_dir)
+
+    for name, path in current.items():
+        stat = path.stat()
+        entry = files[name]
+        if stat.st_size != entry.get("bytes") or stat.st_mtime_ns != entry.get("mtime_ns"):
+            return _stat_fingerprint(processed_dir)
+
+    return str(manifest["version"])
+
+# Recompute the manifest for the current processed tables
+def main() -> None:
+    dataset = get_dataset()
+    manifest = write_manifest(dataset.processed_dir)
+    print(f"Data version {manifest['version']} ({len(manifest['files'])} files) for dataset {dataset.name}")
+
+if __name__ == "__main__":
+    load_env()
+    main()
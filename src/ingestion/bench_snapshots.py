@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset
+from src.data_version import write_manifest
+from src.ingestion.snapshots import SnapshotStore, commit_snapshot, diff_metrics, diff_rows
+from src.metrics.bench_kernel import generate_frames
+from src.metrics.core import compute_metrics, load_customer_month_mrr
+
+# Bytes under a directory
+def directory_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+# Processed tables in the CSV layout the loaders read
+def write_tables(dataset: Dataset, month_mrr_df: pd.DataFrame, events_df: pd.DataFrame) -> str:
+    dataset.processed_dir.mkdir(parents=True, exist_ok=True)
+    month_mrr_df.to_csv(dataset.processed_dir / "customer_month_mrr.csv", index=False)
+    events_df.to_csv(dataset.processed_dir / "revenue_events.csv", index=False)
+    return write_manifest(dataset.processed_dir)["version"]
+
+# Restate MRR and events of a fraction of customers in the last few months
+def restate(month_mrr_df: pd.DataFrame, events_df: pd.DataFrame, fraction: float, months: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    customers = month_mrr_df["customer_id"].unique()
+    chosen = rng.choice(customers, max(int(len(customers) * fraction), 1), replace=False)
+    recent = sorted(month_mrr_df["month"].unique())[-months:]
+
+    month_mrr_df = month_mrr_df.copy()
+    rows = month_mrr_df["customer_id"].isin(chosen) & month_mrr_df["month"].isin(recent)
+    month_mrr_df.loc[rows, "mrr"] += 50.0
+
+    events_df = events_df.copy()
+    rows = events_df["customer_id"].isin(chosen) & events_df["event_month"].isin(recent)
+    events_df.loc[rows, "mrr_delta"] += 50.0
+    return month_mrr_df, events_df, len(chosen)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Snapshot store: sharing, as-of reads and restatement diffs.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="customer-month rows")
+    parser.add_argument("--restated", type=float, default=0.001, help="fraction of customers restated")
+    args = parser.parse_args(argv)
+
+    month_mrr_df, events_df = generate_frames(args.rows, 60)
+    events_df.insert(0, "event_id", [f"E-{i:08x}" for i in range(len(events_df))])
+    events_df["event_date"] = pd.to_datetime(events_df["event_month"]) + pd.offsets.MonthEnd(0)
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = Dataset("bench", Path(tmp) / "raw", Path(tmp) / "processed")
+        store = SnapshotStore.for_dataset(dataset)
+
+        old = write_tables(dataset, month_mrr_df, events_df)
+        started = time.perf_counter()
+        commit_snapshot(dataset)
+        first_seconds = time.perf_counter() - started
+        first_bytes = directory_bytes(store.directory)
+        csv_bytes = directory_bytes(dataset.processed_dir)
+
+        new_mrr_df, new_events_df, n_restated = restate(month_mrr_df, events_df, args.restated, 2)
+        new = write_tables(dataset, new_mrr_df, new_events_df)
+        started = time.perf_counter()
+        commit_snapshot(dataset)
+        second_seconds = time.perf_counter() - started
+        added_bytes = directory_bytes(store.directory) - first_bytes
+
+        print(f"{len(month_mrr_df):,} customer-months, {len(events_df):,} events; {n_restated:,} customers restated")
+        print(f"commit v1: {first_seconds:6.2f}s  {first_bytes / 1e6:7.1f} MB (CSV {csv_bytes / 1e6:.1f} MB)")
+        print(f"commit v2: {second_seconds:6.2f}s  +{added_bytes / 1e6:6.1f} MB ({added_bytes / first_bytes:.1%} of v1)")
+
+        started = time.perf_counter()
+        load_customer_month_mrr(dataset)
+        csv_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        old_mrr = load_customer_month_mrr(dataset, as_of=old)
+        as_of_seconds = time.perf_counter() - started
+        print(f"load customer_month_mrr: as of v1 {as_of_seconds:6.2f}s, current CSV {csv_seconds:6.2f}s")
+        csv_metrics = compute_metrics(dataset)
+
+        expected_old = month_mrr_df.sort_values(["customer_id", "month"], kind="stable", ignore_index=True)
+        if not np.array_equal(old_mrr["mrr"].to_numpy(), expected_old["mrr"].to_numpy()):
+            failures.append("as-of table differs from the committed one")
+
+        store = SnapshotStore.for_dataset(dataset)
+        started = time.perf_counter()
+        restated = diff_metrics(dataset, old, new)
+        diff_seconds = time.perf_counter() - started
+        print(f"diff_metrics: {diff_seconds * 1000:6.1f} ms, {len(restated)} restated values")
+
+        total_buckets = len(store.entry(new)["tables"]["revenue_events"]["buckets"])
+        changed = store.changed_buckets("revenue_events", old, new)
+        store.chunks_read = 0
+        started = time.perf_counter()
+        rows = diff_rows(dataset, "revenue_events", old, new)
+        rows_seconds = time.perf_counter() - started
+        print(f"diff_rows(revenue_events): {rows_seconds:6.2f}s, {len(changed)}/{total_buckets} buckets read, "
+              f"{int((rows['change'] == 'added').sum()):,} rows changed")
+
+        # Restated values must equal recomputing both versions from scratch
+        old_metrics = compute_metrics(dataset, as_of=old).set_index("month")
+        expected = csv_metrics.set_index("month")["mrr_total"] - old_metrics["mrr_total"]
+        got = restated[restated["metric"] == "mrr_total"].set_index("month")["difference"]
+        if not np.allclose(expected[expected != 0].sort_index(), got.sort_index()):
+            failures.append("restated mrr_total differs from a full recompute")
+
+        changed_events = int((new_events_df["mrr_delta"] != events_df["mrr_delta"]).sum())
+        if int((rows["change"] == "added").sum()) != changed_events:
+            failures.append(f"diff_rows found {int((rows['change'] == 'added').sum())} changed events, expected {changed_events}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: as-of reads match the committed tables and diffs match a full recompute")
+
+if __name__ == "__main__":
+    main()
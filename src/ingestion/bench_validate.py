@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset
+from src.ingestion.build_customer_month_mrr import build_customer_month_mrr
+from src.ingestion.build_customers import build_customers
+from src.ingestion.build_revenue_events import build_revenue_events
+from src.ingestion.out_of_core import generate_subscriptions
+from src.ingestion.validate import load_raw_tables, run_checks
+
+# Faults planted in the generated data: check name -> rows it must flag
+FAULTS = ["subscription_id_duplicate", "subscription_account_orphan", "start_date_invalid", "mrr_negative"]
+
+# Accounts for every account id in the subscriptions, in the raw schema
+def generate_accounts(subscriptions_df: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    first_start = pd.to_datetime(subscriptions_df["start_date"]).groupby(subscriptions_df["account_id"]).min()
+    n = len(first_start)
+    return pd.DataFrame({
+        "account_id": first_start.index,
+        "account_name": [f"Company_{i}" for i in range(n)],
+        "industry": rng.choice(["FinTech", "EdTech", "HealthTech", "DevTools"], n),
+        "country": rng.choice(["US", "UK", "DE", "IN"], n),
+        "signup_date": (first_start - pd.to_timedelta(rng.integers(0, 30, n), unit="D")).dt.strftime("%Y-%m-%d").to_numpy(),
+        "referral_source": "other",
+        "plan_tier": rng.choice(["Basic", "Pro", "Enterprise"], n),
+        "seats": rng.integers(1, 50, n),
+        "is_trial": False,
+        "churn_flag": False,
+    })
+
+# Plant each fault in a few random rows; returns the rows per check
+def inject_faults(subscriptions_df: pd.DataFrame, per_fault: int, seed: int = 1) -> dict[str, set[int]]:
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(subscriptions_df) - 1, size=per_fault * len(FAULTS), replace=False)
+    planted = {}
+    for i, check in enumerate(FAULTS):
+        targets = rows[i * per_fault:(i + 1) * per_fault]
+        if check == "subscription_id_duplicate":
+            subscriptions_df.loc[targets, "subscription_id"] = subscriptions_df.loc[targets + 1, "subscription_id"].to_numpy()
+            planted[check] = set(targets) | set(targets + 1)
+            continue
+        if check == "subscription_account_orphan":
+            subscriptions_df.loc[targets, "account_id"] = "A-missing"
+        elif check == "start_date_invalid":
+            subscriptions_df.loc[targets, "start_date"] = "2024-13-45"
+        elif check == "mrr_negative":
+            subscriptions_df.loc[targets, "mrr_amount"] = -99
+        planted[check] = set(targets)
+    return planted
+
+# Customers whose month-over-month MRR changes build_revenue_events cannot classify
+def unclassified_customers(month_mrr_df: pd.DataFrame) -> set[str]:
+    grid = month_mrr_df.pivot_table(index="customer_id", columns="month", values="mrr", aggfunc="sum", fill_value=0.0)
+    current = grid.to_numpy()
+    prev = np.column_stack((np.zeros(len(grid)), current[:, :-1]))
+    classified = (current == prev) | ((prev == 0) & (current > 0)) | ((prev > 0) & (current >= 0))
+    return set(grid.index[~classified.all(axis=1)])
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Validation overhead relative to ingestion, and fault detection.")
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--faults", type=int, default=10, help="rows planted per fault type")
+    args = parser.parse_args(argv)
+
+    subscriptions_df = generate_subscriptions(args.accounts)
+    subscriptions_df["arr_amount"] = subscriptions_df["mrr_amount"] * 12
+    accounts_df = generate_accounts(subscriptions_df)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = Dataset("bench", Path(tmp) / "raw", Path(tmp) / "processed")
+        dataset.raw_dir.mkdir(parents=True)
+        accounts_df.to_csv(dataset.raw_dir / "accounts.csv", index=False)
+        subscriptions_df.to_csv(dataset.raw_dir / "subscriptions.csv", index=False)
+
+        # Ingestion as the stages run it: read the raw CSVs and build the processed tables
+        started = time.perf_counter()
+        accounts = pd.read_csv(dataset.raw_dir / "accounts.csv", parse_dates=["signup_date"])
+        build_customers(accounts)
+        subscriptions = pd.read_csv(dataset.raw_dir / "subscriptions.csv", parse_dates=["start_date", "end_date"])
+        month_mrr_df = build_customer_month_mrr(subscriptions)
+        build_revenue_events(month_mrr_df)
+        ingestion_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        report = run_checks(load_raw_tables(dataset))
+        validation_seconds = time.perf_counter() - started
+
+        # Detection: plant faults in a copy and compare the flagged rows
+        faulty_df = subscriptions_df.copy()
+        planted = inject_faults(faulty_df, args.faults)
+        faulty_df.to_csv(dataset.raw_dir / "subscriptions.csv", index=False)
+        faulty_report = run_checks(load_raw_tables(dataset))
+
+    # Transitions the event builder would drop, from the builders themselves
+    buildable = faulty_df[pd.to_datetime(faulty_df["start_date"], errors="coerce").notna()]
+    expected_unclassified = unclassified_customers(build_customer_month_mrr(buildable))
+
+    print(f"{len(subscriptions_df):,} subscriptions, {len(accounts_df):,} accounts, {len(month_mrr_df):,} customer-months")
+    print(f"ingestion:  {ingestion_seconds:8.2f}s")
+    print(f"validation: {validation_seconds:8.2f}s  ({validation_seconds / ingestion_seconds:.1%} of ingestion, "
+          f"{report.errors} error rows, {report.warnings} warning rows on clean data)")
+
+    failures = []
+    flagged = {r.check.name: set(r.rows.tolist()) for r in faulty_report.results}
+    for check, rows in planted.items():
+        missed = rows - flagged.get(check, set())
+        print(f"  {check:30s} planted {len(rows):3d}  flagged {len(flagged.get(check, set())):3d}")
+        if missed:
+            failures.append(f"{check} missed {len(missed)} planted rows")
+    transition_rows = sorted(flagged.get("mrr_transition_unclassified", set()))
+    flagged_unclassified = set(faulty_df["account_id"].iloc[transition_rows])
+    print(f"  {'mrr_transition_unclassified':30s} expected {len(expected_unclassified):3d}  "
+          f"flagged {len(flagged_unclassified):3d} customers")
+    if flagged_unclassified != expected_unclassified:
+        failures.append("mrr_transition_unclassified does not match the customers build_revenue_events cannot classify")
+    if report.errors:
+        failures.append(f"clean data produced {report.errors} error rows")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: every planted fault was flagged")
+
+if __name__ == "__main__":
+    main()
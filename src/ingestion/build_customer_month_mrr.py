@@ -1,24 +1,35 @@
 import pandas as pd
 
-from src.config import DATA_RAW_DIR, DATA_PROCESSED_DIR
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.tracing import traced
 
 
+# Last date covered by the dataset: open subscriptions run until here
+def get_global_last_date(max_start: pd.Timestamp, max_end: pd.Timestamp) -> pd.Timestamp:
+    if pd.isna(max_end):
+        return max_start
+    return max(max_start, max_end)
+
 # Build monthly MRR per customer from subscriptions
-def build_customer_month_mrr(subscriptions_df: pd.DataFrame) -> pd.DataFrame:
+@traced(category="ingestion")
+def build_customer_month_mrr(
+    subscriptions_df: pd.DataFrame,
+    global_last_date: pd.Timestamp | None = None,
+) -> pd.DataFrame:
     
     # Ensure dates are datetime objects
     subscriptions_df = subscriptions_df.copy()
     subscriptions_df["start_date"] = pd.to_datetime(subscriptions_df["start_date"])
     subscriptions_df["end_date"] = pd.to_datetime(subscriptions_df["end_date"])
     
-    # Compute dataset horizon for active subscriptions
-    max_start = subscriptions_df["start_date"].max()
-    max_end = subscriptions_df["end_date"].max()  # ignores NaT by default
-
-    if pd.isna(max_end):
-        global_last_date = max_start
-    else:
-        global_last_date = max(max_start, max_end)
+    # Compute dataset horizon for active subscriptions (callers processing a
+    # subset of subscriptions pass the horizon of the full dataset)
+    if global_last_date is None:
+        global_last_date = get_global_last_date(
+            subscriptions_df["start_date"].max(),
+            subscriptions_df["end_date"].max(),  # ignores NaT by default
+        )
 
     records = []
 
@@ -58,7 +69,7 @@ def build_customer_month_mrr(subscriptions_df: pd.DataFrame) -> pd.DataFrame:
         
     # Aggregate MRR per customer per month
     month_mrr_df = (
-        pd.DataFrame(records)
+        pd.DataFrame(records, columns=["customer_id", "month", "mrr"])
         .groupby(["customer_id", "month"], as_index=False)["mrr"]
         .sum()
     )
@@ -66,9 +77,11 @@ def build_customer_month_mrr(subscriptions_df: pd.DataFrame) -> pd.DataFrame:
     return month_mrr_df
 
 # Load subscriptions, build monthly MRR, and save to CSV
-def main() -> None:
-    subscriptions_path = DATA_RAW_DIR / "subscriptions.csv"
-    output_path = DATA_PROCESSED_DIR / "customer_month_mrr.csv"
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True) -> None:
+    dataset = dataset or get_dataset()
+    subscriptions_path = dataset.raw_dir / "subscriptions.csv"
+    output_path = dataset.processed_dir / "customer_month_mrr.csv"
 
     # Load raw subscriptions
     subscriptions_df = pd.read_csv(
@@ -89,6 +102,13 @@ def main() -> None:
     print("Month range:", month_mrr_df["month"].min(), "→", month_mrr_df["month"].max())
     print("Customers covered:", month_mrr_df["customer_id"].nunique())
 
+    # Refresh data version so dashboards pick up the new tables
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(output_path.parent)
+        print("Data version:", manifest["version"])
+
 if __name__ == "__main__":
+    load_env()
     main()
 
@@ -1,9 +1,12 @@
 from pathlib import Path
 import pandas as pd
 
-from src.config import DATA_RAW_DIR, DATA_PROCESSED_DIR
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.tracing import traced
 
 # Transform accounts into canonical customers table
+@traced(category="ingestion")
 def build_customers(accounts_df: pd.DataFrame) -> pd.DataFrame:
 
     # Rename core columns to customer schema
@@ -33,10 +36,13 @@ def build_customers(accounts_df: pd.DataFrame) -> pd.DataFrame:
     return customers_df
 
 # Load accounts.csv, build customers.csv, and save it
-def main():
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True):
+    dataset = dataset or get_dataset()
+
     # Paths
-    accounts_path = DATA_RAW_DIR / "accounts.csv"
-    customers_path = DATA_PROCESSED_DIR / "customers.csv"
+    accounts_path = dataset.raw_dir / "accounts.csv"
+    customers_path = dataset.processed_dir / "customers.csv"
 
     # Load raw accounts data
     accounts_df = pd.read_csv(accounts_path, parse_dates=["signup_date"])
@@ -52,5 +58,12 @@ def main():
 
     print(f"Saved {len(customers_df)} customers to {customers_path}")
 
+    # Refresh data version so dashboards pick up the new tables
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(customers_path.parent)
+        print("Data version:", manifest["version"])
+
 if __name__ == "__main__":
+    load_env()
     main()
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.metrics.daily_mrr import SubscriptionIntervals, compute_daily_mrr
+from src.tracing import traced
+
+# Load subscriptions, sweep them into daily company MRR and active customers, and save to CSV
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True) -> None:
+    dataset = dataset or get_dataset()
+    subscriptions_path = dataset.raw_dir / "subscriptions.csv"
+    output_path = dataset.processed_dir / "daily_mrr.csv"
+
+    # Load raw subscriptions
+    subscriptions_df = pd.read_csv(
+        subscriptions_path,
+        parse_dates=["start_date", "end_date"],
+    )
+
+    # Build daily series
+    daily_df = compute_daily_mrr(SubscriptionIntervals.from_subscriptions(subscriptions_df)).to_frame()
+
+    # Ensure processed directory exists
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Save to CSV
+    daily_df.to_csv(output_path, index=False, date_format="%Y-%m-%d")
+
+    print(f"Saved {len(daily_df)} days to {output_path}")
+    print("Date range:", daily_df["date"].min().date(), "→", daily_df["date"].max().date())
+
+    # Refresh data version so dashboards pick up the new table
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(output_path.parent)
+        print("Data version:", manifest["version"])
+
+if __name__ == "__main__":
+    load_env()
+    main()
@@ -0,0 +1,36 @@
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.metrics.anomalies import build_anomaly_table
+from src.metrics.core import load_customer_month_mrr, load_customers, load_revenue_events
+from src.tracing import traced
+
+# Load processed tables, flag anomalies for every metric/segment, and save to CSV
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True) -> None:
+    dataset = dataset or get_dataset()
+
+    anomalies_path = dataset.processed_dir / "metric_anomalies.csv"
+
+    # Build flags from the processed tables
+    anomalies_df = build_anomaly_table(
+        load_customer_month_mrr(dataset),
+        load_revenue_events(dataset),
+        load_customers(dataset),
+    )
+
+    # Save flags
+    anomalies_df.to_csv(anomalies_path, index=False)
+
+    print(f"Saved {len(anomalies_df)} anomaly flags to {anomalies_path}")
+    if not anomalies_df.empty:
+        print("Flags by metric:\n", anomalies_df["metric"].value_counts())
+
+    # Refresh data version so dashboards pick up the new flags
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(anomalies_path.parent)
+        print("Data version:", manifest["version"])
+
+if __name__ == "__main__":
+    load_env()
+    main()
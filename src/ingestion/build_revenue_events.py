@@ -1,17 +1,25 @@
 import pandas as pd
 
-from src.config import DATA_PROCESSED_DIR
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.tracing import traced
 
 # Build revenue events from monthly MRR snapshot
-def build_revenue_events(month_mrr_df: pd.DataFrame) -> pd.DataFrame:
+@traced(category="ingestion")
+def build_revenue_events(
+    month_mrr_df: pd.DataFrame,
+    all_months: list[pd.Timestamp] | None = None,
+) -> pd.DataFrame:
     
     df = month_mrr_df.copy()
 
     # Convert month label to first day of month
     df["month_start"] = pd.to_datetime(df["month"] + "-01")
 
-    # Global ordered list of all months
-    all_months = sorted(df["month_start"].unique())
+    # Global ordered list of all months (callers processing a subset of
+    # customers pass the months of the full dataset)
+    if all_months is None:
+        all_months = sorted(df["month_start"].unique())
 
     records = []
 
@@ -69,10 +77,12 @@ def build_revenue_events(month_mrr_df: pd.DataFrame) -> pd.DataFrame:
     return events_df
 
 # Load monthly MRR, build events, and save to CSV
-def main() -> None:
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True) -> None:
+    dataset = dataset or get_dataset()
 
-    month_mrr_path = DATA_PROCESSED_DIR / "customer_month_mrr.csv"
-    events_path = DATA_PROCESSED_DIR / "revenue_events.csv"
+    month_mrr_path = dataset.processed_dir / "customer_month_mrr.csv"
+    events_path = dataset.processed_dir / "revenue_events.csv"
 
     # Load monthly MRR snapshot
     month_mrr_df = pd.read_csv(month_mrr_path)
@@ -89,5 +99,12 @@ def main() -> None:
     print(f"Saved {len(events_df)} events to {events_path}")
     print("Event types:\n", events_df["event_type"].value_counts())
 
+    # Refresh data version so dashboards pick up the new tables
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(events_path.parent)
+        print("Data version:", manifest["version"])
+
 if __name__ == "__main__":
+    load_env()
     main()
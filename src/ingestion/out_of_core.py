@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.ingestion.build_customer_month_mrr import build_customer_month_mrr, get_global_last_date
+from src.ingestion.build_revenue_events import build_revenue_events
+from src.tracing import traced
+
+# Rough in-memory cost of one raw subscription row and one expanded customer-month
+# (the builders hold a dict per record plus the resulting frames)
+RAW_ROW_BYTES = 400
+EXPANDED_ROW_BYTES = 800
+
+# Output columns, written as a header before any partition is processed
+MONTH_MRR_COLUMNS = ["customer_id", "month", "mrr"]
+EVENT_COLUMNS = ["event_id", "customer_id", "event_month", "event_date", "event_type", "mrr_delta", "mrr_after_event"]
+
+# Account ids sampled per chunk to pick partition boundaries
+SAMPLE_PER_CHUNK = 2_000
+
+# Global facts gathered in the first pass over subscriptions.csv
+@dataclass
+class SubscriptionStats:
+    rows: int = 0
+    max_start: pd.Timestamp | None = None
+    max_end: pd.Timestamp | None = None
+    closed_coverage: Counter = field(default_factory=Counter)    # month ordinal -> +/- coverage
+    closed_expanded_rows: int = 0
+    open_start_ordinals: Counter = field(default_factory=Counter)
+    account_sample: list[np.ndarray] = field(default_factory=list)
+
+    @property
+    def global_last_date(self) -> pd.Timestamp:
+        return get_global_last_date(self.max_start, self.max_end if self.max_end is not None else pd.NaT)
+
+    # Months with at least one active subscription (as month-start timestamps)
+    def all_months(self) -> list[pd.Timestamp]:
+        last_ordinal = _month_ordinal(self.global_last_date)
+        coverage = Counter(self.closed_coverage)
+
+        # Open subscriptions cover every month from their start to the horizon
+        for start_ordinal, count in self.open_start_ordinals.items():
+            coverage[start_ordinal] += count
+            coverage[last_ordinal + 1] -= count
+
+        # Sweep the coverage deltas; a month is present if anything covers it
+        months = []
+        active = 0
+        ordinals = sorted(coverage)
+        for ordinal, next_ordinal in zip(ordinals, ordinals[1:] + [ordinals[-1] + 1] if ordinals else []):
+            active += coverage[ordinal]
+            if active > 0:
+                months.extend(range(ordinal, next_ordinal))
+
+        return [pd.Timestamp(year=o // 12, month=o % 12 + 1, day=1) for o in months]
+
+    # Total customer-month rows before aggregation
+    def expanded_rows(self) -> int:
+        last_ordinal = _month_ordinal(self.global_last_date)
+        open_rows = sum(
+            (last_ordinal - start + 1) * count
+            for start, count in self.open_start_ordinals.items()
+        )
+        return self.closed_expanded_rows + open_rows
+
+def _month_ordinal(ts: pd.Timestamp) -> int:
+    return ts.year * 12 + ts.month - 1
+
+def _ordinals(dates: pd.Series) -> np.ndarray:
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.int64)
+
+def _read_chunks(path: Path, chunksize: int, usecols: list[str] | None = None):
+    return pd.read_csv(
+        path,
+        parse_dates=["start_date", "end_date"],
+        usecols=usecols,
+        chunksize=chunksize,
+    )
+
+# Pass 1: horizon, month coverage, expanded size and an account-id sample
+@traced(category="ingestion")
+def scan_subscriptions(path: Path, chunksize: int, seed: int = 0) -> SubscriptionStats:
+    stats = SubscriptionStats()
+    rng = np.random.default_rng(seed)
+
+    for chunk in _read_chunks(path, chunksize, usecols=["account_id", "start_date", "end_date"]):
+        chunk = chunk[chunk["start_date"].notna()]
+        stats.rows += len(chunk)
+        if chunk.empty:
+            continue
+
+        chunk_max_start = chunk["start_date"].max()
+        chunk_max_end = chunk["end_date"].max()
+        stats.max_start = chunk_max_start if stats.max_start is None else max(stats.max_start, chunk_max_start)
+        if pd.notna(chunk_max_end):
+            stats.max_end = chunk_max_end if stats.max_end is None else max(stats.max_end, chunk_max_end)
+
+        # Closed subscriptions: same exclusive end / skip rule as the builder
+        closed = chunk[chunk["end_date"].notna()]
+        effective_end = closed["end_date"] - pd.Timedelta(days=1)
+        closed = closed[effective_end >= closed["start_date"]]
+        start_ord = _ordinals(closed["start_date"])
+        end_ord = _ordinals(effective_end[closed.index])
+
+        stats.closed_coverage.update(Counter(start_ord.tolist()))
+        stats.closed_coverage.subtract(Counter((end_ord + 1).tolist()))
+        stats.closed_expanded_rows += int((end_ord - start_ord + 1).sum())
+
+        # Open subscriptions: their end depends on the global horizon
+        open_starts = _ordinals(chunk.loc[chunk["end_date"].isna(), "start_date"])
+        stats.open_start_ordinals.update(Counter(open_starts.tolist()))
+
+        accounts = chunk["account_id"].astype(str).to_numpy()
+        take = min(len(accounts), SAMPLE_PER_CHUNK)
+        stats.account_sample.append(rng.choice(accounts, size=take, replace=False))
+
+    return stats
+
+# Range boundaries so each partition holds about the same number of accounts
+def partition_boundaries(stats: SubscriptionStats, n_partitions: int) -> np.ndarray:
+    if n_partitions <= 1 or not stats.account_sample:
+        return np.array([], dtype=object)
+
+    sample = np.sort(np.concatenate(stats.account_sample))
+    positions = (np.arange(1, n_partitions) * len(sample)) // n_partitions
+    return np.unique(sample[positions])
+
+# Pass 2: spill subscriptions into account-range partitions on disk
+@traced(category="ingestion")
+def spill_partitions(path: Path, spill_dir: Path, boundaries: np.ndarray, chunksize: int) -> list[Path]:
+    n_partitions = len(boundaries) + 1
+    paths = [spill_dir / f"subscriptions-{i:04d}.csv" for i in range(n_partitions)]
+    written = [False] * n_partitions
+
+    for chunk in _read_chunks(path, chunksize):
+        accounts = chunk["account_id"].astype(str).to_numpy()
+        part_ids = np.searchsorted(boundaries, accounts, side="right") if len(boundaries) else np.zeros(len(chunk), dtype=int)
+
+        for part_id in np.unique(part_ids):
+            part = chunk[part_ids == part_id]
+            part.to_csv(paths[part_id], mode="a", header=not written[part_id], index=False)
+            written[part_id] = True
+
+    return [p for p, w in zip(paths, written) if w]
+
+# Append a frame's rows to a CSV whose header is already written
+def _append_csv(df: pd.DataFrame, path: Path, columns: list[str]) -> None:
+    df[columns].to_csv(path, mode="a", header=False, index=False)
+
+# Pass 3: expand and derive events per partition in account order, appending output
+@traced(category="ingestion")
+def process_partitions(
+    partition_paths: list[Path],
+    stats: SubscriptionStats,
+    month_mrr_path: Path,
+    events_path: Path,
+) -> dict:
+    global_last_date = stats.global_last_date
+    all_months = stats.all_months()
+
+    totals = {"partitions": len(partition_paths), "month_rows": 0, "events": 0, "max_partition_rows": 0}
+
+    # Start both outputs from a header, so a run without events still replaces the old file
+    pd.DataFrame(columns=MONTH_MRR_COLUMNS).to_csv(month_mrr_path, index=False)
+    pd.DataFrame(columns=EVENT_COLUMNS).to_csv(events_path, index=False)
+
+    for part_path in partition_paths:
+        part = pd.read_csv(part_path, parse_dates=["start_date", "end_date"])
+        part = part.sort_values("account_id", kind="mergesort")
+        totals["max_partition_rows"] = max(totals["max_partition_rows"], len(part))
+
+        month_mrr_df = build_customer_month_mrr(part, global_last_date=global_last_date)
+        events_df = build_revenue_events(month_mrr_df, all_months=all_months)
+
+        if not month_mrr_df.empty:
+            _append_csv(month_mrr_df, month_mrr_path, MONTH_MRR_COLUMNS)
+        if not events_df.empty:
+            _append_csv(events_df, events_path, EVENT_COLUMNS)
+
+        totals["month_rows"] += len(month_mrr_df)
+        totals["events"] += len(events_df)
+
+    return totals
+
+# Run the out-of-core pipeline for customer_month_mrr.csv and revenue_events.csv
+@traced(category="ingestion")
+def build_out_of_core(
+    subscriptions_path: Path,
+    output_dir: Path,
+    memory_budget_bytes: int,
+    spill_dir: Path | None = None,
+) -> dict:
+    started = time.perf_counter()
+    chunksize = max(memory_budget_bytes // RAW_ROW_BYTES, 1_000)
+
+    stats = scan_subscriptions(subscriptions_path, chunksize)
+    if stats.rows == 0:
+        raise ValueError(f"No subscriptions found in {subscriptions_path}")
+
+    # Size partitions so one partition's expansion fits in the budget
+    n_partitions = max(1, math.ceil(stats.expanded_rows() * EXPANDED_ROW_BYTES / memory_budget_bytes))
+    boundaries = partition_boundaries(stats, n_partitions)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    month_mrr_tmp = output_dir / "customer_month_mrr.csv.tmp"
+    events_tmp = output_dir / "revenue_events.csv.tmp"
+    for tmp in (month_mrr_tmp, events_tmp):
+        tmp.unlink(missing_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=spill_dir, prefix="spill-") as tmp_dir:
+        partition_paths = spill_partitions(subscriptions_path, Path(tmp_dir), boundaries, chunksize)
+        totals = process_partitions(partition_paths, stats, month_mrr_tmp, events_tmp)
+
+    # Swap outputs in only once both are complete
+    os.replace(month_mrr_tmp, output_dir / "customer_month_mrr.csv")
+    os.replace(events_tmp, output_dir / "revenue_events.csv")
+
+    return {
+        **totals,
+        "subscriptions": stats.rows,
+        "expanded_rows": stats.expanded_rows(),
+        "seconds": time.perf_counter() - started,
+    }
+
+# Synthetic subscriptions in the raw schema (reactivations, upgrades, bad end dates)
+def generate_subscriptions(n_accounts: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    subs_per_account = rng.integers(1, 6, n_accounts)
+    n = int(subs_per_account.sum())
+
+    accounts = np.repeat([f"A-{i:06x}" for i in rng.permutation(n_accounts)], subs_per_account)
+    start = pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365, n), unit="D")
+    duration = pd.to_timedelta(rng.integers(-20, 700, n), unit="D")
+    end = pd.Series(start + duration)
+    end[rng.random(n) < 0.3] = pd.NaT
+
+    return pd.DataFrame({
+        "subscription_id": [f"S-{i:07x}" for i in range(n)],
+        "account_id": accounts,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.dt.strftime("%Y-%m-%d"),
+        "mrr_amount": rng.choice([19, 49, 99, 499, 1999], n),
+    })
+
+# Check the out-of-core path reproduces the in-memory builders exactly
+def verify(n_accounts: int, memory_budget_bytes: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        subscriptions_path = tmp_dir / "subscriptions.csv"
+        generate_subscriptions(n_accounts).to_csv(subscriptions_path, index=False)
+
+        subscriptions_df = pd.read_csv(subscriptions_path, parse_dates=["start_date", "end_date"])
+        expected_mrr = build_customer_month_mrr(subscriptions_df)
+        expected_events = build_revenue_events(expected_mrr)
+
+        summary = build_out_of_core(subscriptions_path, tmp_dir / "out", memory_budget_bytes)
+        actual_mrr = pd.read_csv(tmp_dir / "out" / "customer_month_mrr.csv")
+        actual_events = pd.read_csv(tmp_dir / "out" / "revenue_events.csv")
+
+    expected_mrr = expected_mrr.reset_index(drop=True)
+    expected_events = expected_events.astype({"event_date": str}).reset_index(drop=True)
+
+    mrr_ok = actual_mrr.equals(expected_mrr)
+    events_ok = actual_events.equals(expected_events)
+
+    print(f"Partitions: {summary['partitions']}, largest partition: {summary['max_partition_rows']} subscriptions")
+    print(f"customer_month_mrr: {len(actual_mrr)} rows, matches in-memory: {mrr_ok}")
+    print(f"revenue_events:     {len(actual_events)} rows, matches in-memory: {events_ok}")
+    return mrr_ok and events_ok
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build customer_month_mrr and revenue_events out of core.")
+    parser.add_argument("--dataset", default=None, help="Tenant dataset name (default: DATASET env var or default data)")
+    parser.add_argument("--memory-budget-mb", type=float, default=512)
+    parser.add_argument("--spill-dir", type=Path, default=None, help="Where to put partition files (default: system temp)")
+    parser.add_argument("--verify", action="store_true", help="Compare against the in-memory path on generated data")
+    parser.add_argument("--accounts", type=int, default=2_000, help="Accounts to generate for --verify")
+    args = parser.parse_args(argv)
+
+    budget = int(args.memory_budget_mb * 1024 * 1024)
+
+    if args.verify:
+        ok = verify(args.accounts, budget)
+        sys.exit(0 if ok else 1)
+
+    dataset: Dataset = get_dataset(args.dataset)
+    summary = build_out_of_core(
+        dataset.raw_dir / "subscriptions.csv",
+        dataset.processed_dir,
+        budget,
+        spill_dir=args.spill_dir,
+    )
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Processed {summary['subscriptions']} subscriptions in {summary['partitions']} partitions")
+    print(f"Saved {summary['month_rows']} customer-month rows and {summary['events']} events to {dataset.processed_dir}")
+    print(f"Took {summary['seconds']:.1f}s, peak RSS {peak_mb:.0f} MB (budget {args.memory_budget_mb:.0f} MB)")
+
+    manifest = write_manifest(dataset.processed_dir)
+    print("Data version:", manifest["version"])
+
+if __name__ == "__main__":
+    load_env()
+    main()
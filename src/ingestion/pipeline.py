@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import ingestion_in_progress, write_manifest
+from src.ingestion import (
+    build_customer_month_mrr,
+    build_customers,
+    build_daily_mrr,
+    build_metric_anomalies,
+    build_revenue_events,
+    snapshots,
+    update_customers_is_active,
+    validate,
+)
+from src.tracing import traced
+
+# Ingestion stages in dependency order (each reads the previous stage's outputs)
+STAGES = [
+    ("customers", build_customers.main),
+    ("customer_month_mrr", build_customer_month_mrr.main),
+    ("daily_mrr", build_daily_mrr.main),
+    ("revenue_events", build_revenue_events.main),
+    ("customers_is_active", update_customers_is_active.main),
+    ("metric_anomalies", build_metric_anomalies.main),
+]
+
+# Validate the raw tables, run every stage, publish one new data version and snapshot it;
+# returns seconds per stage. The builders read the raw CSVs as they are, so error rows
+# would reach the metrics: strict (the default) stops before building instead.
+@traced(category="ingestion")
+def run_pipeline(dataset: Dataset | None = None, strict: bool = True, validate_raw: bool = True) -> dict[str, float]:
+    dataset = dataset or get_dataset()
+    timings = {}
+
+    if validate_raw:
+        started = time.perf_counter()
+        report = validate.main(dataset)
+        timings["validate"] = time.perf_counter() - started
+        if strict and report.errors:
+            raise ValueError(
+                f"Validation found {report.errors} error rows; see {validate.validation_dir(dataset)}"
+            )
+
+    # Readers keep the previous version until every table is rebuilt
+    with ingestion_in_progress(dataset.processed_dir):
+        for name, stage in STAGES:
+            print(f"\n== {name} ==")
+            started = time.perf_counter()
+            stage(dataset, update_manifest=False)
+            timings[name] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        manifest = write_manifest(dataset.processed_dir)
+        timings["manifest"] = time.perf_counter() - started
+    print(f"\nData version: {manifest['version']}")
+
+    print("\n== snapshot ==")
+    started = time.perf_counter()
+    snapshots.commit_snapshot(dataset)
+    timings["snapshot"] = time.perf_counter() - started
+
+    return timings
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Validate raw data and build every processed table.")
+    parser.add_argument("--dataset", default=None, help="Tenant dataset name (default: DATASET env var or default data)")
+    parser.add_argument("--no-strict", dest="strict", action="store_false",
+                        help="Build even if validation finds error rows (they reach the metrics tables)")
+    parser.add_argument("--skip-validation", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        timings = run_pipeline(get_dataset(args.dataset), strict=args.strict, validate_raw=not args.skip_validation)
+    except ValueError as e:
+        print(f"\n{e}")
+        sys.exit(1)
+
+    total = sum(timings.values())
+    print("\nStage timings:")
+    for name, seconds in timings.items():
+        print(f"  {name:20s} {seconds:8.3f}s  {seconds / total:6.1%}")
+    print(f"  {'total':20s} {total:8.3f}s")
+
+if __name__ == "__main__":
+    load_env()
+    main()
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import read_data_version, write_manifest
+from src.metrics import core
+from src.tracing import traced
+
+SNAPSHOT_DIR_NAME = "snapshots"
+LOG_NAME = "log.jsonl"
+OBJECTS_DIR_NAME = "objects"
+LOCK_NAME = "commit.lock"
+
+# A commit lock file older than this is assumed to be left by a crashed process
+STALE_LOCK_SECONDS = 600
+LOCK_TIMEOUT_SECONDS = 300
+
+# Rows of customer-keyed tables are spread over this many buckets by a stable hash of the
+# customer id, so a restatement for a few customers rewrites only a few chunks
+N_BUCKETS = 64
+
+# How each processed table is laid out in the store. Rows come back sorted by sort_by.
+@dataclass(frozen=True)
+class TableLayout:
+    sort_by: tuple[str, ...]
+    bucket_by: str | None = None        # None = a single bucket
+
+TABLE_LAYOUTS = {
+    "customers": TableLayout(("customer_id",), "customer_id"),
+    "customer_month_mrr": TableLayout(("customer_id", "month"), "customer_id"),
+    "revenue_events": TableLayout(("customer_id", "event_month"), "customer_id"),
+    "metric_anomalies": TableLayout(("dimension", "segment", "metric", "month")),
+    "daily_mrr": TableLayout(("date",)),
+}
+
+# Current-table loaders (CSV) for each snapshotted table
+TABLE_LOADERS = {
+    "customers": core.load_customers,
+    "customer_month_mrr": core.load_customer_month_mrr,
+    "revenue_events": core.load_revenue_events,
+    "metric_anomalies": core.load_metric_anomalies,
+    "daily_mrr": core.load_daily_mrr,
+}
+
+# Metric columns stored per version, in compute_metrics_from_frames order
+METRIC_COLUMNS = [
+    "mrr_total",
+    *core.COMPONENT_COLUMNS.values(),
+    "net_new_mrr",
+    "active_customers",
+    "revenue_churn_rate",
+]
+
+# Stable bucket per row (crc32 of the key, computed once per distinct key)
+def bucket_ids(keys: pd.Series, n_buckets: int) -> np.ndarray:
+    codes, uniques = pd.factorize(keys)
+    per_key = np.fromiter((zlib.crc32(str(k).encode("utf-8")) % n_buckets for k in uniques), dtype=np.int64, count=len(uniques))
+    return np.append(per_key, 0)[codes]
+
+# Column values as a numpy array; string columns come back as object arrays to be dictionary-encoded
+def _encode(series: pd.Series) -> tuple[np.ndarray, bool]:
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(), False
+    return series.astype(object).to_numpy(), True
+
+# Strings as int32 codes into a '<U' dictionary (nulls are code -1), so np.save needs no pickling
+def _dictionary_encode(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    return codes.astype(np.int32), np.asarray(uniques, dtype=object).astype(str)
+
+def _decode(values: np.ndarray, dictionary: np.ndarray | None, dtype: str) -> pd.Series:
+    if dictionary is not None:
+        # Code -1 picks the trailing NaN
+        values = np.append(dictionary.astype(object), np.nan)[values]
+    series = pd.Series(values)
+    return series.astype(dtype) if str(series.dtype) != dtype else series
+
+# In-process commit locks per store directory (store objects are created per call)
+_commit_locks: dict[Path, threading.Lock] = {}
+_commit_locks_guard = threading.Lock()
+
+def _commit_lock(directory: Path) -> threading.Lock:
+    with _commit_locks_guard:
+        return _commit_locks.setdefault(directory.resolve(), threading.Lock())
+
+# Cross-process lock: whoever creates the lock file (O_EXCL) holds it until it is removed
+@contextmanager
+def _lock_file(path: Path, timeout: float = LOCK_TIMEOUT_SECONDS):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {path}") from None
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode("utf-8"))
+        os.close(fd)
+        yield
+    finally:
+        path.unlink(missing_ok=True)
+
+# Content address of an array (dtype and shape are part of the content)
+def chunk_hash(values: np.ndarray) -> str:
+    digest = hashlib.sha256(f"{values.dtype.str}{values.shape}".encode("utf-8"))
+    digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+# Append-only store: immutable content-addressed chunks plus a log of version manifests
+class SnapshotStore:
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.chunks_read = 0
+
+    @classmethod
+    def for_dataset(cls, dataset: Dataset | None = None) -> "SnapshotStore":
+        dataset = dataset or get_dataset()
+        return cls(dataset.processed_dir.parent / SNAPSHOT_DIR_NAME)
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory / LOG_NAME
+
+    def _object_path(self, key: str) -> Path:
+        return self.directory / OBJECTS_DIR_NAME / key[:2] / f"{key}.npy"
+
+    # Write a chunk unless an identical one exists; returns its hash
+    def _put(self, values: np.ndarray) -> str:
+        key = chunk_hash(values)
+        path = self._object_path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, values, allow_pickle=False)
+            os.replace(tmp_path, path)
+        return key
+
+    def _get(self, key: str) -> np.ndarray:
+        self.chunks_read += 1
+        return np.load(self._object_path(key), allow_pickle=False)
+
+    # Version manifests, oldest first
+    def versions(self) -> list[dict]:
+        try:
+            lines = self.log_path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue        # torn write from an interrupted commit
+        return entries
+
+    # Manifest for a version id, a unique prefix of one, or "latest"
+    def entry(self, version: str) -> dict:
+        entries = self.versions()
+        if version == "latest" and entries:
+            return entries[-1]
+        matches = [e for e in entries if e["version"] == version]
+        if not matches:
+            matches = [e for e in entries if e["version"].startswith(version)]
+        if len(matches) != 1:
+            raise ValueError(f"Unknown snapshot version: {version}")
+        return matches[0]
+
+    # Store every table and the metrics table as one version (no-op if it already exists)
+    @traced(category="snapshot")
+    def commit(self, version: str, tables: dict[str, pd.DataFrame], metrics_df: pd.DataFrame) -> tuple[dict, bool]:
+        # Threads share the directory's lock; other processes wait on the lock file
+        with _commit_lock(self.directory), _lock_file(self.directory / LOCK_NAME):
+            existing = [e for e in self.versions() if e["version"] == version]
+            if existing:
+                return existing[0], False
+
+            entry = {
+                "version": version,
+                "parent": (self.versions() or [{}])[-1].get("version"),
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "tables": {name: self._put_table(name, df) for name, df in tables.items()},
+                "metrics": self._put_metrics(metrics_df),
+            }
+
+            # One line per version; a torn write leaves earlier versions readable
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            return entry, True
+
+    def _put_table(self, name: str, df: pd.DataFrame) -> dict:
+        layout = TABLE_LAYOUTS[name]
+        df = df.sort_values(list(layout.sort_by), kind="stable", ignore_index=True)
+
+        n_buckets = N_BUCKETS if layout.bucket_by else 1
+        buckets = bucket_ids(df[layout.bucket_by], n_buckets) if layout.bucket_by else np.zeros(len(df), dtype=np.int64)
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(n_buckets + 1))
+
+        encoded = {col: _encode(df[col]) for col in df.columns}
+        bucket_entries = []
+        for b in range(n_buckets):
+            rows = order[bounds[b]:bounds[b + 1]]
+            chunks, dictionaries = {}, {}
+            for col, (values, is_string) in encoded.items():
+                if is_string:
+                    codes, uniques = _dictionary_encode(values[rows])
+                    chunks[col], dictionaries[col] = self._put(codes), self._put(uniques)
+                else:
+                    chunks[col] = self._put(values[rows])
+            bucket_entries.append({"rows": int(len(rows)), "chunks": chunks, "dictionaries": dictionaries})
+
+        return {
+            "rows": int(len(df)),
+            "columns": {col: str(df[col].dtype) for col in df.columns},
+            "buckets": bucket_entries,
+        }
+
+    def _put_metrics(self, metrics_df: pd.DataFrame) -> dict:
+        ordinals = core.month_ordinals(metrics_df["month"]).astype(float)
+        values = np.column_stack([ordinals, *(metrics_df[col].to_numpy(dtype=float) for col in METRIC_COLUMNS)])
+        return {"columns": METRIC_COLUMNS, "chunk": self._put(values)}
+
+    # One table as of a version; optionally only some buckets
+    @traced(category="snapshot")
+    def read_table(self, version: str, name: str, buckets: list[int] | None = None) -> pd.DataFrame:
+        table = self.entry(version)["tables"].get(name)
+        if table is None:
+            raise ValueError(f"Table {name} is not in snapshot {version}")
+
+        selected = range(len(table["buckets"])) if buckets is None else buckets
+        parts = {col: [] for col in table["columns"]}
+        for b in selected:
+            bucket = table["buckets"][b]
+            for col in table["columns"]:
+                values = self._get(bucket["chunks"][col])
+                dictionary = self._get(bucket["dictionaries"][col]) if col in bucket["dictionaries"] else None
+                parts[col].append(_decode(values, dictionary, table["columns"][col]))
+
+        df = pd.DataFrame({
+            col: pd.concat(series, ignore_index=True) if series else pd.Series([], dtype=table["columns"][col])
+            for col, series in parts.items()
+        })
+        layout = TABLE_LAYOUTS[name]
+        if len(table["buckets"]) > 1:
+            df = df.sort_values(list(layout.sort_by), kind="stable", ignore_index=True)
+        return df
+
+    # The metrics table stored with a version (same shape as compute_metrics_from_frames)
+    def read_metrics(self, version: str) -> pd.DataFrame:
+        metrics = self.entry(version)["metrics"]
+        values = self._get(metrics["chunk"])
+        ordinals = values[:, 0].astype(np.int64)
+        months = [f"{(o - 1) // 12:04d}-{(o - 1) % 12 + 1:02d}" for o in ordinals]
+
+        df = pd.DataFrame({"month": months})
+        for i, col in enumerate(metrics["columns"], start=1):
+            df[col] = values[:, i]
+        df["active_customers"] = df["active_customers"].astype(np.int64)
+        df["month_date"] = pd.to_datetime(df["month"] + "-01")
+        return df
+
+    # Buckets whose chunks differ between two versions (compared by hash, nothing is read)
+    def changed_buckets(self, name: str, old: str, new: str) -> list[int]:
+        old_table = self.entry(old)["tables"].get(name, {"buckets": []})
+        new_table = self.entry(new)["tables"].get(name, {"buckets": []})
+        old_buckets, new_buckets = old_table["buckets"], new_table["buckets"]
+        if len(old_buckets) != len(new_buckets) or old_table.get("columns") != new_table.get("columns"):
+            return list(range(max(len(old_buckets), len(new_buckets))))
+        return [b for b, (x, y) in enumerate(zip(old_buckets, new_buckets)) if x != y]
+
+# --- Dataset-level API ---
+
+# Snapshot the current processed tables under the current data version
+@traced(category="snapshot")
+def commit_snapshot(dataset: Dataset | None = None) -> dict:
+    dataset = dataset or get_dataset()
+
+    version = read_data_version(dataset.processed_dir)
+    if version.startswith("stat-"):
+        version = write_manifest(dataset.processed_dir)["version"]
+
+    tables = {
+        name: loader(dataset)
+        for name, loader in TABLE_LOADERS.items()
+        if (dataset.processed_dir / f"{name}.csv").exists()
+    }
+    metrics_df = core.compute_metrics_from_frames(tables["customer_month_mrr"], tables["revenue_events"])
+
+    store = SnapshotStore.for_dataset(dataset)
+    entry, created = store.commit(version, tables, metrics_df)
+    print(f"Snapshot {version}: {'committed' if created else 'already stored'} ({store.directory})")
+    return entry
+
+# One table as of a snapshot version (used by the core loaders' as_of)
+def load_snapshot_table(dataset: Dataset | None, name: str, as_of: str) -> pd.DataFrame:
+    return SnapshotStore.for_dataset(dataset).read_table(as_of, name)
+
+# The monthly metrics table as of a snapshot version
+def load_snapshot_metrics(dataset: Dataset | None, as_of: str) -> pd.DataFrame:
+    return SnapshotStore.for_dataset(dataset).read_metrics(as_of)
+
+# Restated monthly metrics between two versions: one row per (month, metric) that changed
+@traced(category="snapshot")
+def diff_metrics(dataset: Dataset | None, old: str, new: str) -> pd.DataFrame:
+    store = SnapshotStore.for_dataset(dataset)
+    old_df = store.read_metrics(old).set_index("month")[METRIC_COLUMNS]
+    new_df = store.read_metrics(new).set_index("month")[METRIC_COLUMNS]
+
+    months = old_df.index.union(new_df.index)
+    old_values = old_df.reindex(months, fill_value=0.0).astype(float)
+    new_values = new_df.reindex(months, fill_value=0.0).astype(float)
+
+    long = pd.DataFrame({
+        "month": np.repeat(months.to_numpy(), len(METRIC_COLUMNS)),
+        "metric": np.tile(METRIC_COLUMNS, len(months)),
+        "old": old_values.to_numpy().ravel(),
+        "new": new_values.to_numpy().ravel(),
+    })
+    long["difference"] = long["new"] - long["old"]
+    return long[~np.isclose(long["old"], long["new"])].reset_index(drop=True)
+
+# Rows added or removed in a table between two versions; only changed buckets are read
+@traced(category="snapshot")
+def diff_rows(dataset: Dataset | None, name: str, old: str, new: str) -> pd.DataFrame:
+    store = SnapshotStore.for_dataset(dataset)
+    buckets = store.changed_buckets(name, old, new)
+    if not buckets:
+        return pd.DataFrame(columns=[*store.entry(new)["tables"][name]["columns"], "change"])
+
+    old_df = store.read_table(old, name, buckets)
+    new_df = store.read_table(new, name, buckets)
+    merged = old_df.merge(new_df, how="outer", indicator=True)
+    changed = merged[merged["_merge"] != "both"].copy()
+    changed["change"] = np.where(changed["_merge"] == "left_only", "removed", "added")
+    return changed.drop(columns="_merge").reset_index(drop=True)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Versioned snapshots of the processed tables.")
+    parser.add_argument("--dataset", default=None, help="Tenant dataset name (default: DATASET env var or default data)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("commit", help="Snapshot the current processed tables")
+    sub.add_parser("list", help="List stored versions")
+    diff = sub.add_parser("diff", help="Restated metrics and changed rows between two versions")
+    diff.add_argument("old")
+    diff.add_argument("new", nargs="?", default="latest")
+    diff.add_argument("--table", default="revenue_events", help="Table to list changed rows for")
+    args = parser.parse_args(argv)
+
+    dataset = get_dataset(args.dataset)
+
+    if args.command == "commit":
+        commit_snapshot(dataset)
+    elif args.command == "list":
+        for entry in SnapshotStore.for_dataset(dataset).versions():
+            rows = ", ".join(f"{name} {table['rows']}" for name, table in entry["tables"].items())
+            print(f"{entry['version']}  {entry['created_at']}  {rows}")
+    else:
+        restated = diff_metrics(dataset, args.old, args.new)
+        print(f"Restated metric values: {len(restated)}")
+        if not restated.empty:
+            print(restated.to_string(index=False))
+        rows = diff_rows(dataset, args.table, args.old, args.new)
+        print(f"\n{args.table}: {int((rows['change'] == 'added').sum())} rows added, "
+              f"{int((rows['change'] == 'removed').sum())} removed")
+
+if __name__ == "__main__":
+    load_env()
+    main()
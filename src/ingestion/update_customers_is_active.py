@@ -1,9 +1,12 @@
 import pandas as pd
 
-from src.config import DATA_PROCESSED_DIR
+from src.config import Dataset, get_dataset, load_env
+from src.data_version import write_manifest
+from src.tracing import traced
 
 # Set is_active based on MRR in the latest month
 
+@traced(category="ingestion")
 def update_is_active(
     customers_df: pd.DataFrame,
     month_mrr_df: pd.DataFrame,
@@ -42,9 +45,11 @@ def update_is_active(
     return customers
 
 # Load customers and monthly MRR, update is_active, save customers
-def main() -> None:
-    customers_path = DATA_PROCESSED_DIR / "customers.csv"
-    month_mrr_path = DATA_PROCESSED_DIR / "customer_month_mrr.csv"
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None, update_manifest: bool = True) -> None:
+    dataset = dataset or get_dataset()
+    customers_path = dataset.processed_dir / "customers.csv"
+    month_mrr_path = dataset.processed_dir / "customer_month_mrr.csv"
 
     customers_df = pd.read_csv(customers_path, parse_dates=["signup_date"])
     month_mrr_df = pd.read_csv(month_mrr_path)
@@ -57,6 +62,13 @@ def main() -> None:
     total = len(updated_customers)
     print(f"Updated customers.csv: {active_count}/{total} active as of latest month")
 
+    # Refresh data version so dashboards pick up the new tables
+    # (the pipeline writes it once after the last stage instead)
+    if update_manifest:
+        manifest = write_manifest(customers_path.parent)
+        print("Data version:", manifest["version"])
+
 if __name__ == "__main__":
+    load_env()
     main()
 
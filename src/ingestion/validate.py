@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from src.config import Dataset, get_dataset, load_env
+from src.ingestion.build_customer_month_mrr import get_global_last_date
+from src.tracing import traced
+
+# Outputs go in a subdirectory so they never change the processed data version
+VALIDATION_DIR_NAME = "validation"
+REPORT_NAME = "report.json"
+QUARANTINE_NAME = "quarantine.csv"
+
+# Failing keys listed per check in the report (the quarantine file has all of them)
+REPORT_EXAMPLES = 5
+
+# "line" is the 1-based line in the raw CSV (header is line 1)
+QUARANTINE_COLUMNS = ["table", "line", "key", "check", "severity"]
+
+# Raw tables: primary key plus columns parsed as dates / numbers
+@dataclass(frozen=True)
+class TableSpec:
+    key: str
+    dates: tuple[str, ...] = ()
+    numbers: tuple[str, ...] = ()
+
+TABLE_SPECS = {
+    "accounts": TableSpec("account_id", dates=("signup_date",), numbers=("seats",)),
+    "subscriptions": TableSpec(
+        "subscription_id",
+        dates=("start_date", "end_date"),
+        numbers=("seats", "mrr_amount", "arr_amount"),
+    ),
+    "churn_events": TableSpec("churn_event_id", dates=("churn_date",), numbers=("refund_amount_usd",)),
+    "tickets": TableSpec("ticket_id", dates=("submitted_at", "closed_at")),
+    "usage": TableSpec("usage_id", dates=("usage_date",), numbers=("usage_count", "usage_duration_secs", "error_count")),
+}
+
+PLAN_TIERS = ("Basic", "Pro", "Enterprise")
+
+# MRR differences below this are float noise, not a change
+MRR_TOLERANCE = 1e-6
+
+# One raw table, read once: typed columns plus masks of values that failed to parse
+@dataclass
+class RawTable:
+    frame: pd.DataFrame
+    unparseable: dict[str, np.ndarray] = field(default_factory=dict)
+
+# Parse the spec's date and number columns in place, remembering what failed
+def parse_table(df: pd.DataFrame, spec: TableSpec) -> RawTable:
+    table = RawTable(df)
+    for col in spec.dates:
+        if col in df.columns:
+            parsed = pd.to_datetime(df[col], errors="coerce")
+            table.unparseable[col] = (df[col].notna() & parsed.isna()).to_numpy()
+            df[col] = parsed
+    for col in spec.numbers:
+        if col in df.columns:
+            parsed = pd.to_numeric(df[col], errors="coerce")
+            table.unparseable[col] = (df[col].notna() & parsed.isna()).to_numpy()
+            df[col] = parsed
+    return table
+
+# Every raw table present in the dataset (missing optional tables are skipped)
+def load_raw_tables(dataset: Dataset) -> dict[str, RawTable]:
+    tables = {}
+    for name, spec in TABLE_SPECS.items():
+        path = dataset.raw_dir / f"{name}.csv"
+        if path.exists():
+            tables[name] = parse_table(pd.read_csv(path), spec)
+    return tables
+
+Rule = Callable[[dict[str, RawTable]], np.ndarray]
+
+# A declarative rule: which rows of a table fail it.
+# "error" rows change the metrics tables; "warning" rows are dropped by the builders or are
+# only suspicious.
+@dataclass(frozen=True)
+class Check:
+    name: str
+    table: str
+    severity: str
+    description: str
+    rule: Rule
+    requires: tuple[str, ...] = ()      # other tables the rule reads
+
+# --- Rule builders (each returns a vectorized row mask) ---
+
+# Empty in the CSV (values that failed to parse are reported by unparseable instead)
+def missing(table: str, col: str) -> Rule:
+    return lambda t: t[table].frame[col].isna().to_numpy() & ~t[table].unparseable.get(col, False)
+
+def duplicated(table: str, col: str) -> Rule:
+    return lambda t: t[table].frame[col].duplicated(keep=False).to_numpy()
+
+def unparseable(table: str, col: str) -> Rule:
+    return lambda t: t[table].unparseable[col]
+
+def orphan(table: str, col: str, parent: str, parent_col: str) -> Rule:
+    return lambda t: (
+        t[table].frame[col].notna() & ~t[table].frame[col].isin(t[parent].frame[parent_col])
+    ).to_numpy()
+
+def not_in(table: str, col: str, allowed: tuple[str, ...]) -> Rule:
+    return lambda t: (t[table].frame[col].notna() & ~t[table].frame[col].isin(allowed)).to_numpy()
+
+def below(table: str, col: str, minimum: float) -> Rule:
+    return lambda t: (t[table].frame[col] < minimum).to_numpy()
+
+# Row-wise date ordering: later < earlier (rows with a missing date pass)
+def ends_before(table: str, earlier: str, later: str, inclusive: bool = False) -> Rule:
+    def rule(t: dict[str, RawTable]) -> np.ndarray:
+        df = t[table].frame
+        return ((df[later] <= df[earlier]) if inclusive else (df[later] < df[earlier])).to_numpy()
+    return rule
+
+# Subscription starts before its account signed up
+def _starts_before_signup(t: dict[str, RawTable]) -> np.ndarray:
+    accounts = t["accounts"].frame.drop_duplicates("account_id").set_index("account_id")["signup_date"]
+    subscriptions = t["subscriptions"].frame
+    signup = subscriptions["account_id"].map(accounts)
+    return (subscriptions["start_date"] < signup).to_numpy()
+
+# Zero MRR is expected for trials only
+def _zero_mrr_paid(t: dict[str, RawTable]) -> np.ndarray:
+    df = t["subscriptions"].frame
+    trial = df["is_trial"].astype(str).str.lower().eq("true") if "is_trial" in df.columns else False
+    return ((df["mrr_amount"] == 0) & ~trial).to_numpy()
+
+# ARR should be 12x MRR
+def _arr_mismatch(t: dict[str, RawTable]) -> np.ndarray:
+    df = t["subscriptions"].frame
+    return (~np.isclose(df["arr_amount"], 12 * df["mrr_amount"]) & df["arr_amount"].notna()).to_numpy()
+
+# Subscriptions behind a month-over-month customer MRR change that build_revenue_events
+# cannot classify as new/expansion/contraction/churn (it drops them, so net new MRR no
+# longer adds up to the change in MRR). Customer MRR only changes where a subscription
+# starts or stops, so the check sums those change points instead of expanding months.
+def _unclassified_transitions(t: dict[str, RawTable]) -> np.ndarray:
+    df = t["subscriptions"].frame
+    start, end = df["start_date"], df["end_date"]
+
+    # Same active months as build_customer_month_mrr
+    last_active = (end - pd.Timedelta(days=1)).fillna(get_global_last_date(start.max(), end.max()))
+    rows = np.flatnonzero((start.notna() & df["mrr_amount"].notna() & df["account_id"].notna() & (last_active >= start)).to_numpy())
+    if not len(rows):
+        return np.zeros(len(df), dtype=bool)
+
+    first_month = (start.dt.year * 12 + start.dt.month).to_numpy()[rows]
+    stop_month = (last_active.dt.year * 12 + last_active.dt.month).to_numpy()[rows] + 1
+    mrr = df["mrr_amount"].to_numpy(dtype=float)[rows]
+    accounts = df["account_id"].to_numpy()[rows]
+
+    points = pd.DataFrame({
+        "account": np.concatenate((accounts, accounts)),
+        "month": np.concatenate((first_month, stop_month)),
+        "delta": np.concatenate((mrr, -mrr)),
+        "row": np.concatenate((rows, rows)),
+    })
+    # Stops after the last month never show up as a transition
+    points = points[points["month"] <= stop_month.max() - 1]
+
+    change = points.groupby(["account", "month"], sort=True)["delta"].sum()
+    mrr_after = change.groupby(level="account").cumsum()
+    mrr_before = mrr_after - change
+    unclassified = (change.abs() > MRR_TOLERANCE) & ((mrr_after < -MRR_TOLERANCE) | (mrr_before < -MRR_TOLERANCE))
+
+    flagged = pd.MultiIndex.from_frame(points[["account", "month"]]).isin(unclassified.index[unclassified.to_numpy()])
+    mask = np.zeros(len(df), dtype=bool)
+    mask[points["row"].to_numpy()[flagged]] = True
+    return mask
+
+CHECKS = [
+    # accounts -> customers.csv
+    Check("account_id_missing", "accounts", "error", "account_id is empty", missing("accounts", "account_id")),
+    Check("account_id_duplicate", "accounts", "error", "account_id appears more than once", duplicated("accounts", "account_id")),
+    Check("signup_date_missing", "accounts", "warning", "signup_date is empty", missing("accounts", "signup_date")),
+    Check("signup_date_invalid", "accounts", "error", "signup_date is not a date", unparseable("accounts", "signup_date")),
+    Check("account_plan_unknown", "accounts", "warning", f"plan_tier not in {PLAN_TIERS}", not_in("accounts", "plan_tier", PLAN_TIERS)),
+
+    # subscriptions -> customer_month_mrr.csv and revenue_events.csv
+    Check("subscription_id_missing", "subscriptions", "error", "subscription_id is empty", missing("subscriptions", "subscription_id")),
+    Check("subscription_id_duplicate", "subscriptions", "error", "subscription_id appears more than once", duplicated("subscriptions", "subscription_id")),
+    Check("subscription_account_missing", "subscriptions", "error", "account_id is empty", missing("subscriptions", "account_id")),
+    Check("subscription_account_orphan", "subscriptions", "error", "account_id not in accounts.csv",
+          orphan("subscriptions", "account_id", "accounts", "account_id"), requires=("accounts",)),
+    Check("start_date_missing", "subscriptions", "error", "start_date is empty", missing("subscriptions", "start_date")),
+    Check("start_date_invalid", "subscriptions", "error", "start_date is not a date", unparseable("subscriptions", "start_date")),
+    Check("end_date_invalid", "subscriptions", "error", "end_date is not a date", unparseable("subscriptions", "end_date")),
+    Check("end_not_after_start", "subscriptions", "warning", "end_date on or before start_date (no active months; skipped)",
+          ends_before("subscriptions", "start_date", "end_date", inclusive=True)),
+    Check("mrr_missing", "subscriptions", "error", "mrr_amount is empty", missing("subscriptions", "mrr_amount")),
+    Check("mrr_invalid", "subscriptions", "error", "mrr_amount is not a number", unparseable("subscriptions", "mrr_amount")),
+    Check("mrr_negative", "subscriptions", "error", "mrr_amount below zero (breaks event classification)",
+          below("subscriptions", "mrr_amount", 0)),
+    Check("mrr_transition_unclassified", "subscriptions", "error",
+          "customer MRR goes negative, so a month-over-month change is not new/expansion/contraction/churn "
+          "(dropped from revenue_events)", _unclassified_transitions),
+    Check("mrr_zero_paid", "subscriptions", "warning", "mrr_amount is 0 on a non-trial subscription", _zero_mrr_paid),
+    Check("arr_mismatch", "subscriptions", "warning", "arr_amount is not 12 x mrr_amount", _arr_mismatch),
+    Check("start_before_signup", "subscriptions", "warning", "start_date before the account's signup_date",
+          _starts_before_signup, requires=("accounts",)),
+
+    # Tables the metrics do not read: key integrity only
+    Check("churn_event_id_duplicate", "churn_events", "warning", "churn_event_id appears more than once", duplicated("churn_events", "churn_event_id")),
+    Check("churn_account_orphan", "churn_events", "warning", "account_id not in accounts.csv",
+          orphan("churn_events", "account_id", "accounts", "account_id"), requires=("accounts",)),
+    Check("ticket_id_duplicate", "tickets", "warning", "ticket_id appears more than once", duplicated("tickets", "ticket_id")),
+    Check("ticket_account_orphan", "tickets", "warning", "account_id not in accounts.csv",
+          orphan("tickets", "account_id", "accounts", "account_id"), requires=("accounts",)),
+    Check("ticket_closed_before_submitted", "tickets", "warning", "closed_at before submitted_at",
+          ends_before("tickets", "submitted_at", "closed_at")),
+    Check("usage_id_duplicate", "usage", "warning", "usage_id appears more than once", duplicated("usage", "usage_id")),
+    Check("usage_subscription_orphan", "usage", "warning", "subscription_id not in subscriptions.csv",
+          orphan("usage", "subscription_id", "subscriptions", "subscription_id"), requires=("subscriptions",)),
+]
+
+# Outcome of one check
+@dataclass
+class CheckResult:
+    check: Check
+    rows: np.ndarray           # indices of failing rows
+
+# All results plus table sizes and timing
+@dataclass
+class ValidationReport:
+    dataset: str
+    table_rows: dict[str, int]
+    results: list[CheckResult]
+    seconds: float
+
+    @property
+    def errors(self) -> int:
+        return sum(len(r.rows) for r in self.results if r.check.severity == "error")
+
+    @property
+    def warnings(self) -> int:
+        return sum(len(r.rows) for r in self.results if r.check.severity == "warning")
+
+    # Compact JSON summary: failed checks with counts and a few keys, passed checks by name
+    def to_dict(self, tables: dict[str, RawTable]) -> dict:
+        failed = []
+        for result in self.results:
+            if not len(result.rows):
+                continue
+            key_col = TABLE_SPECS[result.check.table].key
+            keys = tables[result.check.table].frame[key_col].iloc[result.rows[:REPORT_EXAMPLES]]
+            failed.append({
+                "check": result.check.name,
+                "table": result.check.table,
+                "severity": result.check.severity,
+                "description": result.check.description,
+                "failed": int(len(result.rows)),
+                "examples": [str(k) for k in keys],
+            })
+        return {
+            "dataset": self.dataset,
+            "tables": self.table_rows,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "seconds": round(self.seconds, 4),
+            "failed": failed,
+            "passed": [r.check.name for r in self.results if not len(r.rows)],
+        }
+
+# Run every check whose tables are present
+@traced(category="ingestion")
+def run_checks(tables: dict[str, RawTable], checks: list[Check] = CHECKS, dataset_name: str = "") -> ValidationReport:
+    started = time.perf_counter()
+    results = []
+    for check in checks:
+        if check.table not in tables or any(name not in tables for name in check.requires):
+            continue
+        mask = np.asarray(check.rule(tables), dtype=bool)
+        results.append(CheckResult(check, np.flatnonzero(mask)))
+
+    return ValidationReport(
+        dataset=dataset_name,
+        table_rows={name: len(table.frame) for name, table in tables.items()},
+        results=results,
+        seconds=time.perf_counter() - started,
+    )
+
+# One row per (failing row, check)
+def quarantine_frame(report: ValidationReport, tables: dict[str, RawTable]) -> pd.DataFrame:
+    parts = []
+    for result in report.results:
+        if not len(result.rows):
+            continue
+        key_col = TABLE_SPECS[result.check.table].key
+        parts.append(pd.DataFrame({
+            "table": result.check.table,
+            "line": result.rows + 2,
+            "key": tables[result.check.table].frame[key_col].to_numpy()[result.rows],
+            "check": result.check.name,
+            "severity": result.check.severity,
+        }))
+    if not parts:
+        return pd.DataFrame(columns=QUARANTINE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+# Directory holding the report and quarantine file for a dataset
+def validation_dir(dataset: Dataset) -> Path:
+    return dataset.processed_dir / VALIDATION_DIR_NAME
+
+# Write report.json and quarantine.csv (atomic replace)
+def write_outputs(report: ValidationReport, tables: dict[str, RawTable], directory: Path) -> tuple[Path, Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+
+    report_path = directory / REPORT_NAME
+    tmp_path = report_path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(report.to_dict(tables), indent=2), encoding="utf-8")
+    os.replace(tmp_path, report_path)
+
+    quarantine_path = directory / QUARANTINE_NAME
+    tmp_path = quarantine_path.with_suffix(".csv.tmp")
+    quarantine_frame(report, tables).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, quarantine_path)
+
+    return report_path, quarantine_path
+
+# Validate the raw tables of a dataset and write the report and quarantine file
+@traced(category="ingestion")
+def main(dataset: Dataset | None = None) -> ValidationReport:
+    dataset = dataset or get_dataset()
+
+    tables = load_raw_tables(dataset)
+    report = run_checks(tables, dataset_name=dataset.name)
+    report_path, quarantine_path = write_outputs(report, tables, validation_dir(dataset))
+
+    print(f"Validated {sum(report.table_rows.values())} rows in {len(tables)} tables ({report.seconds:.3f}s)")
+    for result in report.results:
+        if len(result.rows):
+            print(f"  {result.check.severity:7s} {result.check.name}: {len(result.rows)} rows ({result.check.description})")
+    print(f"{report.errors} error rows, {report.warnings} warning rows")
+    print(f"Report: {report_path}")
+    print(f"Quarantine: {quarantine_path}")
+
+    return report
+
+if __name__ == "__main__":
+    load_env()
+    main()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.llm.client import LLMRequest
+from src.llm.gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMGateway, LLMGatewayTimeout
+
+# Stand-in for a single local model: fixed latency, records peak concurrency and call order
+@dataclass
+class SlowClient:
+    latency: float
+    base_url: str = "bench://local"
+    model: str = "bench"
+    calls: list = field(default_factory=list)
+    running: int = 0
+    peak: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def generate(self, request: LLMRequest) -> str:
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.calls.append(request.prompt)
+        time.sleep(self.latency)
+        with self._lock:
+            self.running -= 1
+        return f"answer to {request.prompt}"
+
+# Every session clicks one of a few buttons at roughly the same time
+def burst(gateway, client, sessions: int, distinct: int, max_concurrency: int, direct: bool) -> float:
+    errors = []
+
+    def session(i: int) -> None:
+        request = LLMRequest(prompt=f"Executive summary, window {i % distinct}")
+        try:
+            if direct:
+                client.generate(request)
+            else:
+                gateway.generate(client, request, "bench", max_concurrency=max_concurrency)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - started
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="LLM gateway: coalescing, concurrency cap, priorities and timeouts.")
+    parser.add_argument("--sessions", type=int, default=40, help="concurrent dashboard sessions")
+    parser.add_argument("--distinct", type=int, default=4, help="distinct prompts among them")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+    parser.add_argument("--max-concurrency", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    failures = []
+
+    direct_client = SlowClient(args.latency)
+    direct_seconds = burst(None, direct_client, args.sessions, args.distinct, args.max_concurrency, direct=True)
+    print(f"direct:  {len(direct_client.calls):4d} model calls, peak concurrency {direct_client.peak:3d}, {direct_seconds:6.2f}s")
+
+    gateway = LLMGateway()
+    client = SlowClient(args.latency)
+    gateway_seconds = burst(gateway, client, args.sessions, args.distinct, args.max_concurrency, direct=False)
+    print(f"gateway: {len(client.calls):4d} model calls, peak concurrency {client.peak:3d}, {gateway_seconds:6.2f}s")
+    if len(client.calls) != args.distinct:
+        failures.append(f"expected {args.distinct} model calls, got {len(client.calls)}")
+    if client.peak > args.max_concurrency:
+        failures.append(f"peak concurrency {client.peak} exceeds {args.max_concurrency}")
+
+    # Priorities: with the lane busy, an interactive request overtakes queued background ones
+    client = SlowClient(args.latency)
+    gateway = LLMGateway()
+    blocker = threading.Thread(target=gateway.generate, args=(client, LLMRequest(prompt="busy"), "bench"))
+    blocker.start()
+    time.sleep(args.latency / 4)
+    waiting = [
+        threading.Thread(target=gateway.generate, args=(client, LLMRequest(prompt=f"background {i}"), "bench", PRIORITY_BACKGROUND))
+        for i in range(3)
+    ]
+    for t in waiting:
+        t.start()
+    time.sleep(args.latency / 4)
+    gateway.generate(client, LLMRequest(prompt="interactive"), "bench", PRIORITY_INTERACTIVE)
+    for t in [blocker, *waiting]:
+        t.join()
+    print(f"order:   {client.calls}")
+    if client.calls[1] != "interactive":
+        failures.append("interactive request did not jump the queue")
+
+    # Timeouts: a queued request whose caller gives up is dropped without calling the model
+    client = SlowClient(args.latency)
+    gateway = LLMGateway()
+    blocker = threading.Thread(target=gateway.generate, args=(client, LLMRequest(prompt="busy"), "bench"))
+    blocker.start()
+    time.sleep(args.latency / 4)
+    try:
+        gateway.generate(client, LLMRequest(prompt="impatient"), "bench", timeout=args.latency / 4)
+        failures.append("queued request did not time out")
+    except LLMGatewayTimeout:
+        pass
+    blocker.join()
+    time.sleep(args.latency / 4)
+    if "impatient" in client.calls:
+        failures.append("timed-out request still reached the model")
+
+    stats = gateway.stats()[0]
+    print(f"stats:   {stats}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: identical requests coalesced, concurrency capped, priorities and timeouts honoured")
+
+if __name__ == "__main__":
+    main()
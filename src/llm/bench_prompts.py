@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.llm.prompts import build_executive_summary_prompt, build_metrics_prompt, clear_prompt_cache
+from src.metrics.anomalies import detect_anomalies
+from src.metrics.bench_kernel import generate_frames
+from src.metrics.core import METRIC_OPTIONS, compute_metrics_from_frames
+
+# Every metric prompt plus the executive summary for each window and question
+def build_all(metrics_df, anomalies_df, windows, questions, data_version):
+    prompts = []
+    for n_months in windows:
+        window_df = metrics_df.tail(n_months)
+        for question in questions:
+            prompts.append(build_executive_summary_prompt(window_df, question, anomalies_df, data_version=data_version))
+            for label, col in METRIC_OPTIONS.items():
+                prompts.append(build_metrics_prompt(window_df, label, col, question, anomalies_df, data_version=data_version))
+    return prompts
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Prompt build time with and without memoized fragments.")
+    parser.add_argument("--months", type=int, default=120, help="months in the metrics table")
+    parser.add_argument("--questions", type=int, default=20, help="distinct user questions per (metric, window)")
+    args = parser.parse_args(argv)
+
+    month_mrr_df, events_df = generate_frames(200_000, args.months)
+    metrics_df = compute_metrics_from_frames(month_mrr_df, events_df)
+
+    cols = list(METRIC_OPTIONS.values())
+    anomalies_df = detect_anomalies(
+        metrics_df[cols].to_numpy(dtype=float).T,
+        metrics_df["month"].tolist(),
+        [("all", "all", col) for col in cols],
+    )
+
+    windows = [6, 12, 24, args.months]
+    questions = [None] + [f"What happened in month {i}?" for i in range(1, args.questions)]
+    n_prompts = len(windows) * len(questions) * (len(cols) + 1)
+    print(f"{n_prompts} prompts: {len(windows)} windows x {len(cols) + 1} prompt types x {len(questions)} questions")
+
+    started = time.perf_counter()
+    uncached = build_all(metrics_df, anomalies_df, windows, questions, data_version=None)
+    uncached_seconds = time.perf_counter() - started
+
+    clear_prompt_cache()
+    started = time.perf_counter()
+    cached = build_all(metrics_df, anomalies_df, windows, questions, data_version="bench")
+    cached_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    build_all(metrics_df, anomalies_df, windows, questions, data_version="bench")
+    warm_seconds = time.perf_counter() - started
+
+    per_prompt = lambda seconds: seconds / n_prompts * 1000
+    print(f"before (render every prompt): {uncached_seconds:7.3f}s  {per_prompt(uncached_seconds):7.3f} ms/prompt")
+    print(f"memoized (cold cache):        {cached_seconds:7.3f}s  {per_prompt(cached_seconds):7.3f} ms/prompt")
+    print(f"memoized (warm cache):        {warm_seconds:7.3f}s  {per_prompt(warm_seconds):7.3f} ms/prompt  "
+          f"({uncached_seconds / warm_seconds:.0f}x)")
+
+    if uncached != cached:
+        mismatches = int(np.sum([a != b for a, b in zip(uncached, cached)]))
+        print(f"FAIL: {mismatches} memoized prompts differ from freshly built ones")
+        sys.exit(1)
+    print("OK: memoized prompts are identical")
+
+if __name__ == "__main__":
+    main()
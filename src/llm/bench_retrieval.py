@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import resource
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.llm.retrieval import RetrievalIndex, Snippet, bm25, hash_strings, length_norm, tokenize
+
+INDUSTRIES = ["Cybersecurity", "Fintech", "Healthcare", "Retail", "Logistics", "Education", "Media", "Energy"]
+COUNTRIES = ["US", "UK", "DE", "FR", "IN", "BR", "CA", "AU", "JP", "NL"]
+PLANS = ["Basic", "Pro", "Enterprise"]
+EVENTS = ["new", "expansion", "contraction", "churn"]
+
+# Customer-style snippets with realistic vocabulary: ids, names, attributes and event history
+def generate_snippets(n: int, seed: int = 0, offset: int = 0) -> list[Snippet]:
+    rng = np.random.default_rng(seed)
+    industry = rng.integers(0, len(INDUSTRIES), n)
+    country = rng.integers(0, len(COUNTRIES), n)
+    plan = rng.integers(0, len(PLANS), n)
+    n_events = rng.integers(1, 5, n)
+    event_type = rng.integers(0, len(EVENTS), (n, 4))
+    year = rng.integers(2019, 2025, (n, 4))
+    month = rng.integers(1, 13, (n, 4))
+    amount = rng.integers(50, 5000, (n, 4))
+
+    snippets = []
+    for i in range(n):
+        cid = f"B-{offset + i:07x}"
+        history = "; ".join(
+            f"{EVENTS[event_type[i, j]]} {year[i, j]}-{month[i, j]:02d} ${amount[i, j]}"
+            for j in range(n_events[i])
+        )
+        snippets.append(Snippet(
+            f"customer:{cid}",
+            f"Customer {cid} (Company_{offset + i}), {INDUSTRIES[industry[i]]}, {COUNTRIES[country[i]]}, "
+            f"initial plan {PLANS[plan[i]]}. Revenue events: {history}",
+            "customer",
+        ))
+    return snippets
+
+# Top-k scores from scoring every document (no pruning), to check the pruned search
+def exhaustive_scores(index: RetrievalIndex, query: str, k: int, sources: set[str] | None = None) -> list[float]:
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    term_ids = [segment.term_ids(hash_strings(terms)) for segment in index.segments]
+    dfs = np.zeros(len(terms))
+    for segment, tids in zip(index.segments, term_ids):
+        for j in np.flatnonzero(tids >= 0):
+            dfs[j] += segment.df(int(tids[j]))
+    n_docs = index._total_docs
+    avgdl = index._total_len / n_docs
+    idf = np.log(1 + (n_docs - dfs + 0.5) / (dfs + 0.5))
+
+    scores = []
+    for segment, tids in zip(index.segments, term_ids):
+        doc_scores = np.zeros(len(segment))
+        norm = length_norm(segment.doc_lens, avgdl)
+        for j in np.flatnonzero(tids >= 0):
+            docs, tfs = segment.postings(int(tids[j]))
+            doc_scores[docs] += bm25(idf[j], tfs.astype(float), norm[docs])
+        keep = segment.live & (doc_scores > 0)
+        if sources is not None:
+            keep &= np.isin(segment.source_codes, segment.source_code_list(sources))
+        scores += doc_scores[keep].tolist()
+    return sorted(scores, reverse=True)[:k]
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Retrieval index build, query and incremental update timings.")
+    parser.add_argument("--snippets", type=int, default=2_000_000, help="snippets in the base index")
+    parser.add_argument("--chunk", type=int, default=1_000_000, help="snippets per add (one segment each)")
+    parser.add_argument("--queries", type=int, default=300, help="queries to time")
+    parser.add_argument("--updates", type=int, default=1_000, help="snippets in the incremental update")
+    parser.add_argument("--runs", type=int, default=3, help="runs per query (the fastest counts)")
+    parser.add_argument("--check", type=int, default=30, help="queries compared with exhaustive scoring")
+    parser.add_argument("--budget-ms", type=float, default=6.0, help="fail if p99 query latency exceeds this")
+    args = parser.parse_args(argv)
+
+    # Built in chunks so the generated snippets never all exist at once
+    started = time.perf_counter()
+    index = RetrievalIndex()
+    for chunk_no, offset in enumerate(range(0, args.snippets, args.chunk)):
+        index.add(generate_snippets(min(args.chunk, args.snippets - offset), seed=chunk_no, offset=offset))
+    index.add([
+        Snippet(f"explanation:{i}", f"Earlier explanation of {INDUSTRIES[i % len(INDUSTRIES)]} churn in "
+                f"{COUNTRIES[i % len(COUNTRIES)]} for 2023-0{1 + i % 9}.", "explanation")
+        for i in range(200)
+    ])
+    build_seconds = time.perf_counter() - started
+    print(f"build:   {build_seconds:7.2f}s for {len(index):,} snippets ({len(index.segments)} segments)")
+
+    # Customer ids, attribute questions and broad ones where every term is common
+    rng = np.random.default_rng(1)
+    targets = rng.integers(0, args.snippets, args.queries)
+    kinds = ["id", "attributes", "broad"]
+    queries = []
+    for q, t in enumerate(targets):
+        kind = kinds[q % 3]
+        if kind == "id":
+            queries.append((kind, f"What happened with customer B-{t:07x}?", None))
+        elif kind == "attributes":
+            queries.append((kind, f"{INDUSTRIES[q % len(INDUSTRIES)]} churn in {COUNTRIES[q % len(COUNTRIES)]} 2023-0{1 + q % 9}", None))
+        else:
+            queries.append((kind, f"Why did {INDUSTRIES[q % len(INDUSTRIES)]} {EVENTS[q % len(EVENTS)]} grow?", None))
+    queries += [("explanations", query, {"explanation"}) for _, query, _ in queries[:len(queries) // 3]]
+
+    # Best of a few runs per query, so a scheduler hiccup is not counted as query latency
+    latencies = {kind: [] for kind in [*kinds, "explanations"]}
+    found = 0
+    for q, (kind, query, sources) in enumerate(queries):
+        best = float("inf")
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            hits = index.search(query, k=5, sources=sources)
+            best = min(best, time.perf_counter() - started)
+        latencies[kind].append(best)
+        if kind == "id" and hits and hits[0].key == f"customer:B-{targets[q]:07x}":
+            found += 1
+    all_ms = np.concatenate([np.array(v) for v in latencies.values()]) * 1000
+    for kind, values in latencies.items():
+        ms = np.array(values) * 1000
+        print(f"query:   {kind:12s} p50 {np.percentile(ms, 50):6.2f} ms  p99 {np.percentile(ms, 99):6.2f} ms")
+    p99 = float(np.percentile(all_ms, 99))
+    print(f"query:   {'all':12s} p50 {np.percentile(all_ms, 50):6.2f} ms  p99 {p99:6.2f} ms")
+
+    # Pruned top-k must equal exhaustive scoring
+    failures = []
+    for kind, query, sources in queries[::max(len(queries) // args.check, 1)][:args.check]:
+        got = [hit.score for hit in index.search(query, k=5, sources=sources)]
+        expected = exhaustive_scores(index, query, 5, sources)
+        if len(got) != len(expected) or not np.allclose(got, expected):
+            failures.append(f"{kind} query {query!r} differs from exhaustive scoring")
+
+    # Upsert: half replace existing keys, half are new
+    updates = generate_snippets(args.updates // 2, seed=2) + generate_snippets(args.updates - args.updates // 2, seed=3, offset=args.snippets)
+    started = time.perf_counter()
+    index.add(updates)
+    update_seconds = time.perf_counter() - started
+    print(f"update:  {update_seconds * 1000:7.1f} ms for {len(updates):,} snippets ({len(index.segments)} segments)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        index.save(Path(tmp))
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        reloaded = RetrievalIndex.load(Path(tmp))
+        load_seconds = time.perf_counter() - started
+        print(f"persist: save {save_seconds:6.2f}s  load {load_seconds:6.2f}s")
+
+        probe = queries[0][1]
+        if [h.key for h in reloaded.search(probe)] != [h.key for h in index.search(probe)]:
+            failures.append("reloaded index ranks differently")
+        del reloaded
+
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB")
+
+    expected_found = len(latencies["id"])
+    if found != expected_found:
+        failures.append(f"customer id queries found their customer {found}/{expected_found} times")
+    if p99 > args.budget_ms:
+        failures.append(f"p99 query latency {p99:.2f} ms exceeds {args.budget_ms:.1f} ms")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print(f"OK: pruned search matches exhaustive scoring, p99 {p99:.2f} ms, "
+          f"every customer id query ranked its customer first ({found}/{expected_found})")
+
+if __name__ == "__main__":
+    main()
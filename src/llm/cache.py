@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict
+from pathlib import Path
+
+from src.config import PROJECT_ROOT
+
+from .client import LLMClient, LLMRequest
+
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "llm"
+
+# Stable key for a request against a specific provider/model
+def request_key(client: LLMClient, request: LLMRequest) -> str:
+    payload = {
+        "client": type(client).__name__,
+        "base_url": getattr(client, "base_url", None),
+        "model": getattr(client, "model", None),
+        "request": asdict(request),
+    }
+    raw = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+# On-disk cache of LLM responses, one JSON file per request key
+class ResponseCache:
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR) -> None:
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    # Return the cached response text, or None on a miss
+    def get(self, key: str) -> str | None:
+        try:
+            entry = json.loads(self._path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return entry.get("response")
+
+    # Store a response (atomic replace so concurrent writers never see partial files)
+    def put(self, key: str, response: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"response": response}), encoding="utf-8")
+        os.replace(tmp_path, path)
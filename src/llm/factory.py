@@ -1,45 +1,95 @@
 from __future__ import annotations
 
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from functools import lru_cache
+
+from src.config import load_env
 
 from .ollama_client import OllamaClient
 from .client import LLMClient
 from .openrouter_client import OpenRouterClient
 
-# Factory function to create LLM client 
-def get_llm_client() -> LLMClient:
-    load_dotenv()
+# LLM configuration, read from the environment once
+@dataclass(frozen=True)
+class LLMSettings:
+    provider: str
+    base_url: str
+    model: str
+    api_key: str = ""
+    timeout_seconds: int = 60
+    app_url: str | None = None
+    app_title: str | None = None
+
+# Parse LLM settings from .env / environment (cached; see reload_llm_settings)
+@lru_cache(maxsize=1)
+def load_llm_settings() -> LLMSettings:
+    load_env()
     provider = os.getenv("LLM_PROVIDER", "ollama").strip().lower()
 
     if provider == "ollama":
-        base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").strip()
-        model = os.getenv("OLLAMA_MODEL", "phi3.5:3.8b-mini-instruct-q4_K_M").strip()
-        return OllamaClient(base_url=base_url, model=model)
-    
+        return LLMSettings(
+            provider=provider,
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").strip(),
+            model=os.getenv("OLLAMA_MODEL", "phi3.5:3.8b-mini-instruct-q4_K_M").strip(),
+        )
+
     if provider == "openrouter":
-        api_key = os.getenv("OPENROUTER_API_KEY", "").strip()
-        if not api_key:
-            raise ValueError("OPENROUTER_API_KEY is missing in .env")
+        return LLMSettings(
+            provider=provider,
+            base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").strip(),
+            model=os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-120b:free").strip(),
+            api_key=os.getenv("OPENROUTER_API_KEY", "").strip(),
+            timeout_seconds=int(os.getenv("OPENROUTER_TIMEOUT_SECONDS", "60")),
+            app_url=os.getenv("OPENROUTER_APP_URL", "").strip() or None,
+            app_title=os.getenv("OPENROUTER_APP_TITLE", "").strip() or None,
+        )
 
-        base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").strip()
-        model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-120b:free").strip()  
-        timeout = int(os.getenv("OPENROUTER_TIMEOUT_SECONDS", "60"))
+    raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
 
-        app_url = os.getenv("OPENROUTER_APP_URL", "").strip() or None
-        app_title = os.getenv("OPENROUTER_APP_TITLE", "").strip() or None
+# One client per distinct configuration, shared by all callers
+@lru_cache(maxsize=8)
+def _build_client(settings: LLMSettings) -> LLMClient:
+    if settings.provider == "ollama":
+        return OllamaClient(base_url=settings.base_url, model=settings.model)
+
+    if settings.provider == "openrouter":
+        if not settings.api_key:
+            raise ValueError("OPENROUTER_API_KEY is missing in .env")
 
         return OpenRouterClient(
-            base_url=base_url,
-            api_key=api_key,
-            model=model,
-            timeout_seconds=timeout,
-            app_url=app_url,
-            app_title=app_title,
+            base_url=settings.base_url,
+            api_key=settings.api_key,
+            model=settings.model,
+            timeout_seconds=settings.timeout_seconds,
+            app_url=settings.app_url,
+            app_title=settings.app_title,
         )
 
-    raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
+    raise ValueError(f"Unknown LLM_PROVIDER: {settings.provider}")
+
+# Factory function to create LLM client 
+def get_llm_client(settings: LLMSettings | None = None) -> LLMClient:
+    return _build_client(settings or load_llm_settings())
 
 # Helper function to get LLM provider
 def get_llm_provider() -> str:
-    return os.getenv("LLM_PROVIDER", "ollama").strip().lower()
\ No newline at end of file
+    return load_llm_settings().provider
+
+# Re-read the environment on the next call (e.g. after editing .env)
+def reload_llm_settings() -> None:
+    load_llm_settings.cache_clear()
+    _build_client.cache_clear()
+
+# Concurrent LLM requests per provider (a single local Ollama instance handles one at a time)
+def get_max_concurrency(provider: str) -> int:
+    value = os.getenv("LLM_MAX_CONCURRENCY", "").strip()
+    if value:
+        return max(1, int(value))
+    return 1 if provider == "ollama" else 4
+
+# Default generation settings per provider (local models get a tighter budget)
+def get_request_options(provider: str) -> dict:
+    if provider == "ollama":
+        return {"temperature": 0.1, "max_tokens": 1000}
+    return {"temperature": 0.2, "max_tokens": 1200}
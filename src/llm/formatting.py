@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+# Cleanup LLM output to remove common formatting issues
+def cleanup_llm_output(text: str, provider: str) -> str:
+    """
+    Fix common formatting issues from local models.
+    """
+    cleaned = text.strip()
+
+    if provider == "ollama":
+        # Remove triple backtick code fences if the model accidentally uses them
+        cleaned = cleaned.replace("```", "")
+
+        # Some models repeat "Top 3 takeaways" twice; keep the first occurrence
+        marker = "Top 3 takeaways"
+        first = cleaned.find(marker)
+        if first != -1:
+            second = cleaned.find(marker, first + 1)
+            if second != -1:
+                cleaned = cleaned[:second].strip()
+
+    return cleaned
+
+# Sanitize Markdown text to prevent Streamlit from treating underscores as italics
+def sanitize_markdown(text: str) -> str:
+    """
+    Escape underscores only outside inline code blocks marked by backticks.
+    This prevents accidental italics while keeping `mrr_total` clean.
+    """
+    result = []
+    in_code = False
+
+    for ch in text:
+        if ch == "`":
+            in_code = not in_code
+            result.append(ch)
+            continue
+
+        if (not in_code) and ch == "_":
+            result.append("\\_")
+        else:
+            result.append(ch)
+
+    return "".join(result)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.tracing import traced
+
+from .cache import request_key
+from .client import LLMClient, LLMRequest
+
+# Lower runs first: dashboard clicks before API / scheduled requests
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Concurrent requests per provider when the caller does not say
+DEFAULT_MAX_CONCURRENCY = 1
+
+# Queue waits kept per provider for the wait-time percentiles
+WAIT_SAMPLES = 1000
+
+# Raised when a request is still waiting (queued or running) after its timeout
+class LLMGatewayTimeout(TimeoutError):
+    pass
+
+# One distinct request; every caller asking for the same key shares its future
+@dataclass
+class _Job:
+    key: str
+    client: LLMClient
+    request: LLMRequest
+    priority: int
+    enqueued_at: float
+    future: Future = field(default_factory=Future)
+    waiters: int = 1
+
+# Priority queue and workers for one provider
+@dataclass
+class _Lane:
+    provider: str
+    max_concurrency: int
+    heap: list = field(default_factory=list)
+    workers: int = 0
+    running: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    submitted: int = 0
+    coalesced: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0              # callers that gave up
+    dropped: int = 0                # queued jobs abandoned by every caller
+    waits: deque = field(default_factory=lambda: deque(maxlen=WAIT_SAMPLES))
+
+# Process-wide front door for LLM calls: identical in-flight requests share one call,
+# each provider runs at most max_concurrency requests, and the rest wait by priority
+class LLMGateway:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._lanes: dict[str, _Lane] = {}
+        self._inflight: dict[str, _Job] = {}
+        self._seq = itertools.count()
+
+    def _lane(self, provider: str, max_concurrency: int | None) -> _Lane:
+        lane = self._lanes.get(provider)
+        if lane is None:
+            lane = _Lane(provider, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+            self._lanes[provider] = lane
+        elif max_concurrency is not None:
+            lane.max_concurrency = max_concurrency
+        return lane
+
+    # Queue a request (or join an identical one already queued or running)
+    def submit(
+        self,
+        client: LLMClient,
+        request: LLMRequest,
+        provider: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        max_concurrency: int | None = None,
+    ) -> tuple[_Job, bool]:
+        key = request_key(client, request)
+        with self._lock:
+            lane = self._lane(provider, max_concurrency)
+            lane.submitted += 1
+
+            job = self._inflight.get(key)
+            if job is not None:
+                lane.coalesced += 1
+                job.waiters += 1
+                # A more urgent caller moves a still-queued job up; the stale heap entry is skipped
+                if priority < job.priority and not job.future.running():
+                    job.priority = priority
+                    heapq.heappush(lane.heap, (priority, next(self._seq), job))
+                return job, True
+
+            job = _Job(key, client, request, priority, time.perf_counter())
+            self._inflight[key] = job
+            heapq.heappush(lane.heap, (priority, next(self._seq), job))
+            lane.queued += 1
+            lane.max_queued = max(lane.max_queued, lane.queued)
+
+            while lane.workers < lane.max_concurrency:
+                lane.workers += 1
+                threading.Thread(target=self._worker, args=(lane,), name=f"llm-{provider}", daemon=True).start()
+            self._work.notify_all()
+            return job, False
+
+    # Generate through the gateway; waits at most timeout seconds (queue + generation)
+    @traced(category="llm")
+    def generate(
+        self,
+        client: LLMClient,
+        request: LLMRequest,
+        provider: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+    ) -> str:
+        job, _ = self.submit(client, request, provider, priority, max_concurrency)
+        try:
+            return job.future.result(timeout=timeout)
+        except (FutureTimeoutError, CancelledError):
+            self._abandon(job, provider)
+            raise LLMGatewayTimeout(f"LLM request timed out after {timeout or 0:.0f}s") from None
+
+    # A caller gave up; drop the job if nobody else is waiting and it has not started
+    def _abandon(self, job: _Job, provider: str) -> None:
+        with self._lock:
+            lane = self._lanes[provider]
+            lane.timed_out += 1
+            job.waiters -= 1
+            if job.waiters > 0 or not job.future.cancel():
+                return
+            lane.queued -= 1
+            lane.dropped += 1
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    def _worker(self, lane: _Lane) -> None:
+        while True:
+            with self._lock:
+                while True:
+                    if lane.workers > lane.max_concurrency:
+                        lane.workers -= 1
+                        return
+                    job = self._next_job(lane)
+                    if job is not None:
+                        break
+                    self._work.wait()
+                lane.queued -= 1
+                lane.running += 1
+                lane.waits.append(time.perf_counter() - job.enqueued_at)
+
+            try:
+                job.future.set_result(job.client.generate(job.request))
+                ok = True
+            except Exception as e:
+                job.future.set_exception(e)
+                ok = False
+
+            with self._lock:
+                lane.running -= 1
+                if ok:
+                    lane.completed += 1
+                else:
+                    lane.failed += 1
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    # Highest-priority job that is neither cancelled nor already taken
+    def _next_job(self, lane: _Lane) -> _Job | None:
+        while lane.heap:
+            _, _, job = heapq.heappop(lane.heap)
+            if job.future.done() or job.future.running():
+                continue
+            if job.future.set_running_or_notify_cancel():
+                return job
+        return None
+
+    # Queue depth, throughput counters and queue wait percentiles per provider
+    def stats(self) -> list[dict]:
+        with self._lock:
+            rows = []
+            for lane in self._lanes.values():
+                waits = np.array(lane.waits) * 1000
+                rows.append({
+                    "provider": lane.provider,
+                    "max_concurrency": lane.max_concurrency,
+                    "running": lane.running,
+                    "queued": lane.queued,
+                    "max_queued": lane.max_queued,
+                    "submitted": lane.submitted,
+                    "coalesced": lane.coalesced,
+                    "completed": lane.completed,
+                    "failed": lane.failed,
+                    "timed_out": lane.timed_out,
+                    "dropped": lane.dropped,
+                    "wait_p50_ms": round(float(np.percentile(waits, 50)), 1) if len(waits) else 0.0,
+                    "wait_p95_ms": round(float(np.percentile(waits, 95)), 1) if len(waits) else 0.0,
+                    "wait_max_ms": round(float(waits.max()), 1) if len(waits) else 0.0,
+                })
+            return rows
+
+_gateway: LLMGateway | None = None
+_gateway_lock = threading.Lock()
+
+# The process-wide gateway (all Streamlit sessions and API threads share it)
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+# Stats of the process-wide gateway, empty until the first LLM request
+def gateway_stats() -> list[dict]:
+    return _gateway.stats() if _gateway is not None else []
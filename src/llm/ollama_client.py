@@ -4,6 +4,8 @@ import json
 from dataclasses import dataclass
 from urllib.request import Request, urlopen
 
+from src.tracing import traced
+
 from .client import LLMClient, LLMRequest
 
 @dataclass
@@ -12,6 +14,7 @@ class OllamaClient(LLMClient):
     model: str
     timeout_seconds: int = 200
     
+    @traced(category="llm")
     def generate(self, request: LLMRequest) -> str:
         url = f"{self.base_url}/api/generate"
         
@@ -6,6 +6,8 @@ from dataclasses import dataclass
 from urllib.request import Request, urlopen
 from urllib.error import HTTPError, URLError
 
+from src.tracing import traced
+
 from .client import LLMClient, LLMRequest
 
 # OpenRouter client implementation
@@ -19,6 +21,7 @@ class OpenRouterClient(LLMClient):
     app_title: str | None = None
 
     # Generate a response
+    @traced(category="llm")
     def generate(self, request: LLMRequest) -> str:
         url = f"{self.base_url.rstrip('/')}/chat/completions" # OpenRouter API endpoint
 
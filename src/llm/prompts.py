@@ -1,49 +1,192 @@
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
 import pandas as pd 
 
+from src.tracing import traced
+
+# Rendered fact/table fragments kept per (data version, metric, window)
+FRAGMENT_CACHE_SIZE = 512
+
+_fragments: OrderedDict[tuple, dict] = OrderedDict()
+_fragments_lock = threading.Lock()
+
+# Columns of the executive summary table, in order
+SUMMARY_COLUMNS = [
+    "month",
+    "mrr_total",
+    "net_new_mrr",
+    "new_mrr",
+    "expansion_mrr",
+    "contraction_mrr",
+    "churn_mrr",
+    "active_customers",
+    "revenue_churn_rate",
+]
+
+# Context columns shown next to the explained metric
+CONTEXT_COLUMNS = ["mrr_total", "net_new_mrr", "new_mrr", "expansion_mrr", "contraction_mrr", "churn_mrr"]
+
+# Build fragments once per key; without a data version nothing is cached
+def _memoized(data_version: str | None, key: tuple, build: Callable[[], dict]) -> dict:
+    if data_version is None:
+        return build()
+
+    full_key = (data_version, *key)
+    with _fragments_lock:
+        fragments = _fragments.get(full_key)
+        if fragments is not None:
+            _fragments.move_to_end(full_key)
+            return fragments
+
+    fragments = build()
+
+    with _fragments_lock:
+        _fragments[full_key] = fragments
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return fragments
+
+def clear_prompt_cache() -> None:
+    with _fragments_lock:
+        _fragments.clear()
+
+# Identifies a trailing window of one data version's metrics table
+def _window_key(df: pd.DataFrame) -> tuple[str, str, int]:
+    return str(df["month"].iloc[0]), str(df["month"].iloc[-1]), len(df)
+
 # Helper function
+@traced(category="prompt")
 def _to_markdown_table(df: pd.DataFrame, max_rows: int = 24) -> str:
     trimmed = df.tail(max_rows).copy()
     return trimmed.to_markdown(index=False)
 
+# Precomputed anomaly flags inside the window, company rows first, strongest first
+def _anomaly_lines(
+    anomalies: pd.DataFrame | None,
+    months: list[str],
+    metric_cols: list[str],
+    max_lines: int = 8,
+) -> list[str]:
+    if anomalies is None or anomalies.empty:
+        return []
+
+    flags = anomalies[
+        anomalies["month"].astype(str).isin(months) & anomalies["metric"].isin(metric_cols)
+    ].copy()
+    if flags.empty:
+        return []
+
+    flags["score"] = flags[["robust_z", "seasonal_z"]].abs().max(axis=1)
+    flags["is_segment"] = flags["dimension"] != "all"
+    flags = flags.sort_values(["is_segment", "score"], ascending=[True, False]).head(max_lines)
+
+    lines = []
+    for row in flags.itertuples(index=False):
+        scope = "company" if row.dimension == "all" else f"{row.dimension}={row.segment}"
+        lines.append(
+            f"- {row.month} `{row.metric}` ({scope}): {row.direction}, "
+            f"{row.value} vs expected {round(float(row.expected), 2)} (z={round(float(row.score), 2)})"
+        )
+    return lines
+
+# Flagged anomalies as a prompt block ("" when none)
+def _anomaly_block(anomalies: pd.DataFrame | None, months: list[str], metric_cols: list[str], max_lines: int) -> str:
+    lines = _anomaly_lines(anomalies, months, metric_cols, max_lines)
+    if not lines:
+        return ""
+    return "\nFlagged anomalies (robust z-score vs trailing months):\n" + "\n".join(lines) + "\n"
+
+# Retrieved snippets relevant to the user's question ("" when none)
+def _context_block(snippets: list[str] | None) -> str:
+    if not snippets:
+        return ""
+    return "\nRelevant notes (retrieved from the data and earlier explanations):\n" + "\n".join(f"- {s}" for s in snippets) + "\n"
+
+# Facts, table and anomaly block for one metric over one window
+def _metric_fragments(df: pd.DataFrame, metric_col: str, anomalies: pd.DataFrame | None) -> dict:
+    months = df["month"].astype(str).tolist()
+    values = df[metric_col].to_numpy(dtype=float)
+
+    # Basic facts (helps reduce hallucinations)
+    start_val = float(values[0])
+    end_val = float(values[-1])
+    delta = end_val - start_val
+
+    # Biggest month-over-month change (absolute)
+    mom = np.diff(values)
+    if len(mom):
+        i = int(np.abs(mom).argmax())
+        biggest_change_month, biggest_change_val = months[i + 1], float(mom[i])
+    else:
+        biggest_change_month, biggest_change_val = "N/A", 0.0
+
+    # Small table: always include Total MRR and Net New MRR for context if present
+    cols = ["month", metric_col]
+    for extra in CONTEXT_COLUMNS:
+        if extra in df.columns and extra not in cols:
+            cols.append(extra)
+
+    facts = (
+        f"- Start value: {start_val}\n"
+        f"- End value: {end_val}\n"
+        f"- Change over window: {delta}\n"
+        f"- Biggest MoM change: {biggest_change_val} in {biggest_change_month}"
+    )
+
+    return {
+        "start_month": months[0],
+        "end_month": months[-1],
+        "facts": facts,
+        "table_md": _to_markdown_table(df[cols], max_rows=24),
+        # Statistically flagged months (precomputed at ingestion)
+        "anomaly_block": _anomaly_block(anomalies, months, [metric_col], max_lines=8),
+    }
+
+# Table and anomaly block for the executive summary over one window
+def _summary_fragments(df: pd.DataFrame, anomalies: pd.DataFrame | None) -> dict:
+    months = df["month"].astype(str).tolist()
+
+    # Keep table compact and consistent
+    cols = [c for c in SUMMARY_COLUMNS if c in df.columns]
+
+    return {
+        "start_month": months[0],
+        "end_month": months[-1],
+        "table_md": _to_markdown_table(df[cols], max_rows=24),
+        # Statistically flagged months across all metrics (precomputed at ingestion)
+        "anomaly_block": _anomaly_block(anomalies, months, cols[1:], max_lines=12),
+    }
+
 # Single-metric business performance summary
+@traced(category="prompt")
 def build_metrics_prompt(
     window_df: pd.DataFrame,
     metric_label: str,
     metric_col: str,
     user_question: str | None,
+    anomalies: pd.DataFrame | None = None,
+    data_version: str | None = None,
+    context_snippets: list[str] | None = None,
 ) -> str:
     """
     Build a constrained prompt:
     - Explain only what is visible in the data.
     - Do not invent reasons (marketing, pricing, etc.).
     - If asked "why", say the data doesn't include causes.
-    """
-    df = window_df.copy()
-
-    # Basic facts (helps reduce hallucinations)
-    start_month = str(df["month"].iloc[0])
-    end_month = str(df["month"].iloc[-1])
-
-    start_val = float(df[metric_col].iloc[0])
-    end_val = float(df[metric_col].iloc[-1])
-    delta = end_val - start_val
-
-    mom = df[metric_col].diff()
-    # Biggest month-over-month change (absolute)
-    idx = mom.abs().idxmax()
-    biggest_change_month = str(df.loc[idx, "month"]) if pd.notna(idx) else "N/A"
-    biggest_change_val = float(mom.loc[idx]) if pd.notna(idx) else 0.0
 
-    # Small table: always include Total MRR and Net New MRR for context if present
-    cols = ["month", metric_col]
-    for extra in ["mrr_total", "net_new_mrr", "new_mrr", "expansion_mrr", "contraction_mrr", "churn_mrr"]:
-        if extra in df.columns and extra not in cols:
-            cols.append(extra)
-
-    table_df = df[cols].copy()
-    table_md = _to_markdown_table(table_df, max_rows=24)
+    With a data_version, facts and table fragments are memoized per
+    (version, metric, window) and only the question is added per call.
+    """
+    fragments = _memoized(
+        data_version,
+        ("metric", metric_col, anomalies is not None, *_window_key(window_df)),
+        lambda: _metric_fragments(window_df, metric_col, anomalies),
+    )
 
     question_block = ""
     if user_question and user_question.strip():
@@ -55,16 +198,13 @@ Do not invent causes or assumptions (no marketing, pricing, product changes, etc
 If asked "why", explain that the dataset does not contain causal drivers.
 
 Metric to explain: {metric_label} ({metric_col})
-Time window: {start_month} to {end_month}
+Time window: {fragments["start_month"]} to {fragments["end_month"]}
 
 Facts (computed from the data):
-- Start value: {start_val}
-- End value: {end_val}
-- Change over window: {delta}
-- Biggest MoM change: {biggest_change_val} in {biggest_change_month}
-
+{fragments["facts"]}
+{fragments["anomaly_block"]}{_context_block(context_snippets)}
 Data table:
-{table_md}
+{fragments["table_md"]}
 {question_block}
 
 Write 5-10 bullet points:
@@ -84,31 +224,22 @@ Formatting rules:
     return prompt
 
 # Multi-metric business performance summary
+@traced(category="prompt")
 def build_executive_summary_prompt(
     window_df: pd.DataFrame,
     user_question: str | None,
+    anomalies: pd.DataFrame | None = None,
+    data_version: str | None = None,
+    context_snippets: list[str] | None = None,
 ) -> str:
     """
     Multi-metric business performance summary for the selected time window.
     """
-    df = window_df.copy()
-    start_month = str(df["month"].iloc[0])
-    end_month = str(df["month"].iloc[-1])
-
-    # Keep table compact and consistent
-    cols = [
-        "month",
-        "mrr_total",
-        "net_new_mrr",
-        "new_mrr",
-        "expansion_mrr",
-        "contraction_mrr",
-        "churn_mrr",
-        "active_customers",
-        "revenue_churn_rate",
-    ]
-    cols = [c for c in cols if c in df.columns]
-    table_md = _to_markdown_table(df[cols], max_rows=24)
+    fragments = _memoized(
+        data_version,
+        ("summary", anomalies is not None, *_window_key(window_df)),
+        lambda: _summary_fragments(window_df, anomalies),
+    )
 
     question_block = ""
     if user_question and user_question.strip():
@@ -127,7 +258,7 @@ Formatting rules (must follow):
 - Do NOT repeat the same section twice.
 - If you mention column names, wrap them in backticks (example: `net_new_mrr`).
 
-Task: Write an executive summary of business performance from {start_month} to {end_month}.
+Task: Write an executive summary of business performance from {fragments["start_month"]} to {fragments["end_month"]}.
 Focus on:
 - Overall MRR trend (start, end, change)
 - What drove Net New MRR (New vs Expansion vs Churn vs Contraction)
@@ -135,8 +266,8 @@ Focus on:
 - Active customers trend and revenue churn rate trend (if meaningful)
 
 Data table:
-{table_md}
-{question_block}
+{fragments["table_md"]}
+{fragments["anomaly_block"]}{_context_block(context_snippets)}{question_block}
 
 Output:
 - 8–12 bullet points
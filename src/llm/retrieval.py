@@ -0,0 +1,914 @@
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import re
+import threading
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import PROJECT_ROOT
+from src.tracing import traced
+
+DEFAULT_INDEX_DIR = PROJECT_ROOT / ".cache" / "retrieval"
+MANIFEST_NAME = "segments.json"
+
+# On-disk segment layout; indexes written in another layout are rebuilt
+INDEX_FORMAT = 2
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Small segments are merged once there are more than this many
+MAX_SEGMENTS = 8
+
+# Highest-impact postings per tf group scored first, to seed the top-k threshold
+SEED_POSTINGS = 32
+
+# Optimistic floors tried before the exact threshold, as fractions of the gap between the
+# current k-th score and the best block bound
+THRESHOLD_GUESSES = (0.5, 0.0)
+
+# Term frequencies and document lengths in the impact-ordered postings are uint16 (clipped)
+UINT16_MAX = np.iinfo(np.uint16).max
+
+# Terms in at least this share of a segment's documents also get a dense tf row (one byte per
+# document), so scoring looks their tf up directly instead of searching long postings
+DENSE_DF_FRACTION = 1 / 16
+DENSE_TF_MAX = np.iinfo(np.uint8).max     # dense rows hold min(tf, 255); 255 means "look it up"
+
+# Documents are clustered by their rarest frequent terms (up to this many) when a segment is
+# built, and each frequent term records which blocks of 2**BLOCK_SHIFT documents contain it.
+# Search bounds a document by the frequent query terms in its block (up to BLOCK_TERMS).
+CLUSTER_TERMS = 64
+BLOCK_SHIFT = 7
+BLOCK_TERMS = 8
+
+# Numeric arrays stored in each segment's .npz (keys and texts go in separate blobs)
+SEGMENT_ARRAYS = (
+    "term_hashes", "indptr", "doc_ids", "tfs",
+    "impact_doc_ids", "impact_doc_lens", "group_indptr", "group_tfs", "group_starts",
+    "dense_terms", "dense_tfs", "dense_blocks",
+    "doc_lens", "key_hashes", "text_hashes", "source_codes", "key_offsets", "text_offsets",
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+# Question words and glue that would otherwise match every snippet
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it of on or "
+    "the this to vs was were what when which why with".split()
+)
+
+# Lowercase word tokens; compounds ("2024-07", "net_new_mrr") also yield their parts
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token or "_" in token or "." in token:
+            tokens.extend(p for p in re.split(r"[-_.]", token) if p)
+    return tokens
+
+# Stable 64-bit hashes of strings (pandas' fixed-key SipHash), so they can be persisted.
+# Terms and keys are looked up by hash; a collision is astronomically unlikely at index sizes.
+def hash_strings(values: list[str]) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+
+# K1 * (1 - B + B * dl / avgdl)
+def length_norm(doc_lens: np.ndarray | float, avgdl: float) -> np.ndarray:
+    return K1 * (1 - B + B * np.asarray(doc_lens, dtype=float) / avgdl)
+
+# BM25 score of one term: shared by exact scoring and the pruning bounds, so they agree
+def bm25(idf: float, tf: np.ndarray | float, norm: np.ndarray | float) -> np.ndarray:
+    return idf * tf * (K1 + 1) / (tf + norm)
+
+# Sorted distinct values (np.unique hashes first, which is slower on small int arrays)
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    values = np.sort(values)
+    if len(values) < 2:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+# Start and end (exclusive) of every run of True, interleaved
+def run_edges(mask: np.ndarray) -> np.ndarray:
+    padded = np.zeros(len(mask) + 2, dtype=bool)
+    padded[1:-1] = mask
+    return np.flatnonzero(padded[1:] != padded[:-1])
+
+# Positions lo[i] .. hi[i] - 1 of every span, concatenated
+def span_positions(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    sizes = hi - lo
+    firsts = np.cumsum(sizes) - sizes
+    return np.repeat(lo - firsts, sizes) + np.arange(int(sizes.sum()))
+
+# UTF-8 strings packed into one byte blob plus offsets (no Python object per string)
+def pack_strings(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def _unpack(blob: np.ndarray, offsets: np.ndarray, i: int) -> str:
+    return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+# Read-only view of a saved blob; pages are loaded on access, not kept on the heap
+def _map_blob(path: Path) -> np.ndarray:
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+# One indexable piece of text; keys are unique, re-adding a key replaces it
+@dataclass(frozen=True)
+class Snippet:
+    key: str
+    text: str
+    source: str     # "month", "segment", "customer", "anomaly", "explanation", ...
+
+@dataclass(frozen=True)
+class SearchHit:
+    score: float
+    key: str
+    text: str
+    source: str
+
+# Immutable inverted index over a batch of snippets. Every term's postings are stored twice
+# under the same indptr: by doc id (for lookups) and by impact (for top-k pruning): groups of
+# equal tf, highest first, each ordered by document length, so BM25 impact falls within a
+# group for any average length.
+@dataclass
+class Segment:
+    name: str
+    term_hashes: np.ndarray         # sorted; a term's id is its position
+    indptr: np.ndarray              # term id -> slice of the postings arrays
+    doc_ids: np.ndarray             # doc-ordered postings
+    tfs: np.ndarray
+    impact_doc_ids: np.ndarray      # impact-ordered postings
+    impact_doc_lens: np.ndarray
+    group_indptr: np.ndarray        # term id -> slice of group_tfs / group_starts
+    group_tfs: np.ndarray
+    group_starts: np.ndarray        # tf group g is impact_*[group_starts[g]:group_starts[g + 1]]
+    dense_terms: np.ndarray         # sorted ids of frequent terms; row r of dense_tfs
+    dense_tfs: np.ndarray           # (dense terms x documents) uint8
+    dense_blocks: np.ndarray        # (dense terms x blocks) True where the block has the term
+    doc_lens: np.ndarray
+    key_hashes: np.ndarray
+    text_hashes: np.ndarray
+    source_codes: np.ndarray
+    source_names: list[str]
+    key_offsets: np.ndarray         # key i is key_blob[key_offsets[i]:key_offsets[i + 1]]
+    key_blob: np.ndarray
+    text_offsets: np.ndarray
+    text_blob: np.ndarray
+    live: np.ndarray                # False for replaced/deleted snippets
+    saved: bool = False
+    _lengths: tuple[np.ndarray, np.ndarray] | None = field(default=None, repr=False)
+    _key_index: tuple[np.ndarray, np.ndarray] | None = field(default=None, repr=False)
+    _dense_rows: dict[int, int] | None = field(default=None, repr=False)
+    _source_docs: dict[tuple[int, ...], np.ndarray] = field(default_factory=dict, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    def key(self, i: int) -> str:
+        return _unpack(self.key_blob, self.key_offsets, i)
+
+    def text(self, i: int) -> str:
+        return _unpack(self.text_blob, self.text_offsets, i)
+
+    def source(self, i: int) -> str:
+        return self.source_names[self.source_codes[i]]
+
+    # Term ids for term hashes (-1 where the segment lacks the term)
+    def term_ids(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(self.term_hashes):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.term_hashes, hashes), len(self.term_hashes) - 1)
+        return np.where(self.term_hashes[pos] == hashes, pos, -1)
+
+    def df(self, tid: int) -> int:
+        return int(self.indptr[tid + 1] - self.indptr[tid])
+
+    # Distinct document lengths (clipped like impact_doc_lens), ascending
+    def lengths(self) -> np.ndarray:
+        if self._lengths is None:
+            lengths = np.unique(np.minimum(self.doc_lens, UINT16_MAX)).astype(np.uint16)
+            slot_of = np.zeros(int(lengths[-1]) + 1 if len(lengths) else 1, dtype=np.int32)
+            slot_of[lengths] = np.arange(len(lengths))
+            self._lengths = (lengths, slot_of)
+        return self._lengths[0]
+
+    # Positions of document lengths in lengths()
+    def length_slots(self, doc_lens: np.ndarray) -> np.ndarray:
+        self.lengths()
+        if doc_lens.dtype != np.uint16:
+            doc_lens = np.minimum(doc_lens, UINT16_MAX)
+        return self._lengths[1].take(doc_lens)
+
+    # Live documents with the given key hashes (-1 where absent or deleted)
+    def find(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(self):
+            return np.full(len(hashes), -1, dtype=np.int64)
+        if self._key_index is None:
+            order = np.argsort(self.key_hashes, kind="stable")
+            self._key_index = (self.key_hashes[order], order)
+        sorted_hashes, order = self._key_index
+        pos = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+        found = sorted_hashes[pos] == hashes
+        found[found] = self.live[order[pos[found]]]
+        return np.where(found, order[pos], -1)
+
+    # Source codes for a set of source names
+    def source_code_list(self, sources: set[str]) -> list[int]:
+        return [i for i, name in enumerate(self.source_names) if name in sources]
+
+    # Sorted ids of documents from any of the given sources
+    def source_docs(self, codes: list[int]) -> np.ndarray:
+        cache_key = tuple(codes)
+        if cache_key not in self._source_docs:
+            self._source_docs[cache_key] = np.flatnonzero(np.isin(self.source_codes, codes)).astype(np.int32)
+        return self._source_docs[cache_key]
+
+    # Row of a frequent term in dense_tfs (-1 if the term has none)
+    def dense_row(self, tid: int) -> int:
+        if self._dense_rows is None:
+            self._dense_rows = {tid: row for row, tid in enumerate(self.dense_terms.tolist())}
+        return self._dense_rows.get(tid, -1)
+
+    # tf of a term in sorted documents (0 where absent)
+    def term_tfs(self, tid: int, docs: np.ndarray) -> np.ndarray:
+        row = self.dense_row(tid)
+        if row >= 0:
+            tfs = self.dense_tfs[row].take(docs)
+            # tf groups run highest first, so the first one says whether any tf was clipped
+            if self.group_tfs[self.group_indptr[tid]] < DENSE_TF_MAX:
+                return tfs
+            tfs = tfs.astype(np.uint16)
+            clipped = np.flatnonzero(tfs == DENSE_TF_MAX)
+        else:
+            tfs, clipped = np.zeros(len(docs), dtype=np.uint16), np.arange(len(docs))
+        if len(clipped):
+            post_docs, post_tfs = self.postings(tid)
+            pos = np.minimum(np.searchsorted(post_docs, docs[clipped]), len(post_docs) - 1)
+            tfs[clipped] = np.where(post_docs[pos] == docs[clipped], post_tfs[pos], 0)
+        return tfs
+
+    def postings(self, tid: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[tid], self.indptr[tid + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    # tf groups of a term: (tf, start, end) into the impact-ordered postings
+    def impact_groups(self, tid: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        g0, g1 = self.group_indptr[tid], self.group_indptr[tid + 1]
+        return self.group_tfs[g0:g1], self.group_starts[g0:g1], self.group_starts[g0 + 1:g1 + 1]
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in SEGMENT_ARRAYS}
+
+# Build a segment from snippets: one Python pass to map tokens to ids, the rest in numpy.
+# Callers that already hashed the keys / texts pass the hashes along.
+def build_segment(
+    name: str,
+    snippets: list[Snippet],
+    key_hashes: np.ndarray | None = None,
+    text_hashes: np.ndarray | None = None,
+) -> Segment:
+    terms: dict[str, int] = {}
+    term_ids = array("i")
+    doc_lens = np.zeros(len(snippets), dtype=np.int32)
+
+    for i, snippet in enumerate(snippets):
+        tokens = tokenize(snippet.text)
+        doc_lens[i] = len(tokens)
+        term_ids.extend([terms.setdefault(t, len(terms)) for t in tokens])
+
+    # Renumber terms in hash order so query terms are found by binary search
+    term_hashes = hash_strings(list(terms))
+    order = np.argsort(term_hashes, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    del terms
+
+    n_docs = len(snippets)
+    tids = rank[np.frombuffer(term_ids, dtype=np.int32)]
+    docs = np.repeat(np.arange(n_docs, dtype=np.int64), doc_lens)
+
+    # Unique (term, doc) pairs sorted by term then doc, with their counts as tf
+    pairs, counts = np.unique(tids * max(n_docs, 1) + docs, return_counts=True)
+    del tids, docs
+    pair_terms = pairs // max(n_docs, 1)
+    pair_docs = (pairs % max(n_docs, 1)).astype(np.int32)
+    tfs = np.minimum(counts, UINT16_MAX).astype(np.uint16)
+    del pairs, counts
+
+    indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_terms, minlength=len(order)), out=indptr[1:])
+
+    dfs = np.diff(indptr)
+    dense_terms = np.flatnonzero(dfs >= max(n_docs * DENSE_DF_FRACTION, 1))
+    dense_tfs = np.zeros((len(dense_terms), n_docs), dtype=np.uint8)
+    rows = np.full(len(order), -1, dtype=np.int64)
+    rows[dense_terms] = np.arange(len(dense_terms))
+    pair_rows = rows[pair_terms]
+    in_dense = pair_rows >= 0
+    dense_tfs[pair_rows[in_dense], pair_docs[in_dense]] = np.minimum(tfs[in_dense], DENSE_TF_MAX)
+    del rows, pair_rows, in_dense
+
+    # Renumber documents sorted by which of the rarest frequent terms they contain (rarest
+    # first), so documents sharing attributes are neighbours and their terms fill few blocks
+    if len(dense_terms):
+        cluster_rows = np.argsort(dfs[dense_terms], kind="stable")[:CLUSTER_TERMS]
+        packed = np.packbits(dense_tfs[cluster_rows] > 0, axis=0)
+        perm = np.lexsort(packed[::-1])
+        new_ids = np.empty(n_docs, dtype=np.int64)
+        new_ids[perm] = np.arange(n_docs)
+        pair_docs = new_ids[pair_docs].astype(np.int32)
+        doc_order = np.argsort(pair_terms * n_docs + pair_docs, kind="stable")
+        pair_docs, tfs = pair_docs[doc_order], tfs[doc_order]
+        dense_tfs = dense_tfs.take(perm, axis=1)
+        doc_lens = doc_lens[perm]
+        snippets = [snippets[i] for i in perm.tolist()]
+        key_hashes = key_hashes[perm] if key_hashes is not None else None
+        text_hashes = text_hashes[perm] if text_hashes is not None else None
+        del packed, new_ids, doc_order
+    if n_docs:
+        dense_blocks = np.maximum.reduceat(dense_tfs, np.arange(0, n_docs, 1 << BLOCK_SHIFT), axis=1) > 0
+    else:
+        dense_blocks = np.zeros((len(dense_terms), 0), dtype=bool)
+
+    # Impact order: term, then tf descending, then document length (doc id breaks ties)
+    pair_lens = np.minimum(doc_lens, UINT16_MAX).astype(np.uint16)[pair_docs]
+    group_keys = (pair_terms << 16) | (UINT16_MAX - tfs).astype(np.int64)
+    impact = np.argsort((group_keys << 16) | pair_lens, kind="stable")
+    group_keys = group_keys[impact]
+    starts = np.flatnonzero(np.diff(group_keys)) + 1
+    group_starts = np.concatenate(([0], starts, [len(impact)])) if len(impact) else np.zeros(1, dtype=np.int64)
+    group_terms = group_keys[group_starts[:-1]] >> 16
+
+    group_indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group_terms, minlength=len(order)), out=group_indptr[1:])
+
+    sources, source_names = pd.factorize(pd.Series([s.source for s in snippets], dtype=object))
+    key_offsets, key_blob = pack_strings([s.key for s in snippets])
+    text_offsets, text_blob = pack_strings([s.text for s in snippets])
+
+    return Segment(
+        name=name,
+        term_hashes=term_hashes[order],
+        indptr=indptr,
+        doc_ids=pair_docs,
+        tfs=tfs,
+        impact_doc_ids=pair_docs[impact],
+        impact_doc_lens=pair_lens[impact],
+        group_indptr=group_indptr,
+        group_tfs=UINT16_MAX - (group_keys[group_starts[:-1]] & UINT16_MAX).astype(np.uint16),
+        group_starts=group_starts.astype(np.int64),
+        dense_terms=dense_terms,
+        dense_tfs=dense_tfs,
+        dense_blocks=dense_blocks,
+        doc_lens=doc_lens,
+        key_hashes=key_hashes if key_hashes is not None else hash_strings([s.key for s in snippets]),
+        text_hashes=text_hashes if text_hashes is not None else hash_strings([s.text for s in snippets]),
+        source_codes=sources.astype(np.uint16),
+        source_names=[str(name) for name in source_names],
+        key_offsets=key_offsets,
+        key_blob=key_blob,
+        text_offsets=text_offsets,
+        text_blob=text_blob,
+        live=np.ones(n_docs, dtype=bool),
+    )
+
+# Exact BM25 scores of distinct candidate documents. Rarest terms first: with bounds (term x
+# segment length, see Segment.lengths) documents that can no longer beat the threshold are
+# dropped after each term, and rare terms drop the most. Callers that already have the
+# documents' lengths, or one term's scores (read = (term position, scores)), pass them along.
+def score_documents(
+    segment: Segment,
+    docs: np.ndarray,
+    terms: list[tuple[int, float]],
+    avgdl: float,
+    bounds: np.ndarray | None = None,
+    threshold: float = 0.0,
+    doc_lens: np.ndarray | None = None,
+    read: tuple[int, np.ndarray] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    done, scores = read if read is not None else (-1, np.zeros(len(docs)))
+    order = np.argsort([-1 if j == done else segment.df(tid) for j, (tid, _) in enumerate(terms)], kind="stable")
+    if doc_lens is None:
+        doc_lens = segment.doc_lens.take(docs)
+    doc_norm = length_norm(doc_lens, avgdl)
+    if bounds is not None:
+        # rest[i, l]: best score of the terms after the i-th at length l
+        rest = np.cumsum(bounds[order[::-1]], axis=0)[::-1]
+        slots = segment.length_slots(doc_lens)
+
+    for i, j in enumerate(order):
+        tid, idf = terms[j]
+        if j != done:
+            tfs = segment.term_tfs(tid, docs)
+            hit = (tfs != 0).nonzero()[0]
+            scores[hit] += bm25(idf, tfs.take(hit).astype(float), doc_norm.take(hit))
+
+        if bounds is not None and i + 1 < len(order):
+            alive = (scores + rest[i + 1].take(slots) > threshold).nonzero()[0]
+            # Dropped documents can never pass the threshold, so compact only when it pays
+            if 2 * len(alive) <= len(docs):
+                docs, scores, doc_norm, slots = docs.take(alive), scores.take(alive), doc_norm.take(alive), slots.take(alive)
+    return docs, scores
+
+# Running top-k over all segments; its k-th score is the pruning threshold
+class TopK:
+    def __init__(self, k: int) -> None:
+        self.k = k
+        self.heap: list[tuple[float, int, int]] = []     # (score, segment, doc), min-heap
+
+    # Scores a document must beat to enter (0 until there are k hits)
+    def threshold(self) -> float:
+        return self.heap[0][0] if len(self.heap) >= self.k else 0.0
+
+    def offer(self, segment_no: int, docs: np.ndarray, scores: np.ndarray) -> None:
+        better = scores > self.threshold()
+        docs, scores = docs[better], scores[better]
+        if len(docs) > self.k:
+            top = np.argpartition(-scores, self.k)[:self.k]
+            docs, scores = docs[top], scores[top]
+        for score, doc in zip(scores.tolist(), docs.tolist()):
+            item = (score, segment_no, doc)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+
+# Segmented BM25 index: each add creates a new immutable segment, replaced snippets are
+# tombstoned, and small segments are merged once there are too many
+class RetrievalIndex:
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        self.segments: list[Segment] = []
+        self.meta: dict = {}
+        self._total_docs = 0
+        self._total_len = 0
+        self._next_segment = 0
+        self._dropped: list[str] = []
+        self._unsaved_changes = 0       # snippets added or removed since the last save
+        self._lock = threading.RLock()
+        # Held by callers that rebuild derived snippets, so concurrent refreshes run once
+        self.sync_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(int(seg.live.sum()) for seg in self.segments)
+
+    def _register(self, segment: Segment) -> None:
+        self._total_docs += len(segment)
+        self._total_len += int(segment.doc_lens.sum())
+        self.segments.append(segment)
+
+    def _unregister(self, segment: Segment) -> None:
+        self._total_docs -= len(segment)
+        self._total_len -= int(segment.doc_lens.sum())
+        self.segments.remove(segment)
+        if segment.saved:
+            self._dropped.append(segment.name)
+
+    def _new_segment_name(self) -> str:
+        self._next_segment += 1
+        return f"seg-{self._next_segment:06d}"
+
+    # Add or replace snippets; unchanged snippets are skipped. Returns how many were indexed.
+    @traced(category="retrieval")
+    def add(self, snippets: list[Snippet]) -> int:
+        with self._lock:
+            batch = list({snippet.key: snippet for snippet in snippets}.values())
+            if not batch:
+                return 0
+            key_hashes = hash_strings([s.key for s in batch])
+            text_hashes = hash_strings([s.text for s in batch])
+
+            # Current copy of each key (at most one live per index) and whether its text changed
+            changed = np.ones(len(batch), dtype=bool)
+            replaced = []
+            for segment in self.segments:
+                docs = segment.find(key_hashes)
+                found = np.flatnonzero(docs >= 0)
+                same = segment.text_hashes[docs[found]] == text_hashes[found]
+                changed[found[same]] = False
+                replaced.append((segment, docs[found[~same]]))
+
+            fresh = np.flatnonzero(changed)
+            if not len(fresh):
+                return 0
+
+            for segment, docs in replaced:
+                segment.live[docs] = False
+
+            self._register(build_segment(
+                self._new_segment_name(),
+                [batch[i] for i in fresh],
+                key_hashes=key_hashes[fresh],
+                text_hashes=text_hashes[fresh],
+            ))
+            self._maybe_merge()
+            self._unsaved_changes += len(fresh)
+            return len(fresh)
+
+    # Remove every snippet of the given sources whose key is not in keep
+    def retain(self, sources: set[str], keep: set[str]) -> int:
+        with self._lock:
+            keep_hashes = hash_strings(list(keep))
+            removed = 0
+            for segment in self.segments:
+                codes = segment.source_code_list(sources)
+                if not codes:
+                    continue
+                stale = segment.live & np.isin(segment.source_codes, codes) & ~np.isin(segment.key_hashes, keep_hashes)
+                segment.live[stale] = False
+                removed += int(stale.sum())
+            self._unsaved_changes += removed
+            return removed
+
+    # Tiered merge: everything but the largest segment is folded together
+    def _maybe_merge(self) -> None:
+        if len(self.segments) <= MAX_SEGMENTS:
+            return
+
+        largest = max(self.segments, key=len)
+        small = [seg for seg in self.segments if seg is not largest]
+        snippets, key_hashes, text_hashes = [], [], []
+        for seg in small:
+            live = np.flatnonzero(seg.live)
+            snippets += [Snippet(seg.key(i), seg.text(i), seg.source(i)) for i in live]
+            key_hashes.append(seg.key_hashes[live])
+            text_hashes.append(seg.text_hashes[live])
+        for seg in small:
+            self._unregister(seg)
+        if snippets:
+            self._register(build_segment(
+                self._new_segment_name(),
+                snippets,
+                key_hashes=np.concatenate(key_hashes),
+                text_hashes=np.concatenate(text_hashes),
+            ))
+
+    # Top-k snippets by BM25 score; hits below min_relative_score x the best score are dropped
+    @traced(category="retrieval")
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        sources: set[str] | None = None,
+        min_relative_score: float = 0.0,
+    ) -> list[SearchHit]:
+        """
+        One top-k threshold is shared by all segments (largest first). Each segment first
+        scores the highest-impact postings of every query term to raise the threshold. Then
+        MaxScore runs per document length over the impact-ordered postings: only the
+        (tf, length) runs that could beat a floor are read, and candidates are dropped when
+        the bound of their block (documents are clustered by their frequent terms) cannot.
+        When the frequent terms rarely meet, the passing blocks are read from the
+        doc-ordered postings instead. An optimistic floor is tried before the threshold
+        itself. Results are the same as exhaustive BM25 scoring.
+        """
+        with self._lock:
+            query_terms = list(dict.fromkeys(tokenize(query)))
+            if not query_terms or self._total_docs == 0 or k <= 0:
+                return []
+
+            hashes = hash_strings(query_terms)
+            term_ids = [segment.term_ids(hashes) for segment in self.segments]
+            dfs = np.zeros(len(query_terms))
+            for segment, tids in zip(self.segments, term_ids):
+                for j in np.flatnonzero(tids >= 0):
+                    dfs[j] += segment.df(int(tids[j]))
+            if not dfs.any():
+                return []
+
+            n_docs = self._total_docs
+            avgdl = self._total_len / n_docs
+            idf = np.log(1 + (n_docs - dfs + 0.5) / (dfs + 0.5))
+
+            top = TopK(k)
+            by_size = sorted(range(len(self.segments)), key=lambda i: -len(self.segments[i]))
+            for segment_no in by_size:
+                segment = self.segments[segment_no]
+                terms = [(int(t), float(idf[j])) for j, t in enumerate(term_ids[segment_no]) if t >= 0]
+                if terms:
+                    self._search_segment(segment_no, segment, terms, avgdl, sources, top)
+
+            hits = sorted(top.heap, reverse=True)
+            cutoff = hits[0][0] * min_relative_score if hits else 0.0
+            return [
+                SearchHit(score, self.segments[s].key(d), self.segments[s].text(d), self.segments[s].source(d))
+                for score, s, d in hits
+                if score >= cutoff
+            ]
+
+    def _search_segment(
+        self,
+        segment_no: int,
+        segment: Segment,
+        terms: list[tuple[int, float]],
+        avgdl: float,
+        sources: set[str] | None,
+        top: TopK,
+    ) -> None:
+        codes = None
+        if sources is not None:
+            codes = segment.source_code_list(sources)
+            if not codes:
+                return
+
+        def offer(
+            docs: np.ndarray,
+            bounds: np.ndarray | None = None,
+            doc_lens: np.ndarray | None = None,
+            read: tuple[int, np.ndarray] | None = None,
+        ) -> None:
+            keep = segment.live.take(docs)
+            if codes is not None:
+                keep &= np.isin(segment.source_codes.take(docs), codes)
+            if not keep.all():
+                keep = keep.nonzero()[0]
+                docs = docs.take(keep)
+                doc_lens = doc_lens.take(keep) if doc_lens is not None else None
+                read = (read[0], read[1].take(keep)) if read is not None else None
+            if len(docs):
+                top.offer(segment_no, *score_documents(
+                    segment, docs, terms, avgdl, bounds, top.threshold(), doc_lens, read,
+                ))
+
+        # A selective source filter: scoring its documents directly is cheaper than the postings
+        if codes is not None:
+            allowed = segment.source_docs(codes)
+            if len(allowed) <= sum(segment.df(tid) for tid, _ in terms):
+                offer(allowed)
+                return
+
+        # Every term of a document sees the same length, and tf grows with length, so bounds
+        # are per length: bound[j, l] is the best score of term j in a document of length
+        # lengths[l] (tf groups whose postings span that length)
+        lengths = segment.lengths()
+        len_norm = length_norm(lengths, avgdl)
+        groups = [segment.impact_groups(tid) for tid, _ in terms]
+        impacts, spans = [], []
+        for (_, idf), (tfs, starts, ends) in zip(terms, groups):
+            first = segment.impact_doc_lens[starts]
+            last = segment.impact_doc_lens[ends - 1]
+            present = (first[:, None] <= lengths) & (lengths <= last[:, None])
+            impacts.append(np.where(present, bm25(idf, tfs[:, None].astype(float), len_norm), 0.0))
+            spans.append(present)
+        bounds = np.array([impact.max(axis=0) for impact in impacts])
+
+        # Documents are clustered by their frequent terms (see build_segment), so many blocks
+        # lack some of the frequent query terms. block_bounds[c * len(lengths) + l] bounds a
+        # document of length lengths[l] in a block holding the gated terms in the bits of c
+        # (other terms count as present); block b has c = block_bits[b].
+        gated = sorted(
+            (segment.df(tid), j, row)
+            for j, (tid, _) in enumerate(terms)
+            if (row := segment.dense_row(tid)) >= 0
+        )[:BLOCK_TERMS]
+        block_bits = np.zeros(segment.dense_blocks.shape[1], dtype=np.uint8)
+        for bit, (_, _, row) in enumerate(gated):
+            block_bits |= segment.dense_blocks[row].view(np.uint8) << np.uint8(bit)
+        block_codes = block_bits.astype(np.intp) * len(lengths)
+        bits = (np.arange(1 << len(gated))[:, None] >> np.arange(len(gated))) & 1
+        absent = (1 - bits) @ bounds[[j for _, j, _ in gated]]
+        block_bounds = bounds.sum(axis=0) - absent
+        block_best = block_bounds.max(axis=1)       # per code, at any length
+        block_bounds = block_bounds.ravel()
+
+        seeds = np.zeros(0, dtype=np.int32)
+        if top.threshold() == 0.0:
+            starts = np.concatenate([starts for _, starts, _ in groups])
+            ends = np.concatenate([ends for _, _, ends in groups])
+            at = span_positions(starts, np.minimum(starts + SEED_POSTINGS, ends))
+            seeds = sorted_unique(segment.impact_doc_ids.take(at).astype(np.intp))
+            offer(seeds)
+
+        # Candidates are parallel arrays: documents, their upper bounds, their lengths and one
+        # term's scores (the last two when known)
+        def subset(candidates: tuple, keep: np.ndarray) -> tuple:
+            docs, best, doc_lens, read = candidates
+            if len(keep) == len(docs):
+                return candidates
+            return (
+                docs.take(keep),
+                best.take(keep),
+                doc_lens.take(keep) if doc_lens is not None else None,
+                (read[0], read[1].take(keep)) if read is not None else None,
+            )
+
+        # Documents of the given terms in blocks that can beat the floor, from the doc-ordered
+        # postings: few blocks pass when the frequent query terms rarely meet, and each run of
+        # passing blocks is one binary search per term
+        def read_blocks(floor: float, read_terms: list[int], passing: np.ndarray) -> tuple:
+            edges = run_edges(passing) << BLOCK_SHIFT
+            parts = []
+            for j in read_terms:
+                post_docs, post_tfs = segment.postings(terms[j][0])
+                at = span_positions(np.searchsorted(post_docs, edges[0::2]), np.searchsorted(post_docs, edges[1::2]))
+                parts.append((post_docs.take(at).astype(np.intp), post_tfs.take(at)))
+            if len(parts) > 1:
+                docs = sorted_unique(np.concatenate([docs for docs, _ in parts]))
+            else:
+                docs = parts[0][0]
+            doc_lens = segment.doc_lens.take(docs)
+            slots = segment.length_slots(doc_lens)
+            best = block_bounds.take(block_codes.take(docs >> BLOCK_SHIFT) + slots)
+            if len(parts) > 1:
+                return subset((docs, best, doc_lens, None), (best > floor).nonzero()[0])
+
+            j, tfs = read_terms[0], parts[0][1]
+            scores = bm25(terms[j][1], tfs.astype(float), length_norm(doc_lens, avgdl))
+            best += scores - bounds[j].take(slots)
+            keep = (best > floor).nonzero()[0]
+            docs, best, doc_lens, _ = subset((docs, best, doc_lens, None), keep)
+            return docs, best, doc_lens, (j, scores.take(keep))
+
+        # MaxScore per length: remaining[j, l] bounds term j in unread documents of length l.
+        # Lengths whose remaining total cannot beat the floor are closed; each term reads only
+        # the (tf, length) runs that could still lift a document above it, and documents whose
+        # block bound cannot beat it are dropped. When a single term was read its postings are
+        # distinct documents, and a run's score is its impact at its length.
+        def read_above(floor: float) -> tuple:
+            remaining = bounds.copy()
+            runs, run_cost = [], 0.0
+            for j in np.argsort(-bounds.max(axis=1), kind="stable").tolist():
+                total = remaining.sum(axis=0)
+                open_lengths = total > floor
+                if not open_lengths.any():
+                    break
+                others = total - remaining[j]
+                read = open_lengths & spans[j] & (impacts[j] + others > floor)
+                runs += [(j, g, read[g]) for g in np.flatnonzero(read.any(axis=1)).tolist()]
+                remaining[j] = np.where(spans[j] & ~read, impacts[j], 0.0).max(axis=0)
+                # Postings of the runs, guessed from the share of each group's lengths read
+                _, starts, ends = groups[j]
+                run_cost += float((ends - starts) @ (read.sum(axis=1) / spans[j].sum(axis=1)))
+
+            if not runs:
+                return np.zeros(0, dtype=np.intp), np.zeros(0), None, None
+            read_terms = sorted({j for j, _, _ in runs})
+            passing = block_best.take(block_bits) > floor
+            if passing.mean() * sum(segment.df(terms[j][0]) for j in read_terms) < run_cost:
+                return read_blocks(floor, read_terms, passing)
+
+            ranges, part_terms, part_groups = [], [], []
+            for j, g, lengths_read in runs:
+                start, end = int(groups[j][1][g]), int(groups[j][2][g])
+                lens = segment.impact_doc_lens[start:end]
+                # Consecutive lengths are one contiguous slice of the group
+                edges = run_edges(lengths_read)
+                lo = np.searchsorted(lens, lengths.take(edges[0::2]), side="left")
+                hi = np.searchsorted(lens, lengths.take(edges[1::2] - 1), side="right")
+                for a, b in zip(lo.tolist(), hi.tolist()):
+                    if b > a:
+                        ranges.append((start + a, start + b))
+                        part_terms.append(j)
+                        part_groups.append(g)
+
+            if not ranges:
+                return np.zeros(0, dtype=np.intp), np.zeros(0), None, None
+            # Index arrays as intp: numpy gathers with them without converting
+            docs = np.concatenate([segment.impact_doc_ids[a:b] for a, b in ranges], dtype=np.intp)
+            if len(read_terms) > 1:
+                docs = sorted_unique(docs)
+                doc_lens = segment.doc_lens.take(docs)
+                slots = segment.length_slots(doc_lens)
+                best = block_bounds.take(block_codes.take(docs >> BLOCK_SHIFT) + slots)
+                return subset((docs, best, doc_lens, None), (best > floor).nonzero()[0])
+
+            doc_lens = np.concatenate([segment.impact_doc_lens[a:b] for a, b in ranges])
+            slots = segment.length_slots(doc_lens)
+            best = block_bounds.take(block_codes.take(docs >> BLOCK_SHIFT) + slots)
+            if doc_lens.max() == UINT16_MAX:
+                return subset((docs, best, None, None), (best > floor).nonzero()[0])
+
+            # The read term's score replaces its bound; cells index its (tf group, length) impacts
+            j = part_terms[0]
+            cells = np.repeat(np.array(part_groups) * len(lengths), [b - a for a, b in ranges]) + slots
+            best += (impacts[j] - bounds[j]).ravel().take(cells)
+            keep = (best > floor).nonzero()[0]
+            docs, best, doc_lens, _ = subset((docs, best, doc_lens, None), keep)
+            return docs, best, doc_lens, (j, impacts[j].ravel().take(cells.take(keep)))
+
+        # Guess a floor between the threshold and the best block bound first: once the k-th score
+        # reaches it, documents left unread (all at or below it) cannot enter. Lower floors read
+        # the documents of higher ones again; those are skipped. Documents tying the k-th score
+        # (up to rounding) never enter, so ties are not read.
+        start = top.threshold()
+        gap = float(block_best.max()) - start
+        offered = seeds
+        for guess in THRESHOLD_GUESSES:
+            floor = max(top.threshold(), start + gap * guess)
+            docs, _, doc_lens, read = candidates = read_above(floor)
+            if len(offered) and len(docs):
+                pos = np.minimum(np.searchsorted(offered, docs), len(offered) - 1)
+                docs, _, doc_lens, read = subset(candidates, (offered.take(pos) != docs).nonzero()[0])
+            if len(docs):
+                offer(docs, bounds, doc_lens, read)
+            if top.threshold() >= floor:
+                break
+            offered = sorted_unique(np.concatenate([offered, docs]))
+
+    # Persist new segments and the manifest (deletions, metadata)
+    @traced(category="retrieval")
+    def save(self, directory: Path | None = None) -> Path:
+        with self._lock:
+            if directory is not None:
+                self.directory = Path(directory)
+            directory = self.directory
+            directory.mkdir(parents=True, exist_ok=True)
+
+            for segment in self.segments:
+                if segment.saved:
+                    continue
+                np.savez(
+                    directory / f"{segment.name}.npz",
+                    source_names=np.array(segment.source_names, dtype=str),
+                    **segment.arrays(),
+                )
+                # Keys and texts are read back through mmap instead of staying in memory
+                for blob_name in ("key_blob", "text_blob"):
+                    path = directory / f"{segment.name}.{blob_name}"
+                    getattr(segment, blob_name).tofile(path)
+                    setattr(segment, blob_name, _map_blob(path))
+                segment.saved = True
+
+            manifest = {
+                "format": INDEX_FORMAT,
+                "next_segment": self._next_segment,
+                "meta": self.meta,
+                "segments": [
+                    {"name": seg.name, "deleted": np.flatnonzero(~seg.live).tolist()}
+                    for seg in self.segments
+                ],
+            }
+            tmp_path = directory / f"{MANIFEST_NAME}.{os.getpid()}.tmp"
+            tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+            tmp_path.replace(directory / MANIFEST_NAME)
+
+            # Merged-away segments are only removed once the manifest no longer lists them
+            for name in self._dropped:
+                for suffix in (".npz", ".key_blob", ".text_blob", ".json"):
+                    (directory / f"{name}{suffix}").unlink(missing_ok=True)
+            self._dropped.clear()
+            self._unsaved_changes = 0
+
+            return directory
+
+    # Save once at least `max_unsaved` snippets changed since the last save, or a merge
+    # replaced saved segments
+    def save_if_due(self, max_unsaved: int = 1) -> bool:
+        with self._lock:
+            if self.directory is None or not (self._dropped or self._unsaved_changes >= max(max_unsaved, 1)):
+                return False
+            self.save()
+            return True
+
+    # Load a saved index (an empty index if nothing was saved yet, or in an older format)
+    @classmethod
+    @traced(category="retrieval")
+    def load(cls, directory: Path) -> "RetrievalIndex":
+        index = cls(directory)
+        try:
+            manifest = json.loads((Path(directory) / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return index
+
+        index._next_segment = manifest.get("next_segment", 0)
+        if manifest.get("format") != INDEX_FORMAT:
+            # Rebuilt from scratch; the old files go with the next save
+            index._dropped = [entry["name"] for entry in manifest.get("segments", [])]
+            return index
+
+        index.meta = manifest.get("meta", {})
+        for entry in manifest["segments"]:
+            name = entry["name"]
+            with np.load(Path(directory) / f"{name}.npz") as arrays:
+                fields = {array_name: arrays[array_name] for array_name in SEGMENT_ARRAYS}
+                source_names = arrays["source_names"].tolist()
+            live = np.ones(len(fields["doc_lens"]), dtype=bool)
+            live[entry["deleted"]] = False
+            index._register(Segment(
+                name=name,
+                source_names=source_names,
+                key_blob=_map_blob(Path(directory) / f"{name}.key_blob"),
+                text_blob=_map_blob(Path(directory) / f"{name}.text_blob"),
+                live=live,
+                saved=True,
+                **fields,
+            ))
+
+        return index
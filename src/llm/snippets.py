@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import Dataset
+from src.llm.retrieval import DEFAULT_INDEX_DIR, RetrievalIndex, Snippet
+from src.metrics.core import (
+    METRIC_OPTIONS,
+    compute_metrics_from_frames,
+    load_customer_month_mrr,
+    load_customers,
+    load_metric_anomalies,
+    load_revenue_events,
+)
+from src.metrics.forecast import SegmentSeries, build_segment_series
+from src.metrics.formatting import format_metric_value
+from src.tracing import traced
+
+# Snippet sources regenerated from the processed tables on every data version
+FACT_SOURCES = {"month", "segment", "customer", "anomaly"}
+
+# Past explanations are trimmed to this many characters
+MAX_EXPLANATION_CHARS = 1200
+
+# "2024-07" -> "2024-07 (July 2024, Jul 2024, Q3 2024)" so questions can name months or quarters
+def _month_aliases(months: pd.Series) -> pd.Series:
+    dates = pd.to_datetime(months.astype(str) + "-01")
+    return (
+        months.astype(str) + " ("
+        + dates.dt.strftime("%B %Y") + ", " + dates.dt.strftime("%b %Y")
+        + ", Q" + dates.dt.quarter.astype(str) + " " + dates.dt.year.astype(str) + ")"
+    )
+
+# One snippet per month with every company metric
+def month_snippets(metrics_df: pd.DataFrame) -> list[Snippet]:
+    labels = _month_aliases(metrics_df["month"])
+    parts = [
+        f"{label}: " + metrics_df[col].map(lambda v, col=col: format_metric_value(col, v))
+        for label, col in METRIC_OPTIONS.items()
+        if col != "active_customers"
+    ]
+    body = parts[0]
+    for part in parts[1:]:
+        body = body + "; " + part
+    texts = "Company metrics for " + labels + ": " + body + "; Active Customers: " + metrics_df["active_customers"].astype(int).astype(str)
+
+    return [
+        Snippet(f"month:{month}", text, "month")
+        for month, text in zip(metrics_df["month"].astype(str), texts)
+    ]
+
+# One snippet per segment and month with MRR, MoM change and churn
+def segment_snippets(series: SegmentSeries) -> list[Snippet]:
+    months = pd.Series(series.months)
+    labels = _month_aliases(months).tolist()
+    churn_rate = series.churn_rate()
+    mom = np.diff(series.mrr, axis=1, prepend=0.0)
+
+    snippets = []
+    for row, (dimension, segment) in enumerate(series.keys):
+        if dimension == "all":
+            continue
+        for col in np.flatnonzero((series.mrr[row] != 0) | (series.churn_mrr[row] != 0)):
+            month = series.months[col]
+            snippets.append(Snippet(
+                f"segment:{dimension}:{segment}:{month}",
+                f"Segment {dimension} {segment} in {labels[col]}: "
+                f"MRR {format_metric_value('mrr_total', series.mrr[row, col])}, "
+                f"MoM change {format_metric_value('mrr_total', mom[row, col])}, "
+                f"churn MRR {format_metric_value('churn_mrr', series.churn_mrr[row, col])}, "
+                f"revenue churn rate {format_metric_value('revenue_churn_rate', churn_rate[row, col])}",
+                "segment",
+            ))
+    return snippets
+
+# One snippet per customer: attributes plus their revenue event history
+def customer_snippets(customers_df: pd.DataFrame, events_df: pd.DataFrame) -> list[Snippet]:
+    events = events_df.sort_values(["customer_id", "event_month"])
+    history = (
+        events["event_type"] + " " + events["event_month"].astype(str) + " "
+        + events["mrr_delta"].map(lambda v: ("+" if v > 0 else "") + format_metric_value("mrr_delta", v))
+    ).groupby(events["customer_id"]).agg("; ".join)
+
+    attrs = customers_df.set_index("customer_id")
+    history = history.reindex(attrs.index, fill_value="no revenue events")
+    signup = pd.to_datetime(attrs["signup_date"]).dt.strftime("%Y-%m-%d")
+
+    texts = (
+        "Customer " + attrs.index.astype(str) + " (" + attrs["customer_name"].astype(str) + "), "
+        + attrs["industry"].astype(str) + ", " + attrs["country"].astype(str)
+        + ", initial plan " + attrs["initial_plan"].astype(str)
+        + ", signed up " + signup
+        + ", " + np.where(attrs["is_active"].astype(bool), "active", "inactive")
+        + ". Revenue events: " + history
+    )
+    return [Snippet(f"customer:{cid}", text, "customer") for cid, text in texts.items()]
+
+# One snippet per precomputed anomaly flag
+def anomaly_snippets(anomalies_df: pd.DataFrame) -> list[Snippet]:
+    if anomalies_df.empty:
+        return []
+
+    labels = _month_aliases(anomalies_df["month"]).tolist()
+    snippets = []
+    for row, label in zip(anomalies_df.itertuples(index=False), labels):
+        scope = "company" if row.dimension == "all" else f"{row.dimension} {row.segment}"
+        snippets.append(Snippet(
+            f"anomaly:{row.dimension}:{row.segment}:{row.metric}:{row.month}",
+            f"Anomaly: {row.metric} {row.direction} in {label} for {scope}: "
+            f"{format_metric_value(row.metric, row.value)} vs expected {format_metric_value(row.metric, row.expected)}",
+            "anomaly",
+        ))
+    return snippets
+
+# Snippet for an answer the model gave, so later questions can build on it
+def explanation_snippet(
+    metric_label: str,
+    start_month: str,
+    end_month: str,
+    question: str | None,
+    response: str,
+) -> Snippet:
+    asked = ""
+    question = (question or "").strip().rstrip(".")
+    if question:
+        asked = f" Question: {question}" + ("" if question[-1] in "?!" else ".")
+    text = f"Earlier explanation of {metric_label} for {start_month} to {end_month}.{asked} Answer: {response.strip()}"
+    text = text[:MAX_EXPLANATION_CHARS]
+    key = "explanation:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return Snippet(key, text, "explanation")
+
+# Every fact snippet for a dataset
+@traced(category="retrieval")
+def build_fact_snippets(dataset: Dataset | None = None) -> list[Snippet]:
+    customer_month_mrr_df = load_customer_month_mrr(dataset)
+    events_df = load_revenue_events(dataset)
+    customers_df = load_customers(dataset)
+
+    metrics_df = compute_metrics_from_frames(customer_month_mrr_df, events_df)
+    series = build_segment_series(customer_month_mrr_df, events_df, customers_df)
+
+    return [
+        *month_snippets(metrics_df),
+        *segment_snippets(series),
+        *customer_snippets(customers_df, events_df),
+        *anomaly_snippets(load_metric_anomalies(dataset)),
+    ]
+
+# Index directory for a dataset
+def index_dir(dataset: Dataset) -> Path:
+    return DEFAULT_INDEX_DIR / dataset.name
+
+# Bring fact snippets up to a data version: only new or changed snippets are indexed.
+# Concurrent callers sharing the index wait for one rebuild instead of repeating it.
+@traced(category="retrieval")
+def sync_fact_snippets(index: RetrievalIndex, dataset: Dataset, data_version: str) -> int:
+    if index.meta.get("facts_version") == data_version:
+        return 0
+
+    with index.sync_lock:
+        if index.meta.get("facts_version") == data_version:
+            return 0
+
+        snippets = build_fact_snippets(dataset)
+        added = index.add(snippets)
+        index.retain(FACT_SOURCES, {s.key for s in snippets})
+        index.meta["facts_version"] = data_version
+        index.save()
+        return added
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.metrics.core import ANOMALY_COLUMNS, METRIC_OPTIONS, compute_metrics_from_frames
+from src.metrics.forecast import DEFAULT_DIMENSIONS, build_segment_series
+from src.tracing import traced
+
+# Trailing months used as the baseline for the robust z-score
+DEFAULT_WINDOW = 6
+
+# Seasonal lag in months
+DEFAULT_PERIOD = 12
+
+# |z| at or above this is flagged (Iglewicz-Hoaglin cut-off for modified z-scores)
+DEFAULT_THRESHOLD = 3.5
+
+# Metrics tracked per segment (company-level rows cover every metric)
+SEGMENT_METRICS = ["mrr_total", "churn_mrr", "revenue_churn_rate"]
+
+# Balances rather than flows: scored on month-over-month growth so steady growth isn't flagged
+STOCK_METRICS = {"mrr_total", "active_customers"}
+
+# MAD -> standard deviation for normal data
+_MAD_SCALE = 1.4826
+
+# Robust z of d against (center, mad); 0 where the baseline has no spread
+def _robust_z(d: np.ndarray, center: np.ndarray, mad: np.ndarray) -> np.ndarray:
+    scale = _MAD_SCALE * mad
+    z = np.zeros_like(d, dtype=float)
+    np.divide(d - center, scale, out=z, where=scale > 0)
+    return z
+
+# Each value against the median/MAD of the previous `window` values (NaN before that)
+def rolling_robust_z(values: np.ndarray, window: int = DEFAULT_WINDOW) -> tuple[np.ndarray, np.ndarray]:
+    """
+    All series are handled at once: sliding_window_view gives a
+    (series x month x window) view without copying, and the medians are taken
+    along the last axis.
+    """
+    n_series, n_months = values.shape
+    z = np.full((n_series, n_months), np.nan)
+    expected = np.full((n_series, n_months), np.nan)
+    if n_months <= window:
+        return z, expected
+
+    history = sliding_window_view(values[:, :-1], window, axis=1)
+    median = np.median(history, axis=2)
+    mad = np.median(np.abs(history - median[:, :, None]), axis=2)
+
+    z[:, window:] = _robust_z(values[:, window:], median, mad)
+    expected[:, window:] = median
+    return z, expected
+
+# Seasonal differences in the trailing baseline (two cycles before their spread means anything)
+SEASONAL_HISTORY_CYCLES = 2
+
+# Robust z of the year-over-year difference against the previous two years of differences
+def seasonal_residual_z(values: np.ndarray, period: int = DEFAULT_PERIOD) -> np.ndarray:
+    n_series, n_months = values.shape
+    z = np.full((n_series, n_months), np.nan)
+    if n_months <= period:
+        return z
+
+    # Trailing baseline only, so a month's score does not change when later data lands
+    residual = values[:, period:] - values[:, :-period]
+    z[:, period:], _ = rolling_robust_z(residual, SEASONAL_HISTORY_CYCLES * period)
+    return z
+
+# Flag points whose robust or seasonal z-score crosses the threshold
+@traced(category="anomalies")
+def detect_anomalies(
+    values: np.ndarray,
+    months: list[str],
+    keys: list[tuple[str, str, str]],
+    window: int = DEFAULT_WINDOW,
+    period: int = DEFAULT_PERIOD,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> pd.DataFrame:
+    values = np.asarray(values, dtype=float)
+
+    # Stock rows are scored on MoM growth; expected level = last value * (1 + typical growth)
+    stock = np.array([key[2] in STOCK_METRICS for key in keys], dtype=bool)
+    previous = np.zeros_like(values)
+    previous[:, 1:] = values[:, :-1]
+    growth = np.zeros_like(values)
+    np.divide(values - previous, previous, out=growth, where=previous > 0)
+    scored = np.where(stock[:, None], growth, values)
+
+    robust_z, expected = rolling_robust_z(scored, window)
+    seasonal_z = seasonal_residual_z(scored, period)
+    expected = np.where(stock[:, None], previous * (1 + expected), expected)
+
+    flagged = (np.abs(np.nan_to_num(robust_z)) >= threshold) | (np.abs(np.nan_to_num(seasonal_z)) >= threshold)
+    rows, cols = np.nonzero(flagged)
+
+    key_arr = np.array(keys, dtype=object).reshape(-1, 3)
+    # Direction follows whichever score is further out
+    robust_hit = np.nan_to_num(robust_z[rows, cols])
+    seasonal_hit = np.nan_to_num(seasonal_z[rows, cols])
+    score = np.where(np.abs(robust_hit) >= np.abs(seasonal_hit), robust_hit, seasonal_hit)
+
+    return pd.DataFrame({
+        "dimension": key_arr[rows, 0],
+        "segment": key_arr[rows, 1],
+        "metric": key_arr[rows, 2],
+        "month": np.asarray(months, dtype=object)[cols],
+        "value": values[rows, cols],
+        "expected": expected[rows, cols].round(4),
+        "robust_z": robust_z[rows, cols].round(3),
+        "seasonal_z": seasonal_z[rows, cols].round(3),
+        "direction": np.where(score >= 0, "spike", "drop"),
+    }, columns=ANOMALY_COLUMNS)
+
+# Anomaly flags for every company metric and every segment series
+@traced(category="anomalies")
+def build_anomaly_table(
+    customer_month_mrr_df: pd.DataFrame,
+    events_df: pd.DataFrame,
+    customers_df: pd.DataFrame,
+    dimensions: list[tuple[str, ...]] = DEFAULT_DIMENSIONS,
+    window: int = DEFAULT_WINDOW,
+    period: int = DEFAULT_PERIOD,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> pd.DataFrame:
+    series = build_segment_series(customer_month_mrr_df, events_df, customers_df, dimensions)
+
+    # Company metrics on the segment series' calendar axis
+    metrics_df = compute_metrics_from_frames(customer_month_mrr_df, events_df)
+    company = (
+        metrics_df.set_index(metrics_df["month"].astype(str))[list(METRIC_OPTIONS.values())]
+        .reindex(series.months, fill_value=0.0)
+        .to_numpy(dtype=float)
+        .T
+    )
+    keys = [("all", "all", metric) for metric in METRIC_OPTIONS.values()]
+    blocks = [company]
+
+    # Segment rows (the company row of the segment series is already covered)
+    segment_rows = [i for i, key in enumerate(series.keys) if key[0] != "all"]
+    segment_values = {
+        "mrr_total": series.mrr,
+        "churn_mrr": series.churn_mrr,
+        "revenue_churn_rate": series.churn_rate(),
+    }
+    for metric in SEGMENT_METRICS:
+        blocks.append(segment_values[metric][segment_rows])
+        keys += [(*series.keys[i], metric) for i in segment_rows]
+
+    return detect_anomalies(np.vstack(blocks), series.months, keys, window, period, threshold)
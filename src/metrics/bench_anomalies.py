@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.metrics.anomalies import DEFAULT_WINDOW, detect_anomalies, rolling_robust_z, seasonal_residual_z
+from src.metrics.bench_forecast import generate_series
+
+# Per-series pandas rolling median/MAD, as a loop over segments would do it
+def reference_robust_z(y: np.ndarray, window: int) -> np.ndarray:
+    s = pd.Series(y)
+    history = s.shift(1).rolling(window)
+    median = history.median()
+    mad = history.apply(lambda w: np.median(np.abs(w - np.median(w))), raw=True)
+    scale = 1.4826 * mad
+    z = (s - median) / scale.where(scale > 0)
+    return z.where(scale != 0, 0.0).where(median.notna()).to_numpy()
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Speed of vectorized anomaly scoring.")
+    parser.add_argument("--series", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--loop-sample", type=int, default=100,
+                        help="Series scored with the pandas loop (time is extrapolated)")
+    args = parser.parse_args(argv)
+
+    y = generate_series(args.series, args.months)
+    keys = [("bench", str(i), "mrr_total") for i in range(args.series)]
+    months = list(pd.period_range("2020-01", periods=args.months, freq="M").strftime("%Y-%m"))
+    print(f"{args.series:,} series x {args.months} months")
+
+    started = time.perf_counter()
+    flags = detect_anomalies(y, months, keys)
+    vectorized_seconds = time.perf_counter() - started
+
+    sample = min(args.loop_sample, args.series)
+    started = time.perf_counter()
+    reference = np.vstack([reference_robust_z(y[i], DEFAULT_WINDOW) for i in range(sample)])
+    loop_seconds = (time.perf_counter() - started) * args.series / sample
+
+    z, _ = rolling_robust_z(y[:sample], DEFAULT_WINDOW)
+    failures = []
+    if not np.allclose(z, reference, equal_nan=True):
+        failures.append("rolling robust z differs from the pandas reference")
+
+    # Scores only look back: appending months must not change earlier months' scores
+    cut = args.months - 6
+    if not np.allclose(seasonal_residual_z(y[:sample])[:, :cut], seasonal_residual_z(y[:sample, :cut]), equal_nan=True):
+        failures.append("seasonal z of earlier months changes when later months are added")
+
+    print(f"per-series pandas loop (extrapolated): {loop_seconds:8.3f}s")
+    print(f"vectorized (all series):               {vectorized_seconds:8.3f}s  "
+          f"({loop_seconds / vectorized_seconds:.0f}x), {len(flags):,} flags")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: vectorized scores match the reference and ignore later months")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.ingestion.build_customer_month_mrr import build_customer_month_mrr
+from src.ingestion.out_of_core import generate_subscriptions
+from src.metrics.core import get_active_customers, get_mrr_by_month
+from src.metrics.daily_mrr import (
+    SubscriptionIntervals,
+    compute_daily_mrr,
+    customer_daily_mrr,
+    customer_month_mrr_from_intervals,
+    monthly_touch_totals,
+)
+
+# Brute-force daily MRR and active customers for a few days
+def reference_days(subscriptions_df: pd.DataFrame, days: list[pd.Timestamp], last_date: pd.Timestamp) -> list[tuple[float, int]]:
+    start = pd.to_datetime(subscriptions_df["start_date"])
+    end = pd.to_datetime(subscriptions_df["end_date"]).fillna(last_date + pd.Timedelta(days=1))
+    values = []
+    for day in days:
+        active = (start <= day) & (end > day)
+        paying = active & (subscriptions_df["mrr_amount"] > 0)
+        values.append((float(subscriptions_df.loc[active, "mrr_amount"].sum()), int(subscriptions_df.loc[paying, "account_id"].nunique())))
+    return values
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Daily MRR sweep vs the per-row monthly builder.")
+    parser.add_argument("--accounts", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    subscriptions_df = generate_subscriptions(args.accounts)
+    subscriptions_df["start_date"] = pd.to_datetime(subscriptions_df["start_date"])
+    subscriptions_df["end_date"] = pd.to_datetime(subscriptions_df["end_date"])
+
+    started = time.perf_counter()
+    expected = build_customer_month_mrr(subscriptions_df)
+    builder_seconds = time.perf_counter() - started
+    print(f"{len(subscriptions_df):,} subscriptions -> {len(expected):,} customer-months")
+    print(f"monthly builder (per-row date_range):  {builder_seconds:8.3f}s")
+
+    started = time.perf_counter()
+    intervals = SubscriptionIntervals.from_subscriptions(subscriptions_df)
+    daily = compute_daily_mrr(intervals)
+    sweep_seconds = time.perf_counter() - started
+    print(f"daily sweep ({intervals.n_days:,} days):              {sweep_seconds:8.3f}s  ({builder_seconds / sweep_seconds:,.0f}x)")
+
+    started = time.perf_counter()
+    totals = monthly_touch_totals(intervals)
+    totals_seconds = time.perf_counter() - started
+    print(f"monthly totals from intervals:         {totals_seconds:8.3f}s")
+
+    started = time.perf_counter()
+    actual = customer_month_mrr_from_intervals(intervals)
+    expand_seconds = time.perf_counter() - started
+    print(f"customer_month_mrr from intervals:     {expand_seconds:8.3f}s  ({builder_seconds / expand_seconds:,.0f}x)")
+
+    started = time.perf_counter()
+    customer_daily_mrr(intervals, list(intervals.customer_ids[:100]))
+    print(f"per-customer daily, 100 customers:     {time.perf_counter() - started:8.3f}s")
+
+    failures = []
+    if not actual.equals(expected):
+        failures.append("customer_month_mrr from intervals differs from build_customer_month_mrr")
+
+    reference = get_mrr_by_month(expected).merge(get_active_customers(expected), on="month")
+    if not (
+        np.array_equal(totals["month"], reference["month"])
+        and np.allclose(totals["mrr_total"], reference["mrr_total"])
+        and np.array_equal(totals["active_customers"], reference["active_customers"])
+    ):
+        failures.append("monthly totals differ from the builder's")
+
+    rng = np.random.default_rng(0)
+    days = [pd.Timestamp(d) for d in rng.choice(daily.days, 20, replace=False)]
+    for day, (mrr, active) in zip(days, reference_days(subscriptions_df, days, daily.days[-1])):
+        i = daily.days.get_loc(day)
+        if not np.isclose(daily.mrr[i], mrr) or daily.active_customers[i] != active:
+            failures.append(f"daily values differ on {day.date()}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: monthly outputs match the builder and sampled days match a brute-force count")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.metrics.forecast import DEFAULT_ALPHAS, DEFAULT_BETAS, ForecastCache, fit_holt, fit_holt_cached
+
+# Random-walk-with-drift MRR series, one row per segment
+def generate_series(n_segments: int, n_months: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    drift = rng.normal(500.0, 300.0, (n_segments, 1))
+    noise = rng.normal(0.0, 1000.0, (n_segments, n_months))
+    start = rng.uniform(10_000.0, 100_000.0, (n_segments, 1))
+    return np.maximum(start + np.cumsum(drift + noise, axis=1), 0.0)
+
+# Scalar grid search for one series, as a per-segment loop would do it
+def fit_one(y: np.ndarray, alphas: np.ndarray, betas: np.ndarray) -> tuple[float, float, float, float, float]:
+    best = None
+    for alpha in alphas:
+        for beta in betas:
+            level, trend, sse = y[0], y[1] - y[0], 0.0
+            for value in y[1:]:
+                err = value - (level + trend)
+                sse += err * err
+                new_level = level + trend + alpha * err
+                trend = trend + beta * (new_level - level - trend)
+                level = new_level
+            if best is None or sse < best[0]:
+                best = (sse, alpha, beta, level, trend)
+    return best[1], best[2], best[3], best[4], best[0]
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Fit time of the batched Holt forecaster.")
+    parser.add_argument("--segments", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--loop-sample", type=int, default=50,
+                        help="Segments fitted with the scalar loop (time is extrapolated)")
+    args = parser.parse_args(argv)
+
+    y = generate_series(args.segments, args.months)
+    print(f"{args.segments:,} segments x {args.months} months, "
+          f"{len(DEFAULT_ALPHAS) * len(DEFAULT_BETAS)} (alpha, beta) grid points")
+
+    started = time.perf_counter()
+    fit = fit_holt(y)
+    batched_seconds = time.perf_counter() - started
+
+    sample = min(args.loop_sample, args.segments)
+    started = time.perf_counter()
+    reference = [fit_one(y[i], DEFAULT_ALPHAS, DEFAULT_BETAS) for i in range(sample)]
+    loop_seconds = (time.perf_counter() - started) * args.segments / sample
+
+    failures = []
+    for i, (alpha, beta, level, trend, _) in enumerate(reference):
+        if not (np.isclose(fit.alpha[i], alpha) and np.isclose(fit.beta[i], beta)
+                and np.isclose(fit.level[i], level) and np.isclose(fit.trend[i], trend)):
+            failures.append(f"segment {i}: batched fit differs from scalar reference")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ForecastCache(cache_dir)
+        fit_holt_cached(y, cache)
+        started = time.perf_counter()
+        cached = fit_holt_cached(y, cache)
+        cached_seconds = time.perf_counter() - started
+        if not np.array_equal(cached.level, fit.level):
+            failures.append("cached parameters differ from a fresh fit")
+
+    print(f"per-segment loop (extrapolated): {loop_seconds:8.3f}s")
+    print(f"batched fit:                     {batched_seconds:8.3f}s  ({loop_seconds / batched_seconds:.0f}x)")
+    print(f"cached parameters:               {cached_seconds:8.3f}s")
+
+    if failures:
+        for failure in failures[:10]:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: batched fit matches the scalar reference")
+
+if __name__ == "__main__":
+    main()
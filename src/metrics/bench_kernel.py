@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.metrics.core import COMPONENT_COLUMNS, compute_metrics_from_frames
+
+SERIES_COLUMNS = [
+    "mrr_total",
+    *COMPONENT_COLUMNS.values(),
+    "net_new_mrr",
+    "active_customers",
+    "revenue_churn_rate",
+]
+
+# Synthetic customer_month_mrr / revenue_events with the processed schema
+def generate_frames(n_rows: int, n_months: int = 60, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    month_labels = pd.period_range("2020-01", periods=n_months, freq="M").strftime("%Y-%m").to_numpy(dtype=object)
+    customer_labels = np.array([f"A-{i:06x}" for i in range(max(n_rows // n_months, 1))], dtype=object)
+
+    # Labels are repeated references to a small pool of strings, like read_csv output
+    month_mrr_df = pd.DataFrame({
+        "customer_id": customer_labels[rng.integers(0, len(customer_labels), n_rows)],
+        "month": month_labels[rng.integers(0, n_months, n_rows)],
+        "mrr": rng.choice([0.0, 99.0, 499.0, 1999.0], n_rows, p=[0.05, 0.5, 0.35, 0.1]),
+    })
+
+    n_events = max(n_rows // 10, n_months * 4)
+    types = np.array(list(COMPONENT_COLUMNS), dtype=object)
+    event_types = types[rng.integers(0, len(types), n_events)]
+    sign = np.where(np.isin(event_types, ["churn", "contraction"]), -1.0, 1.0)
+
+    events_df = pd.DataFrame({
+        "customer_id": customer_labels[rng.integers(0, len(customer_labels), n_events)],
+        "event_month": month_labels[rng.integers(0, n_months, n_events)],
+        "event_type": event_types,
+        "mrr_delta": sign * rng.integers(1, 2000, n_events).astype(float),
+    })
+
+    return month_mrr_df, events_df
+
+# Straightforward pandas reference: groupby + merges, previous month matched by label
+def reference_metrics(month_mrr_df: pd.DataFrame, events_df: pd.DataFrame) -> pd.DataFrame:
+    mrr = month_mrr_df.groupby("month")["mrr"].sum().rename("mrr_total")
+    active = (month_mrr_df["mrr"] > 0).groupby(month_mrr_df["month"]).sum().rename("active_customers")
+
+    components = (
+        events_df.groupby(["event_month", "event_type"])["mrr_delta"].sum()
+        .unstack(fill_value=0.0)
+        .reindex(columns=list(COMPONENT_COLUMNS), fill_value=0.0)
+        .rename(columns=COMPONENT_COLUMNS)
+    )
+
+    df = pd.concat([mrr, active], axis=1).join(components, how="left").fillna(0.0)
+    df["net_new_mrr"] = df[list(COMPONENT_COLUMNS.values())].sum(axis=1)
+
+    prev_label = (pd.PeriodIndex(df.index, freq="M") - 1).strftime("%Y-%m")
+    mrr_prev = pd.Series(prev_label, index=df.index).map(mrr).fillna(0.0)
+    df["revenue_churn_rate"] = np.where(mrr_prev > 0, df["churn_mrr"].abs() / mrr_prev.where(mrr_prev > 0, 1.0), 0.0)
+
+    return df.reset_index(names="month")
+
+# Compare every series month by month
+def check_equivalent(expected: pd.DataFrame, actual: pd.DataFrame) -> list[str]:
+    problems = []
+    if expected["month"].astype(str).tolist() != actual["month"].astype(str).tolist():
+        return ["month axis differs"]
+    for col in SERIES_COLUMNS:
+        if not np.allclose(expected[col].to_numpy(dtype=float), actual[col].to_numpy(dtype=float)):
+            problems.append(f"{col} differs")
+    return problems
+
+# Edge case: a month with MRR but no events must not shift the churn rate
+def check_month_without_events() -> list[str]:
+    month_mrr_df = pd.DataFrame({
+        "customer_id": ["A", "B", "A", "A"],
+        "month": ["2024-01", "2024-01", "2024-02", "2024-03"],
+        "mrr": [100.0, 50.0, 100.0, 100.0],
+    })
+    events_df = pd.DataFrame({
+        "customer_id": ["A", "B", "B"],
+        "event_month": ["2024-01", "2024-01", "2024-03"],
+        "event_type": ["new", "new", "churn"],
+        "mrr_delta": [100.0, 50.0, -50.0],
+    })
+
+    metrics = compute_metrics_from_frames(month_mrr_df, events_df).set_index("month")
+
+    problems = []
+    if metrics.loc["2024-02", "churn_mrr"] != 0.0:
+        problems.append("month without events should have zero components")
+    if not np.isclose(metrics.loc["2024-03", "revenue_churn_rate"], 50.0 / 100.0):
+        problems.append("churn rate must use the previous calendar month's MRR")
+    return problems
+
+def _best_of(fn, runs: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Equivalence and speed of the monthly metrics kernel.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="customer-month rows")
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failures = check_month_without_events()
+
+    print(f"Generating {args.rows:,} customer-month rows...")
+    month_mrr_df, events_df = generate_frames(args.rows, args.months)
+
+    ref_seconds, expected = _best_of(lambda: reference_metrics(month_mrr_df, events_df), args.runs)
+    kernel_seconds, actual = _best_of(lambda: compute_metrics_from_frames(month_mrr_df, events_df), args.runs)
+    failures += check_equivalent(expected, actual)
+
+    print(f"reference (groupby + merges): {ref_seconds:8.3f}s")
+    print(f"kernel (bincount arrays):     {kernel_seconds:8.3f}s  ({ref_seconds / kernel_seconds:.1f}x)")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: kernel matches reference")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.metrics.bench_kernel import generate_frames
+from src.metrics.core import COMPONENT_COLUMNS, compute_metrics_from_frames, month_ordinals
+from src.metrics.scenario import ACTIVE_COUNT_SIGN, Adjustment, ScenarioEngine
+
+# Apply the adjustments to the events, restate each customer's MRR snapshots from the
+# adjusted event onward, and recompute everything with compute_metrics_from_frames.
+# Active customers follow the scenario's count semantics instead of the restated rows
+# (a churned customer keeping 20% of its MRR is not "20% fewer churned customers"):
+# each new/churn event counts as its multiplier, the running change rounded.
+def reference_scenario(
+    month_mrr_df: pd.DataFrame,
+    events_df: pd.DataFrame,
+    adjustments: list[Adjustment],
+) -> pd.DataFrame:
+    events = events_df.copy()
+    event_ordinals = month_ordinals(events["event_month"])
+    weights = np.ones(len(events))
+    for adj in adjustments:
+        start = month_ordinals(pd.Index([adj.start_month]))[0]
+        end = month_ordinals(pd.Index([adj.end_month]))[0] if adj.end_month else event_ordinals.max()
+        rows = (events["event_type"] == adj.event_type).to_numpy() & (event_ordinals >= start) & (event_ordinals <= end)
+        steps = event_ordinals[rows] - start + 1
+        weights[rows] *= adj.factor * (1.0 + adj.monthly_growth) ** steps
+    events["mrr_delta"] *= weights
+
+    # A changed delta moves the customer's MRR in its month and every later month
+    months = pd.Index(sorted(set(month_mrr_df["month"]) | set(events["event_month"])))
+    customers = pd.Index(pd.unique(pd.concat([month_mrr_df["customer_id"], events["customer_id"]])))
+    change = (events["mrr_delta"] - events_df["mrr_delta"]).to_numpy()
+    edited = np.flatnonzero(change != 0)
+    grid = np.zeros((len(customers), len(months)))
+    np.add.at(
+        grid,
+        (customers.get_indexer(events["customer_id"].iloc[edited]), months.get_indexer(events["event_month"].iloc[edited])),
+        change[edited],
+    )
+    carried = np.cumsum(grid, axis=1)
+    cust, month = np.nonzero(carried)
+    restated = pd.DataFrame({"customer_id": customers[cust], "month": months[month], "mrr": carried[cust, month]})
+
+    month_mrr = (
+        pd.concat([month_mrr_df, restated], ignore_index=True)
+        .groupby(["customer_id", "month"], as_index=False, sort=False)["mrr"].sum()
+    )
+    result = compute_metrics_from_frames(month_mrr, events)
+
+    sign = events["event_type"].map(ACTIVE_COUNT_SIGN).fillna(0.0).to_numpy()
+    customer_change = pd.Series(sign * (weights - 1.0)).groupby(events["event_month"].to_numpy()).sum()
+    running = np.rint(customer_change.reindex(result["month"], fill_value=0.0).cumsum().to_numpy())
+    baseline_active = compute_metrics_from_frames(month_mrr_df, events_df)["active_customers"].to_numpy()
+    result["active_customers"] = baseline_active + running
+    return result
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Latency of the what-if scenario engine.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="customer-month rows")
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--scenarios", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.rows:,} customer-month rows...")
+    month_mrr_df, events_df = generate_frames(args.rows, args.months)
+
+    started = time.perf_counter()
+    base_df = compute_metrics_from_frames(month_mrr_df, events_df)
+    engine = ScenarioEngine.from_metrics(base_df, events_df)
+    setup_seconds = time.perf_counter() - started
+
+    months = list(engine.months)
+    rng = np.random.default_rng(0)
+    scenarios = []
+    for _ in range(args.scenarios):
+        start = int(rng.integers(0, len(months)))
+        end = int(rng.integers(start, len(months)))
+        scenarios.append([
+            Adjustment("churn", months[start], months[end], factor=float(rng.uniform(0.5, 1.5))),
+            Adjustment("expansion", months[start], None, monthly_growth=float(rng.uniform(-0.05, 0.05))),
+        ])
+
+    timings = []
+    for adjustments in scenarios:
+        started = time.perf_counter()
+        engine.run(adjustments)
+        timings.append(time.perf_counter() - started)
+
+    # Check a few scenarios against editing the events and MRR tables and recomputing
+    failures = []
+    columns = ["mrr_total", *COMPONENT_COLUMNS.values(), "net_new_mrr", "active_customers", "revenue_churn_rate"]
+    for adjustments in scenarios[:3]:
+        expected = reference_scenario(month_mrr_df, events_df, adjustments)
+        actual = engine.run(adjustments)
+        for col in columns:
+            if not np.allclose(expected[col].to_numpy(dtype=float), actual[col].to_numpy(dtype=float)):
+                failures.append(f"{col} differs from full recompute")
+
+    started = time.perf_counter()
+    reference_scenario(month_mrr_df, events_df, scenarios[0])
+    recompute_seconds = time.perf_counter() - started
+
+    timings_ms = np.array(timings) * 1000
+    print(f"setup (metrics + event counts, once): {setup_seconds:8.3f}s")
+    print(f"full recompute per scenario:          {recompute_seconds * 1000:8.1f} ms")
+    print(f"scenario engine per scenario:         {np.median(timings_ms):8.2f} ms median, "
+          f"{np.percentile(timings_ms, 99):.2f} ms p99")
+
+    if failures:
+        for failure in sorted(set(failures)):
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: scenario engine matches full recompute")
+
+if __name__ == "__main__":
+    main()
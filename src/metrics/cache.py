@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Callable
+
+# Process-wide hit/miss and compute-time counters for a cached computation
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    misses: int = 0
+    compute_seconds: float = 0.0
+    last_compute_seconds: float | None = None
+    last_version: str | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    # Count every cache read (hits are derived from lookups - misses)
+    def record_lookup(self) -> None:
+        with self._lock:
+            self.lookups += 1
+
+    # Count a recompute and how long it took
+    def record_miss(self, version: str, seconds: float) -> None:
+        with self._lock:
+            self.misses += 1
+            self.compute_seconds += seconds
+            self.last_compute_seconds = seconds
+            self.last_version = version
+
+    @property
+    def hits(self) -> int:
+        return max(self.lookups - self.misses, 0)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "compute_seconds_total": self.compute_seconds,
+                "compute_seconds_last": self.last_compute_seconds,
+                "data_version": self.last_version,
+            }
+
+# Identity of the memory behind a column (numpy data pointer or Arrow buffer addresses)
+def _column_buffer(series) -> tuple:
+    array = series.array
+    if hasattr(array, "__arrow_array__"):
+        arrow = array.__arrow_array__()
+        chunks = getattr(arrow, "chunks", [arrow])
+        return ("arrow", *(b.address for chunk in chunks for b in chunk.buffers() if b is not None))
+    values = series.to_numpy(copy=False)        # a view for numpy-backed columns
+    return ("numpy", values.__array_interface__["data"][0], values.nbytes, values.dtype.str)
+
+# Size of a DataFrame's index and columns; columns shared with frames already counted are skipped
+def _frame_bytes(frame, seen: set) -> int:
+    total = int(frame.index.memory_usage(deep=True))
+    for _, series in frame.items():
+        key = _column_buffer(series)
+        if key in seen:
+            continue
+        seen.add(key)
+        total += int(series.memory_usage(index=False, deep=True))
+    return total
+
+# Approximate in-memory size of cached values (DataFrames, dataclasses, containers)
+def estimate_bytes(value, _seen: set | None = None) -> int:
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return _frame_bytes(value, seen)
+    if is_dataclass(value):
+        return sys.getsizeof(value) + sum(
+            estimate_bytes(getattr(value, f.name), seen) for f in fields(value)
+        )
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v, seen) for v in value)
+    return sys.getsizeof(value)
+
+# Builds are serialized per tenant through a fixed pool of striped locks (bounded memory
+# however many tenants are seen; two tenants sharing a stripe only wait for each other)
+N_BUILD_LOCKS = 64
+
+# Cached value for one tenant, tagged with the data version it was built from
+@dataclass
+class _TenantEntry:
+    version: str
+    value: object
+    nbytes: int
+
+# Bounded LRU of per-tenant metric tables, evicted by estimated memory
+class TenantMetricsCache:
+    """
+    Keeps the most recently used tenants in memory until `max_bytes` is
+    exceeded, then evicts least recently used tenants. An entry built from an
+    older data version is rebuilt on the next lookup. The most recent entry is
+    always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self.evictions = 0
+        self._entries: OrderedDict[str, _TenantEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = [threading.Lock() for _ in range(N_BUILD_LOCKS)]
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def _lookup(self, tenant: str, version: str):
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(tenant)
+            return entry
+
+    # Cached value for a tenant, building it with `build()` on a miss
+    def get(self, tenant: str, version: str, build: Callable[[], object]):
+        self.stats.record_lookup()
+
+        entry = self._lookup(tenant, version)
+        if entry is not None:
+            return entry.value
+
+        # One build per tenant at a time; other tenants are blocked only if they share the stripe
+        with self._build_locks[zlib.crc32(tenant.encode("utf-8")) % N_BUILD_LOCKS]:
+            entry = self._lookup(tenant, version)
+            if entry is not None:
+                return entry.value
+
+            started = time.perf_counter()
+            value = build()
+            self.stats.record_miss(version, time.perf_counter() - started)
+
+            self._insert(tenant, _TenantEntry(version, value, estimate_bytes(value)))
+            return value
+
+    def _insert(self, tenant: str, entry: _TenantEntry) -> None:
+        with self._lock:
+            self._entries[tenant] = entry
+            self._entries.move_to_end(tenant)
+
+            total = sum(e.nbytes for e in self._entries.values())
+            while len(self._entries) > 1 and (
+                total > self.max_bytes
+                or (self.max_entries is not None and len(self._entries) > self.max_entries)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.nbytes
+                self.evictions += 1
+
+    # Drop one tenant (or everything)
+    def invalidate(self, tenant: str | None = None) -> None:
+        with self._lock:
+            if tenant is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(tenant, None)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            tenants = {name: entry.nbytes for name, entry in self._entries.items()}
+        return {
+            **self.stats.as_dict(),
+            "tenants": tenants,
+            "total_bytes": sum(tenants.values()),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
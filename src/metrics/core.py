@@ -1,110 +1,382 @@
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 
-from src.config import DATA_PROCESSED_DIR
+from src.config import Dataset, get_dataset
+from src.tracing import traced
+
+# Dashboard metric labels -> columns in the metrics table
+METRIC_OPTIONS = {
+    "Total MRR": "mrr_total",
+    "New MRR": "new_mrr",
+    "Expansion MRR": "expansion_mrr",
+    "Contraction MRR": "contraction_mrr",
+    "Churn MRR": "churn_mrr",
+    "Net New MRR": "net_new_mrr",
+    "Active Customers": "active_customers",
+    "Revenue Churn Rate": "revenue_churn_rate",
+}
+
+# Time window labels -> number of trailing months (None = all)
+WINDOW_OPTIONS = {
+    "Last 6 months": 6,
+    "Last 12 months": 12,
+    "Last 24 months": 24,
+    "All": None,
+}
+
+# Columns of the precomputed anomaly flags table (metric_anomalies.csv)
+ANOMALY_COLUMNS = [
+    "dimension",
+    "segment",
+    "metric",
+    "month",
+    "value",
+    "expected",
+    "robust_z",
+    "seasonal_z",
+    "direction",
+]
+
+# Columns of daily_mrr.csv
+DAILY_MRR_COLUMNS = ["date", "mrr", "active_customers"]
 
 # Loaders
 
+# A processed table as of a snapshot version (the store imports this module, so import lazily)
+def _load_as_of(dataset: Dataset | None, name: str, as_of: str) -> pd.DataFrame:
+    from src.ingestion.snapshots import load_snapshot_table
+    return load_snapshot_table(dataset, name, as_of)
+
 # Load processed customers table
-def load_customers() -> pd.DataFrame:
-    path = DATA_PROCESSED_DIR / "customers.csv"
+@traced(category="io")
+def load_customers(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    if as_of is not None:
+        return _load_as_of(dataset, "customers", as_of)
+    dataset = dataset or get_dataset()
+    path = dataset.processed_dir / "customers.csv"
     return pd.read_csv(path, parse_dates=["signup_date"])
 
 # Load monthly MRR per customer
-def load_customer_month_mrr() -> pd.DataFrame:
-    path = DATA_PROCESSED_DIR / "customer_month_mrr.csv"
+@traced(category="io")
+def load_customer_month_mrr(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    if as_of is not None:
+        return _load_as_of(dataset, "customer_month_mrr", as_of)
+    dataset = dataset or get_dataset()
+    path = dataset.processed_dir / "customer_month_mrr.csv"
     return pd.read_csv(path)
 
 # Load revenue events
-def load_revenue_events() -> pd.DataFrame:
-    path = DATA_PROCESSED_DIR / "revenue_events.csv"
+@traced(category="io")
+def load_revenue_events(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    if as_of is not None:
+        return _load_as_of(dataset, "revenue_events", as_of)
+    dataset = dataset or get_dataset()
+    path = dataset.processed_dir / "revenue_events.csv"
     return pd.read_csv(path, parse_dates=["event_date"])
 
+# Load precomputed anomaly flags (empty if the anomaly stage has not run yet)
+@traced(category="io")
+def load_metric_anomalies(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    if as_of is not None:
+        return _load_as_of(dataset, "metric_anomalies", as_of)
+    dataset = dataset or get_dataset()
+    path = dataset.processed_dir / "metric_anomalies.csv"
+    if not path.exists():
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    return pd.read_csv(path, dtype={"month": str})
+
+# Load company MRR and active customers per day (empty if the daily stage has not run yet)
+@traced(category="io")
+def load_daily_mrr(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    if as_of is not None:
+        return _load_as_of(dataset, "daily_mrr", as_of)
+    dataset = dataset or get_dataset()
+    path = dataset.processed_dir / "daily_mrr.csv"
+    if not path.exists():
+        return pd.DataFrame(columns=DAILY_MRR_COLUMNS)
+    return pd.read_csv(path, parse_dates=["date"])
+
 # Core metrics
 
+# Revenue event types -> component columns, in table order
+COMPONENT_COLUMNS = {
+    "new": "new_mrr",
+    "expansion": "expansion_mrr",
+    "contraction": "contraction_mrr",
+    "churn": "churn_mrr",
+}
+
+# Calendar month number (year * 12 + month) for "YYYY-MM" labels
+def month_ordinals(months: pd.Index | pd.Series) -> np.ndarray:
+    labels = pd.Index(months).astype(str)
+    return labels.str[:4].astype(int).to_numpy() * 12 + labels.str[5:7].astype(int).to_numpy()
+
+# Source value for the calendar month before each target month (0 if absent)
+def prev_month_values(
+    target_ordinals: np.ndarray,
+    source_ordinals: np.ndarray,
+    source_values: np.ndarray,
+) -> np.ndarray:
+    if len(source_ordinals) == 0:
+        return np.zeros(len(target_ordinals), dtype=float)
+
+    order = np.argsort(source_ordinals, kind="stable")
+    sorted_ordinals = source_ordinals[order]
+    sorted_values = np.asarray(source_values, dtype=float)[order]
+
+    pos = np.searchsorted(sorted_ordinals, target_ordinals - 1)
+    pos_clipped = np.minimum(pos, len(sorted_ordinals) - 1)
+    found = (pos < len(sorted_ordinals)) & (sorted_ordinals[pos_clipped] == target_ordinals - 1)
+
+    return np.where(found, sorted_values[pos_clipped], 0.0)
+
+# |Churn| / MRR(prev_month), 0 where there is no previous MRR
+def churn_rate(churn_mrr: np.ndarray, mrr_prev: np.ndarray) -> np.ndarray:
+    rate = np.zeros(len(churn_mrr), dtype=float)
+    np.divide(np.abs(churn_mrr), mrr_prev, out=rate, where=mrr_prev > 0)
+    return rate
+
+# Integer codes for labels on a sorted axis (-1 for missing/unknown labels).
+# Hashing happens once per row; the small set of distinct labels is sorted or
+# looked up afterwards, which is much cheaper than sort=True factorization.
+def _sorted_codes(values: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+
+    order = np.argsort(uniques, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    return np.append(rank, -1)[codes], uniques[order]
+
+# Integer codes for labels on a given axis (-1 for labels not on it)
+def codes_on_axis(values: pd.Series, axis: pd.Index) -> np.ndarray:
+    codes, uniques = pd.factorize(values)
+    return np.append(axis.get_indexer(uniques), -1)[codes]
+
 # Compute total MRR per month
+@traced(category="metrics")
 def get_mrr_by_month(customer_month_mrr_df: pd.DataFrame) -> pd.DataFrame:
     df = (
-        customer_month_mrr_df.groupby("month", as_index=False)["mrr"]
+        customer_month_mrr_df.groupby("month", as_index=False, sort=True)["mrr"]
         .sum()
-        .sort_values("month")
     )
     df = df.rename(columns={"mrr": "mrr_total"})
     return df
 
 # Compute New / Expansion / Contraction / Churn MRR per month
+@traced(category="metrics")
 def get_mrr_components_by_month(events_df: pd.DataFrame) -> pd.DataFrame:
-    grouped = (
-        events_df.groupby(["event_month", "event_type"])["mrr_delta"]
-        .sum()
-        .unstack(fill_value=0.0)
-    )
-
-    for col in ["new", "expansion", "contraction", "churn"]:
-        if col not in grouped.columns:
-            grouped[col] = 0.0
+    month_codes, months = _sorted_codes(events_df["event_month"])
+    type_codes = codes_on_axis(events_df["event_type"], pd.Index(list(COMPONENT_COLUMNS)))
 
-    grouped = grouped.reset_index().rename(columns={"event_month": "month"})
+    sums = component_sums(month_codes, type_codes, events_df["mrr_delta"].to_numpy(), len(months))
 
-    result = grouped[["month", "new", "expansion", "contraction", "churn"]].copy()
-    result = result.sort_values("month").reset_index(drop=True)
-
-    result = result.rename(
-        columns={
-            "new": "new_mrr",
-            "expansion": "expansion_mrr",
-            "contraction": "contraction_mrr",
-            "churn": "churn_mrr",
-        }
-    )
+    result = pd.DataFrame({"month": months})
+    for i, col in enumerate(COMPONENT_COLUMNS.values()):
+        result[col] = sums[:, i]
 
     return result
 
 # Compute Net New MRR per month
+@traced(category="metrics")
 def get_net_new_mrr(components_df: pd.DataFrame) -> pd.DataFrame:
-    df = components_df.copy()
-    df["net_new_mrr"] = (
-        df["new_mrr"]
-        + df["expansion_mrr"]
-        + df["contraction_mrr"]
-        + df["churn_mrr"]
-    )
-    return df[["month", "net_new_mrr"]]
+    net_new = sum(components_df[col].to_numpy() for col in COMPONENT_COLUMNS.values())
+    return pd.DataFrame({"month": components_df["month"].to_numpy(), "net_new_mrr": net_new})
 
 # Compute revenue churn rate per month: |Churn| / MRR(prev_month)
+@traced(category="metrics")
 def get_revenue_churn_rate(
     components_df: pd.DataFrame,
     mrr_by_month_df: pd.DataFrame,
 ) -> pd.DataFrame:
-    churn_df = components_df[["month", "churn_mrr"]].copy()
-    mrr_df = mrr_by_month_df.copy()
+    # Align previous-month MRR by calendar month, not by row position
+    mrr_prev = prev_month_values(
+        month_ordinals(components_df["month"]),
+        month_ordinals(mrr_by_month_df["month"]),
+        mrr_by_month_df["mrr_total"].to_numpy(),
+    )
 
-    churn_df = churn_df.sort_values("month").reset_index(drop=True)
-    mrr_df = mrr_df.sort_values("month").reset_index(drop=True)
+    rate = churn_rate(components_df["churn_mrr"].to_numpy(dtype=float), mrr_prev)
+    return pd.DataFrame({"month": components_df["month"].to_numpy(), "revenue_churn_rate": rate})
 
-    churn_df["mrr_prev"] = mrr_df["mrr_total"].shift(1)
-    churn_df["mrr_prev"] = churn_df["mrr_prev"].fillna(0.0)
+# Count active customers per month
+@traced(category="metrics")
+def get_active_customers(customer_month_mrr_df: pd.DataFrame) -> pd.DataFrame:
+    active = customer_month_mrr_df["mrr"].gt(0).groupby(customer_month_mrr_df["month"], sort=True).sum()
+    return pd.DataFrame({"month": active.index.to_numpy(), "active_customers": active.to_numpy()})
 
-    def safe_rate(row: pd.Series) -> float:
-        if row["mrr_prev"] <= 0:
-            return 0.0
-        return abs(row["churn_mrr"]) / row["mrr_prev"]
+# Per-month sums of mrr_delta for each component type in one bincount
+def component_sums(
+    month_codes: np.ndarray,
+    type_codes: np.ndarray,
+    mrr_delta: np.ndarray,
+    n_months: int,
+) -> np.ndarray:
+    n_types = len(COMPONENT_COLUMNS)
+    valid = (month_codes >= 0) & (type_codes >= 0)
+    if not valid.all():
+        month_codes, type_codes, mrr_delta = month_codes[valid], type_codes[valid], mrr_delta[valid]
 
-    churn_df["revenue_churn_rate"] = churn_df.apply(safe_rate, axis=1)
+    flat = month_codes.astype(np.int64) * n_types + type_codes
+    sums = np.bincount(flat, weights=mrr_delta.astype(float), minlength=n_months * n_types)
+    return sums.reshape(n_months, n_types)
 
-    return churn_df[["month", "revenue_churn_rate"]]
+# Month-indexed arrays for every monthly series in a single pass over each table
+@traced(category="metrics")
+def compute_monthly_arrays(
+    customer_month_mrr_df: pd.DataFrame,
+    events_df: pd.DataFrame,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Months come from customer_month_mrr (sorted). Events are mapped onto the
+    same month axis by label; months without events get 0 for every
+    component. Nothing is copied from the input frames and there is no
+    row-wise apply or positional alignment.
+    """
+    # Month axis and MRR / active counts
+    month_codes, months = _sorted_codes(customer_month_mrr_df["month"])
+    n_months = len(months)
+    mrr = customer_month_mrr_df["mrr"].to_numpy(dtype=float)
 
-# Count active customers per month
-def get_active_customers(customer_month_mrr_df: pd.DataFrame) -> pd.DataFrame:
-    df = customer_month_mrr_df.copy()
-    df["is_active"] = df["mrr"] > 0
+    if (month_codes < 0).any():
+        keep = month_codes >= 0
+        month_codes, mrr = month_codes[keep], mrr[keep]
 
-    active_df = (
-        df.groupby("month", as_index=False)["is_active"]
-        .sum()
-        .rename(columns={"is_active": "active_customers"})
-        .sort_values("month")
-    )
+    mrr_total = np.bincount(month_codes, weights=mrr, minlength=n_months)
+    active_customers = np.bincount(month_codes[mrr > 0], minlength=n_months)
+
+    # Components: one bincount over (month, event_type)
+    event_month_codes = codes_on_axis(events_df["event_month"], pd.Index(months))
+    type_codes = codes_on_axis(events_df["event_type"], pd.Index(list(COMPONENT_COLUMNS)))
+    sums = component_sums(event_month_codes, type_codes, events_df["mrr_delta"].to_numpy(), n_months)
+
+    series = {"mrr_total": mrr_total}
+    for i, col in enumerate(COMPONENT_COLUMNS.values()):
+        series[col] = sums[:, i]
+    series["net_new_mrr"] = sums.sum(axis=1)
+    series["active_customers"] = active_customers
+
+    # Churn rate against the previous calendar month's MRR
+    ordinals = month_ordinals(months)
+    mrr_prev = prev_month_values(ordinals, ordinals, mrr_total)
+    series["revenue_churn_rate"] = churn_rate(series["churn_mrr"], mrr_prev)
+
+    return months, series
+
+# Compute all monthly metrics in one table
+@traced(category="metrics")
+def compute_metrics(dataset: Dataset | None = None, as_of: str | None = None) -> pd.DataFrame:
+    # Snapshots store the metrics table with each version
+    if as_of is not None:
+        from src.ingestion.snapshots import load_snapshot_metrics
+        return load_snapshot_metrics(dataset, as_of)
+    customer_month_mrr_df = load_customer_month_mrr(dataset)
+    events_df = load_revenue_events(dataset)
+    return compute_metrics_from_frames(customer_month_mrr_df, events_df)
+
+# Compute the monthly metrics table from already-loaded tables
+@traced(category="metrics")
+def compute_metrics_from_frames(
+    customer_month_mrr_df: pd.DataFrame,
+    events_df: pd.DataFrame,
+) -> pd.DataFrame:
+    months, series = compute_monthly_arrays(customer_month_mrr_df, events_df)
+
+    metrics_df = pd.DataFrame({"month": months, **series})
+
+    # Convert month label to datetime for plotting
+    metrics_df["month_date"] = pd.to_datetime(metrics_df["month"] + "-01")
+
+    return metrics_df
+
+# Drill-down index
+
+# Start/end row offsets for each run of equal keys in a sorted array
+def _group_offsets(sorted_keys: np.ndarray) -> dict[str, tuple[int, int]]:
+    if len(sorted_keys) == 0:
+        return {}
 
-    return active_df
+    starts = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.append(starts[1:], len(sorted_keys))
 
-    
+    return {
+        str(sorted_keys[start]): (int(start), int(end))
+        for start, end in zip(starts, ends)
+    }
+
+# Precomputed lookups for per-month movers and per-customer MRR history
+@dataclass
+class DrillDownIndex:
+    top_k: int
+    events: pd.DataFrame            # sorted by event_month, then |mrr_delta| desc
+    event_offsets: dict[str, tuple[int, int]]
+    top_movers_by_month: dict[str, pd.DataFrame]
+    history: pd.DataFrame           # sorted by customer_id, then month
+    customer_offsets: dict[str, tuple[int, int]]
+
+    # Customers with the largest |mrr_delta| in a month
+    def top_movers(self, month: str, k: int | None = None) -> pd.DataFrame:
+        k = self.top_k if k is None else k
+
+        if k <= self.top_k:
+            movers = self.top_movers_by_month.get(month)
+            if movers is None:
+                return self.events.iloc[0:0]
+            return movers.iloc[:k]
+
+        start, end = self.event_offsets.get(month, (0, 0))
+        return self.events.iloc[start:min(end, start + k)]
+
+    # Full monthly MRR history for one customer
+    def customer_history(self, customer_id: str) -> pd.DataFrame:
+        start, end = self.customer_offsets.get(customer_id, (0, 0))
+        return self.history.iloc[start:end]
+
+    # Months that have at least one revenue event
+    def months(self) -> list[str]:
+        return list(self.event_offsets.keys())
+
+    # Customers that have at least one month of MRR
+    def customers(self) -> list[str]:
+        return list(self.customer_offsets.keys())
+
+# Build the drill-down index once at load time
+@traced(category="metrics")
+def build_drilldown_index(
+    events_df: pd.DataFrame,
+    customer_month_mrr_df: pd.DataFrame,
+    top_k: int = 10,
+) -> DrillDownIndex:
+    # Order events so each month is a contiguous block, biggest movers first
+    abs_delta = events_df["mrr_delta"].abs().to_numpy()
+    months = events_df["event_month"].astype(str).to_numpy()
+    order = np.lexsort((-abs_delta, months))
+
+    events = events_df.iloc[order].reset_index(drop=True)
+    event_offsets = _group_offsets(months[order])
+
+    top_movers_by_month = {
+        month: events.iloc[start:min(end, start + top_k)]
+        for month, (start, end) in event_offsets.items()
+    }
+
+    # Order customer months so each customer is a contiguous block
+    customer_ids = customer_month_mrr_df["customer_id"].astype(str).to_numpy()
+    month_labels = customer_month_mrr_df["month"].astype(str).to_numpy()
+    order = np.lexsort((month_labels, customer_ids))
+
+    history = customer_month_mrr_df.iloc[order].reset_index(drop=True)
+    customer_offsets = _group_offsets(customer_ids[order])
+
+    return DrillDownIndex(
+        top_k=top_k,
+        events=events,
+        event_offsets=event_offsets,
+        top_movers_by_month=top_movers_by_month,
+        history=history,
+        customer_offsets=customer_offsets,
+    )
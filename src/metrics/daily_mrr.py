@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.ingestion.build_customer_month_mrr import get_global_last_date
+from src.tracing import traced
+
+# Largest (customers x days) grid built for on-demand per-customer values
+MAX_CUSTOMER_DAY_CELLS = 50_000_000
+
+# Days since 1970-01-01 for a datetime column
+def _day_ordinals(dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(dates).to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+# Months since 1970-01 for day ordinals
+def _months_of_days(days: np.ndarray) -> np.ndarray:
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+# "YYYY-MM" labels for month ordinals
+def _month_labels(months: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(np.asarray(months, dtype=np.int64).astype("datetime64[M]"), unit="M")
+
+# Per-position totals of half-open [start, end) intervals on a 0-based axis of length n
+def _sweep(starts: np.ndarray, ends: np.ndarray, weights: np.ndarray | None, n: int) -> np.ndarray:
+    delta = np.bincount(starts, weights=weights, minlength=n + 1) - np.bincount(ends, weights=weights, minlength=n + 1)
+    return np.cumsum(delta[:n])
+
+# Union of each group's half-open intervals (touching intervals are merged)
+def _merge_intervals(codes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if len(codes) == 0:
+        return codes, starts, ends
+
+    order = np.lexsort((starts, codes))
+    codes, starts, ends = codes[order], starts[order], ends[order]
+
+    # Running max of the end within each group: offset groups so one accumulate suffices
+    span = int(ends.max() - starts.min()) + 1
+    base = codes.astype(np.int64) * span
+    reach = np.maximum.accumulate(base + (ends - starts.min())) - base + starts.min()
+
+    new_block = np.ones(len(codes), dtype=bool)
+    new_block[1:] = (codes[1:] != codes[:-1]) | (starts[1:] > reach[:-1])
+    first = np.flatnonzero(new_block)
+    return codes[first], starts[first], np.maximum.reduceat(ends, first)
+
+# Subscriptions as [start, end) day intervals; open ones run through the dataset's last date
+@dataclass
+class SubscriptionIntervals:
+    customer_ids: np.ndarray        # distinct customer ids, sorted
+    codes: np.ndarray               # customer index per interval
+    start: np.ndarray               # first active day (day ordinal)
+    end: np.ndarray                 # first inactive day (exclusive)
+    mrr: np.ndarray
+    first_day: int                  # day axis, inclusive
+    last_day: int
+
+    # Same rules as build_customer_month_mrr: active until the day before end_date,
+    # intervals that end on or before their start are skipped
+    @classmethod
+    @traced(category="metrics")
+    def from_subscriptions(
+        cls,
+        subscriptions_df: pd.DataFrame,
+        global_last_date: pd.Timestamp | None = None,
+    ) -> "SubscriptionIntervals":
+        start_dates = pd.to_datetime(subscriptions_df["start_date"])
+        end_dates = pd.to_datetime(subscriptions_df["end_date"])
+        if global_last_date is None:
+            global_last_date = get_global_last_date(start_dates.max(), end_dates.max())
+        last_day = int(np.datetime64(pd.Timestamp(global_last_date), "D").astype(np.int64))
+
+        has_start = start_dates.notna().to_numpy()
+        is_open = end_dates.isna().to_numpy()
+        start = np.where(has_start, _day_ordinals(start_dates.fillna(pd.Timestamp(0))), 0)
+        end = np.where(is_open, last_day + 1, _day_ordinals(end_dates.fillna(pd.Timestamp(0))))
+
+        keep = has_start & (end > start)
+        customer_ids, codes = np.unique(subscriptions_df["account_id"].to_numpy(dtype=object)[keep], return_inverse=True)
+        start, end = start[keep], end[keep]
+
+        return cls(
+            customer_ids=customer_ids,
+            codes=codes.astype(np.int64),
+            start=start,
+            end=end,
+            mrr=subscriptions_df["mrr_amount"].to_numpy(dtype=float)[keep],
+            first_day=int(start.min()) if len(start) else last_day,
+            last_day=last_day,
+        )
+
+    @property
+    def n_days(self) -> int:
+        return self.last_day - self.first_day + 1
+
+    def days(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(np.arange(self.first_day, self.last_day + 1).astype("datetime64[D]"))
+
+# Company MRR and distinct active customers for every day
+@dataclass
+class DailyMRR:
+    days: pd.DatetimeIndex
+    mrr: np.ndarray
+    active_customers: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"date": self.days, "mrr": self.mrr, "active_customers": self.active_customers})
+
+# Difference-array sweep: O(subscriptions + days), no per-day expansion
+@traced(category="metrics")
+def compute_daily_mrr(intervals: SubscriptionIntervals) -> DailyMRR:
+    n = intervals.n_days
+    start = intervals.start - intervals.first_day
+    end = intervals.end - intervals.first_day
+    mrr = _sweep(start, end, intervals.mrr, n)
+
+    # A customer is active on days covered by at least one paying subscription
+    paying = intervals.mrr > 0
+    _, merged_start, merged_end = _merge_intervals(intervals.codes[paying], start[paying], end[paying])
+    active = _sweep(merged_start, merged_end, None, n).round().astype(np.int64)
+
+    return DailyMRR(days=intervals.days(), mrr=mrr, active_customers=active)
+
+# Daily MRR for a few customers, computed on demand (long format, one row per customer and day)
+@traced(category="metrics")
+def customer_daily_mrr(
+    intervals: SubscriptionIntervals,
+    customer_ids: list[str],
+    start_date: pd.Timestamp | None = None,
+    end_date: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    first = intervals.first_day if start_date is None else int(np.datetime64(pd.Timestamp(start_date), "D").astype(np.int64))
+    last = intervals.last_day if end_date is None else int(np.datetime64(pd.Timestamp(end_date), "D").astype(np.int64))
+    n = max(last - first + 1, 0)
+
+    # Requested customers that have subscriptions, in request order
+    wanted = pd.Index(intervals.customer_ids).get_indexer(pd.unique(pd.Series(customer_ids, dtype=object)))
+    wanted = wanted[wanted >= 0]
+    k = len(wanted)
+    local = np.full(len(intervals.customer_ids), -1, dtype=np.int64)
+    local[wanted] = np.arange(k)
+    if k * n > MAX_CUSTOMER_DAY_CELLS:
+        raise ValueError(f"{k} customers x {n} days is too large; narrow the customers or date range")
+
+    rows = local[intervals.codes]
+    sel = (rows >= 0) & (intervals.end > first) & (intervals.start <= last)
+    start = np.clip(intervals.start[sel], first, last + 1) - first
+    end = np.clip(intervals.end[sel], first, last + 1) - first
+
+    # One sweep over a (customer, day) grid flattened with a stride of n + 1
+    stride = n + 1
+    delta = (
+        np.bincount(rows[sel] * stride + start, weights=intervals.mrr[sel], minlength=k * stride)
+        - np.bincount(rows[sel] * stride + end, weights=intervals.mrr[sel], minlength=k * stride)
+    )
+    grid = np.cumsum(delta.reshape(k, stride), axis=1)[:, :n]
+
+    days = pd.DatetimeIndex(np.arange(first, last + 1).astype("datetime64[D]"))
+    return pd.DataFrame({
+        "customer_id": np.repeat(intervals.customer_ids[wanted], n),
+        "date": np.tile(days, k),
+        "mrr": grid.ravel(),
+    })
+
+# Monthly series from the daily one: value on the month's last covered day, or the daily average
+@traced(category="metrics")
+def monthly_from_daily(daily: DailyMRR, how: str = "end") -> pd.DataFrame:
+    if how not in ("end", "mean"):
+        raise ValueError(f"Unknown monthly aggregation: {how}")
+
+    months = _months_of_days(daily.days.to_numpy(dtype="datetime64[D]").astype(np.int64))
+    first = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+
+    if how == "end":
+        last = np.r_[first[1:], len(months)] - 1
+        mrr, active = daily.mrr[last], daily.active_customers[last].astype(float)
+    else:
+        counts = np.diff(np.r_[first, len(months)])
+        mrr = np.add.reduceat(daily.mrr, first) / counts
+        active = np.add.reduceat(daily.active_customers, first) / counts
+
+    return pd.DataFrame({"month": _month_labels(months[first]), "mrr_total": mrr, "active_customers": active})
+
+# Month span of each interval: months containing its first and last active day
+def _month_spans(intervals: SubscriptionIntervals) -> tuple[np.ndarray, np.ndarray]:
+    return _months_of_days(intervals.start), _months_of_days(intervals.end - 1)
+
+# Company totals with the monthly builder's rule (full MRR in every month a subscription touches)
+@traced(category="metrics")
+def monthly_touch_totals(intervals: SubscriptionIntervals) -> pd.DataFrame:
+    start_month, last_month = _month_spans(intervals)
+    if len(start_month) == 0:
+        return pd.DataFrame({"month": [], "mrr_total": [], "active_customers": []})
+
+    origin = int(start_month.min())
+    n = int(last_month.max()) - origin + 1
+    mrr = _sweep(start_month - origin, last_month - origin + 1, intervals.mrr, n)
+
+    # Distinct customers with positive MRR in the month (touching subscriptions merged per customer).
+    # Assumes non-negative amounts, as the monthly builder's output does.
+    paying = intervals.mrr > 0
+    _, merged_start, merged_end = _merge_intervals(
+        intervals.codes[paying], start_month[paying] - origin, last_month[paying] - origin + 1
+    )
+    active = _sweep(merged_start, merged_end, None, n).round().astype(np.int64)
+
+    # Only months the builder would emit (some subscription touches them)
+    touched = _sweep(start_month - origin, last_month - origin + 1, None, n) > 0
+    months = np.arange(origin, origin + n)
+    return pd.DataFrame({
+        "month": _month_labels(months[touched]),
+        "mrr_total": mrr[touched],
+        "active_customers": active[touched],
+    })
+
+# customer_month_mrr rows derived from the intervals (same output as build_customer_month_mrr)
+@traced(category="metrics")
+def customer_month_mrr_from_intervals(intervals: SubscriptionIntervals) -> pd.DataFrame:
+    start_month, last_month = _month_spans(intervals)
+    counts = last_month - start_month + 1
+
+    row = np.repeat(np.arange(len(counts)), counts)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts)
+    month = start_month[row] + offset
+
+    df = pd.DataFrame({
+        "customer_id": intervals.customer_ids[intervals.codes[row]],
+        "month": _month_labels(month),
+        "mrr": intervals.mrr[row],
+    })
+    return df.groupby(["customer_id", "month"], as_index=False)["mrr"].sum()
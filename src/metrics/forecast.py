@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import PROJECT_ROOT, Dataset
+from src.metrics.core import load_customer_month_mrr, load_customers, load_revenue_events
+from src.tracing import traced
+
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".cache" / "forecast"
+
+# Segment groupings from customers.csv; () is the whole company
+DEFAULT_DIMENSIONS: list[tuple[str, ...]] = [
+    (),
+    ("industry",),
+    ("country",),
+    ("initial_plan",),
+]
+
+# Forecastable metrics and their upper bound (forecasts are clipped to [0, bound])
+FORECAST_METRICS: dict[str, float | None] = {
+    "mrr_total": None,
+    "revenue_churn_rate": 1.0,
+}
+
+# Smoothing grid searched for every series at once
+DEFAULT_ALPHAS = np.linspace(0.05, 0.95, 10)
+DEFAULT_BETAS = np.linspace(0.0, 0.9, 10)
+
+# Monthly series for many segments on one calendar month axis
+@dataclass
+class SegmentSeries:
+    keys: list[tuple[str, str]]     # (dimension, segment value), ("all", "all") for company
+    months: list[str]               # contiguous calendar months "YYYY-MM"
+    mrr: np.ndarray                 # segments x months
+    churn_mrr: np.ndarray           # segments x months (<= 0)
+
+    # |Churn| / MRR(prev month), 0 where there was no MRR
+    def churn_rate(self) -> np.ndarray:
+        prev = np.zeros_like(self.mrr)
+        prev[:, 1:] = self.mrr[:, :-1]
+        rate = np.zeros_like(self.mrr)
+        np.divide(np.abs(self.churn_mrr), prev, out=rate, where=prev > 0)
+        return rate
+
+# Fitted Holt linear-trend parameters and final state, one entry per series
+@dataclass
+class HoltFit:
+    alpha: np.ndarray
+    beta: np.ndarray
+    level: np.ndarray
+    trend: np.ndarray
+    sigma: np.ndarray       # std of one-step-ahead errors
+
+# Segment label per customer: dimension values joined with "|", "all" for the company
+def _segment_labels(customers_df: pd.DataFrame, dims: tuple[str, ...]) -> pd.Series:
+    if not dims:
+        return pd.Series("all", index=customers_df.index)
+    labels = customers_df[dims[0]].astype(str)
+    for dim in dims[1:]:
+        labels = labels + "|" + customers_df[dim].astype(str)
+    return labels
+
+# Aggregate customer-level MRR and churn into segment x month matrices
+@traced(category="forecast")
+def build_segment_series(
+    customer_month_mrr_df: pd.DataFrame,
+    events_df: pd.DataFrame,
+    customers_df: pd.DataFrame,
+    dimensions: list[tuple[str, ...]] = DEFAULT_DIMENSIONS,
+) -> SegmentSeries:
+    # Contiguous calendar axis so "previous column" means previous month
+    periods = pd.PeriodIndex(customer_month_mrr_df["month"].drop_duplicates(), freq="M")
+    month_axis = pd.period_range(periods.min(), periods.max(), freq="M").strftime("%Y-%m")
+    month_index = pd.Index(month_axis)
+    n_months = len(month_axis)
+
+    mrr_month = month_index.get_indexer(customer_month_mrr_df["month"])
+    mrr_values = customer_month_mrr_df["mrr"].to_numpy(dtype=float)
+
+    churn = events_df[events_df["event_type"] == "churn"]
+    churn_month = month_index.get_indexer(churn["event_month"])
+    churn_values = churn["mrr_delta"].to_numpy(dtype=float)
+
+    customer_index = pd.Index(customers_df["customer_id"])
+    mrr_customer = customer_index.get_indexer(customer_month_mrr_df["customer_id"])
+    churn_customer = customer_index.get_indexer(churn["customer_id"])
+
+    keys: list[tuple[str, str]] = []
+    mrr_blocks, churn_blocks = [], []
+
+    for dims in dimensions:
+        # Segment code per customer, then one bincount over (segment, month)
+        seg_codes, seg_values = pd.factorize(_segment_labels(customers_df, dims), sort=True)
+        n_segments = len(seg_values)
+        dim_name = "|".join(dims) if dims else "all"
+
+        def aggregate(customer_pos: np.ndarray, month_pos: np.ndarray, values: np.ndarray) -> np.ndarray:
+            ok = (customer_pos >= 0) & (month_pos >= 0)
+            flat = seg_codes[customer_pos[ok]] * n_months + month_pos[ok]
+            return np.bincount(flat, weights=values[ok], minlength=n_segments * n_months).reshape(n_segments, n_months)
+
+        mrr_blocks.append(aggregate(mrr_customer, mrr_month, mrr_values))
+        churn_blocks.append(aggregate(churn_customer, churn_month, churn_values))
+        keys += [(dim_name, str(v)) for v in seg_values]
+
+    return SegmentSeries(
+        keys=keys,
+        months=list(month_axis),
+        mrr=np.vstack(mrr_blocks),
+        churn_mrr=np.vstack(churn_blocks),
+    )
+
+# Fit Holt's linear trend to every row of y over the whole (alpha, beta) grid at once
+@traced(category="forecast")
+def fit_holt(
+    y: np.ndarray,
+    alphas: np.ndarray = DEFAULT_ALPHAS,
+    betas: np.ndarray = DEFAULT_BETAS,
+) -> HoltFit:
+    """
+    State is (series x grid); the only Python loop is over time steps, so the
+    cost is O(months) vectorized operations regardless of segment count. The
+    grid point with the lowest one-step-ahead SSE is kept per series.
+    """
+    y = np.asarray(y, dtype=float)
+    n_series, n_months = y.shape
+
+    grid_alpha, grid_beta = np.meshgrid(alphas, betas, indexing="ij")
+    a = grid_alpha.ravel()[None, :]
+    ab = (grid_alpha * grid_beta).ravel()[None, :]
+    n_grid = a.shape[1]
+
+    level = np.repeat(y[:, :1], n_grid, axis=1)
+    trend = np.repeat(y[:, 1:2] - y[:, :1], n_grid, axis=1) if n_months > 1 else np.zeros((n_series, n_grid))
+    sse = np.zeros((n_series, n_grid))
+
+    for t in range(1, n_months):
+        err = y[:, t:t + 1] - (level + trend)
+        sse += err * err
+        level = level + trend + a * err
+        trend = trend + ab * err
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(n_series)
+
+    return HoltFit(
+        alpha=grid_alpha.ravel()[best],
+        beta=grid_beta.ravel()[best],
+        level=level[rows, best],
+        trend=trend[rows, best],
+        sigma=np.sqrt(sse[rows, best] / max(n_months - 1, 1)),
+    )
+
+# Point forecast and confidence band for horizons 1..horizon
+def forecast_holt(fit: HoltFit, horizon: int, z: float = 1.96) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    h = np.arange(1, horizon + 1)[None, :]
+    mean = fit.level[:, None] + h * fit.trend[:, None]
+
+    # Var(h) = sigma^2 * (1 + sum_{j<h} alpha^2 (1 + j*beta)^2)
+    j = np.arange(0, horizon)[None, :]
+    c2 = (fit.alpha[:, None] * (1 + j * fit.beta[:, None])) ** 2
+    c2[:, 0] = 0.0
+    std = fit.sigma[:, None] * np.sqrt(1 + np.cumsum(c2, axis=1))
+
+    return mean, mean - z * std, mean + z * std
+
+# Fitted parameters cached on disk, keyed on the series contents and grid
+class ForecastCache:
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR) -> None:
+        self.directory = Path(directory)
+
+    @staticmethod
+    def key(y: np.ndarray, alphas: np.ndarray, betas: np.ndarray) -> str:
+        digest = hashlib.sha256()
+        for arr in (np.ascontiguousarray(y, dtype=float), np.asarray(alphas, dtype=float), np.asarray(betas, dtype=float)):
+            digest.update(str(arr.shape).encode("utf-8"))
+            digest.update(arr.tobytes())
+        return digest.hexdigest()[:32]
+
+    def load(self, key: str) -> HoltFit | None:
+        path = self.directory / f"{key}.npz"
+        try:
+            with np.load(path) as data:
+                return HoltFit(**{name: data[name] for name in HoltFit.__dataclass_fields__})
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+    def save(self, key: str, fit: HoltFit) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f"{key}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **{name: getattr(fit, name) for name in HoltFit.__dataclass_fields__})
+        tmp_path.replace(self.directory / f"{key}.npz")
+
+# Fit (or load cached parameters for) every series in y
+def fit_holt_cached(
+    y: np.ndarray,
+    cache: ForecastCache | None = None,
+    alphas: np.ndarray = DEFAULT_ALPHAS,
+    betas: np.ndarray = DEFAULT_BETAS,
+) -> HoltFit:
+    if cache is None:
+        return fit_holt(y, alphas, betas)
+
+    key = cache.key(y, alphas, betas)
+    fit = cache.load(key)
+    if fit is None:
+        fit = fit_holt(y, alphas, betas)
+        cache.save(key, fit)
+    return fit
+
+# Next `horizon` month labels after the last month
+def _future_months(last_month: str, horizon: int) -> list[str]:
+    start = pd.Period(last_month, freq="M") + 1
+    return list(pd.period_range(start, periods=horizon, freq="M").strftime("%Y-%m"))
+
+# Long table of forecasts for every segment: MRR and revenue churn rate
+@traced(category="forecast")
+def forecast_segments(
+    series: SegmentSeries,
+    horizon: int = 12,
+    z: float = 1.96,
+    cache: ForecastCache | None = None,
+) -> pd.DataFrame:
+    future = _future_months(series.months[-1], horizon)
+    frames = []
+
+    values = {"mrr_total": series.mrr, "revenue_churn_rate": series.churn_rate()}
+
+    for metric, upper_bound in FORECAST_METRICS.items():
+        y = values[metric]
+        fit = fit_holt_cached(y, cache)
+        mean, lower, upper = forecast_holt(fit, horizon, z)
+
+        mean, lower, upper = (np.clip(arr, 0.0, upper_bound) for arr in (mean, lower, upper))
+
+        n_series = len(series.keys)
+        frames.append(pd.DataFrame({
+            "dimension": np.repeat([k[0] for k in series.keys], horizon),
+            "segment": np.repeat([k[1] for k in series.keys], horizon),
+            "metric": metric,
+            "month": np.tile(future, n_series),
+            "forecast": mean.ravel(),
+            "lower": lower.ravel(),
+            "upper": upper.ravel(),
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+# Load a dataset and forecast every default segment
+def forecast_dataset(
+    dataset: Dataset | None = None,
+    horizon: int = 12,
+    dimensions: list[tuple[str, ...]] = DEFAULT_DIMENSIONS,
+    cache: ForecastCache | None = None,
+) -> tuple[SegmentSeries, pd.DataFrame]:
+    series = build_segment_series(
+        load_customer_month_mrr(dataset),
+        load_revenue_events(dataset),
+        load_customers(dataset),
+        dimensions,
+    )
+    return series, forecast_segments(series, horizon, cache=cache)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+# Format currency values
+def format_currency(value: float) -> str:
+    abs_val = abs(value)
+    if abs_val >= 1_000_000_000:
+        return f"${value/1_000_000_000:.2f}B"
+    if abs_val >= 1_000_000:
+        return f"${value/1_000_000:.2f}M"
+    if abs_val >= 1_000:
+        return f"${value/1_000:.2f}K"
+    return f"${value:,.0f}"
+
+# Format metric value
+def format_metric_value(metric_col: str, value: float) -> str:
+    if metric_col == "revenue_churn_rate":
+        return format_percent(float(value))
+    return format_currency(float(value))
+
+# Value is in decimal form (e.g., 0.0123 -> 1.23%)
+def format_percent(value: float) -> str:
+    return f"{value*100:.2f}%"
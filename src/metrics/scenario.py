@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.metrics.core import (
+    COMPONENT_COLUMNS,
+    churn_rate,
+    codes_on_axis,
+    component_sums,
+    month_ordinals,
+    prev_month_values,
+)
+from src.tracing import traced
+
+# Event types whose customer counts move active_customers (+1 / -1 per event).
+# A scenario scales these counts like the MRR ("20% lower churn" = 20% fewer churned
+# customers), and the running change is rounded to whole customers.
+ACTIVE_COUNT_SIGN = {"new": 1.0, "churn": -1.0}
+
+# One parametric change to a revenue component over a month range
+@dataclass(frozen=True)
+class Adjustment:
+    event_type: str                 # key of COMPONENT_COLUMNS
+    start_month: str                # "YYYY-MM", inclusive
+    end_month: str | None = None    # inclusive; None = through the last month
+    factor: float = 1.0             # e.g. 0.8 = 20% lower
+    monthly_growth: float = 0.0     # compounding from the first month, e.g. 0.05 = +5%/month
+
+    def __post_init__(self) -> None:
+        if self.event_type not in COMPONENT_COLUMNS:
+            raise ValueError(f"Unknown event type: {self.event_type}")
+
+# Base monthly arrays plus per-type event counts; scenarios are applied on top
+@dataclass
+class ScenarioEngine:
+    months: np.ndarray
+    month_dates: pd.Series
+    ordinals: np.ndarray
+    base: dict[str, np.ndarray]             # metrics table columns
+    counts: dict[str, np.ndarray]           # events per month for each event type
+
+    # Reuse an already computed metrics table; only event counts are added
+    @classmethod
+    def from_metrics(cls, metrics_df: pd.DataFrame, events_df: pd.DataFrame) -> "ScenarioEngine":
+        months = metrics_df["month"].astype(str).to_numpy()
+        axis = pd.Index(months)
+
+        month_codes = codes_on_axis(events_df["event_month"], axis)
+        type_codes = codes_on_axis(events_df["event_type"], pd.Index(list(COMPONENT_COLUMNS)))
+        counts = component_sums(month_codes, type_codes, np.ones(len(events_df)), len(months))
+
+        columns = ["mrr_total", *COMPONENT_COLUMNS.values(), "net_new_mrr", "active_customers", "revenue_churn_rate"]
+        return cls(
+            months=months,
+            month_dates=pd.to_datetime(pd.Series(months) + "-01"),
+            ordinals=month_ordinals(axis),
+            base={col: metrics_df[col].to_numpy(dtype=float) for col in columns},
+            counts={event_type: counts[:, i] for i, event_type in enumerate(COMPONENT_COLUMNS)},
+        )
+
+    # Per-month multiplier of one adjustment (1.0 outside its range)
+    def _multiplier(self, adjustment: Adjustment) -> np.ndarray:
+        start = month_ordinals(pd.Index([adjustment.start_month]))[0]
+        end = month_ordinals(pd.Index([adjustment.end_month]))[0] if adjustment.end_month else self.ordinals[-1]
+
+        in_range = (self.ordinals >= start) & (self.ordinals <= end)
+        steps = self.ordinals - start + 1
+        return np.where(in_range, adjustment.factor * (1.0 + adjustment.monthly_growth) ** steps, 1.0)
+
+    # Metrics table under the adjustments; months before the first affected one are reused as-is
+    @traced(category="scenario")
+    def run(self, adjustments: list[Adjustment]) -> pd.DataFrame:
+        """
+        Component deltas are scaled per month and the change in net new MRR is
+        carried forward as a running sum, so MRR, active customers and the
+        churn rate are only recomputed from the first affected month.
+        """
+        result = {col: values for col, values in self.base.items()}
+
+        multipliers: dict[str, np.ndarray] = {}
+        for adjustment in adjustments:
+            m = self._multiplier(adjustment)
+            multipliers[adjustment.event_type] = multipliers.get(adjustment.event_type, 1.0) * m
+
+        changed = np.zeros(len(self.months), dtype=bool)
+        for m in multipliers.values():
+            changed |= m != 1.0
+        if not changed.any():
+            return self._frame(result)
+
+        first = int(np.argmax(changed))
+        tail = slice(first, None)
+
+        delta_mrr = np.zeros(len(self.months) - first)
+        delta_active = np.zeros(len(self.months) - first)
+
+        for event_type, m in multipliers.items():
+            col = COMPONENT_COLUMNS[event_type]
+            base = self.base[col][tail]
+            adjusted = base * m[tail]
+            result[col] = np.concatenate((self.base[col][:first], adjusted))
+            delta_mrr += adjusted - base
+
+            sign = ACTIVE_COUNT_SIGN.get(event_type)
+            if sign is not None:
+                delta_active += sign * self.counts[event_type][tail] * (m[tail] - 1.0)
+
+        result["net_new_mrr"] = np.concatenate((self.base["net_new_mrr"][:first], self.base["net_new_mrr"][tail] + delta_mrr))
+        result["mrr_total"] = np.concatenate((self.base["mrr_total"][:first], self.base["mrr_total"][tail] + np.cumsum(delta_mrr)))
+        result["active_customers"] = np.concatenate(
+            (self.base["active_customers"][:first], self.base["active_customers"][tail] + np.rint(np.cumsum(delta_active)))
+        )
+
+        # Churn rate against the (adjusted) previous calendar month's MRR
+        mrr_prev = prev_month_values(self.ordinals[tail], self.ordinals, result["mrr_total"])
+        result["revenue_churn_rate"] = np.concatenate(
+            (self.base["revenue_churn_rate"][:first], churn_rate(result["churn_mrr"][tail], mrr_prev))
+        )
+
+        return self._frame(result)
+
+    def _frame(self, series: dict[str, np.ndarray]) -> pd.DataFrame:
+        return pd.DataFrame({"month": self.months, **series, "month_date": self.month_dates})
+
+    # Baseline and scenario side by side for one metric
+    def compare(self, scenario_df: pd.DataFrame, metric_col: str) -> pd.DataFrame:
+        baseline = self.base[metric_col]
+        scenario = scenario_df[metric_col].to_numpy(dtype=float)
+        return pd.DataFrame({
+            "month": self.months,
+            "baseline": baseline,
+            "scenario": scenario,
+            "difference": scenario - baseline,
+        })
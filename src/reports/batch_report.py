@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import argparse
+import html
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.config import PROJECT_ROOT, get_dataset, load_env
+from src.data_version import read_data_version
+from src.llm.cache import DEFAULT_CACHE_DIR, ResponseCache, request_key
+from src.llm.client import LLMClient, LLMRequest
+from src.llm.factory import get_llm_client, get_llm_provider, get_request_options
+from src.llm.formatting import cleanup_llm_output
+from src.llm.prompts import build_metrics_prompt, build_executive_summary_prompt
+from src.metrics.core import METRIC_OPTIONS, WINDOW_OPTIONS, compute_metrics, load_metric_anomalies
+from src.metrics.formatting import format_metric_value
+
+# One prompt/response unit of the report
+@dataclass(frozen=True)
+class ReportTask:
+    window_label: str
+    n_months: int | None
+    metric_label: str | None = None     # None = executive summary
+    metric_col: str | None = None
+
+    @property
+    def name(self) -> str:
+        what = self.metric_label or "Executive Summary"
+        return f"{self.window_label} / {what}"
+
+# Outcome of a single task
+@dataclass
+class ReportItem:
+    task: ReportTask
+    prompt: str
+    response: str | None = None
+    cached: bool = False
+    seconds: float = 0.0
+    error: str | None = None
+
+# Wall-clock timing per pipeline step
+@dataclass
+class StepTimer:
+    steps: dict[str, float] = field(default_factory=dict)
+
+    def run(self, name: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        print(f"==> {name}...", flush=True)
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.steps[name] = elapsed
+        print(f"    {name} done in {elapsed:.2f}s", flush=True)
+        return result
+
+# Trailing window of the metrics table
+def window_frame(metrics_df: pd.DataFrame, n_months: int | None) -> pd.DataFrame:
+    if n_months is None:
+        return metrics_df
+    return metrics_df.tail(n_months)
+
+# Every (window, metric) pair plus one executive summary per window
+def build_tasks(
+    metric_options: dict[str, str],
+    window_options: dict[str, int | None],
+) -> list[ReportTask]:
+    tasks = []
+    for window_label, n_months in window_options.items():
+        tasks.append(ReportTask(window_label, n_months))
+        for metric_label, metric_col in metric_options.items():
+            tasks.append(ReportTask(window_label, n_months, metric_label, metric_col))
+    return tasks
+
+# Build the prompt for one task
+def build_prompt(
+    task: ReportTask,
+    metrics_df: pd.DataFrame,
+    user_question: str | None,
+    anomalies_df: pd.DataFrame | None = None,
+    data_version: str | None = None,
+) -> str:
+    window_df = window_frame(metrics_df, task.n_months)
+
+    if task.metric_col is None:
+        return build_executive_summary_prompt(
+            window_df=window_df,
+            user_question=user_question,
+            anomalies=anomalies_df,
+            data_version=data_version,
+        )
+
+    return build_metrics_prompt(
+        window_df=window_df,
+        metric_label=task.metric_label,
+        metric_col=task.metric_col,
+        user_question=user_question,
+        anomalies=anomalies_df,
+        data_version=data_version,
+    )
+
+# Build all prompts in parallel
+def build_prompts(
+    tasks: list[ReportTask],
+    metrics_df: pd.DataFrame,
+    user_question: str | None,
+    workers: int,
+    anomalies_df: pd.DataFrame | None = None,
+    data_version: str | None = None,
+) -> list[str]:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda t: build_prompt(t, metrics_df, user_question, anomalies_df, data_version), tasks))
+
+# Issue LLM calls with bounded parallelism, serving repeats from the cache
+def generate_responses(
+    items: list[ReportItem],
+    client: LLMClient,
+    provider: str,
+    cache: ResponseCache | None,
+    concurrency: int,
+) -> None:
+    options = get_request_options(provider)
+    total = len(items)
+    done = 0
+    lock = threading.Lock()
+
+    def run(item: ReportItem) -> ReportItem:
+        started = time.perf_counter()
+        request = LLMRequest(prompt=item.prompt, **options)
+        key = request_key(client, request)
+
+        try:
+            response = cache.get(key) if cache is not None else None
+            if response is not None:
+                item.cached = True
+            else:
+                response = client.generate(request)
+                if cache is not None:
+                    cache.put(key, response)
+            item.response = cleanup_llm_output(response, provider)
+        except Exception as e:
+            item.error = str(e)
+
+        item.seconds = time.perf_counter() - started
+        return item
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run, item) for item in items]
+        for future in as_completed(futures):
+            item = future.result()
+            with lock:
+                done += 1
+                status = "error" if item.error else ("cached" if item.cached else "ok")
+                print(f"[{done:>3}/{total}] {item.task.name}: {status} ({item.seconds:.2f}s)", flush=True)
+
+# Key facts for one metric in a window
+def _metric_facts(window_df: pd.DataFrame, metric_col: str) -> list[str]:
+    series = window_df[metric_col].astype(float)
+    current = float(series.iloc[-1])
+    prev = float(series.iloc[-2]) if len(series) >= 2 else current
+    best_month = str(window_df.loc[series.idxmax(), "month"])
+    worst_month = str(window_df.loc[series.idxmin(), "month"])
+
+    return [
+        f"- Current: {format_metric_value(metric_col, current)}",
+        f"- MoM change: {format_metric_value(metric_col, current - prev)}",
+        f"- Best month: {best_month}",
+        f"- Worst month: {worst_month}",
+    ]
+
+# Assemble the report as Markdown
+def render_markdown(items: list[ReportItem], metrics_df: pd.DataFrame, provider: str | None) -> str:
+    lines = [
+        "# SaaS Revenue Metrics Report",
+        "",
+        f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        + (f" with `{provider}`" if provider else " (no LLM)"),
+        "",
+    ]
+
+    current_window = None
+    for item in items:
+        task = item.task
+        window_df = window_frame(metrics_df, task.n_months)
+
+        if task.window_label != current_window:
+            current_window = task.window_label
+            start, end = window_df["month"].iloc[0], window_df["month"].iloc[-1]
+            lines += [f"## {task.window_label} ({start} to {end})", ""]
+
+        if task.metric_col is None:
+            lines += ["### Executive Summary", ""]
+        else:
+            lines += [f"### {task.metric_label}", ""]
+            lines += _metric_facts(window_df, task.metric_col)
+            lines.append("")
+
+        if item.error:
+            lines += [f"_LLM error: {item.error}_", ""]
+        elif item.response is not None:
+            lines += [item.response or "No response returned by the model.", ""]
+
+    return "\n".join(lines).rstrip() + "\n"
+
+# Minimal Markdown -> HTML (headings, bullets, paragraphs; everything else preformatted)
+def markdown_to_html(markdown: str) -> str:
+    body = []
+    in_list = False
+
+    for line in markdown.splitlines():
+        stripped = line.strip()
+
+        if stripped.startswith(("- ", "* ")):
+            if not in_list:
+                body.append("<ul>")
+                in_list = True
+            body.append(f"<li>{html.escape(stripped[2:])}</li>")
+            continue
+
+        if in_list:
+            body.append("</ul>")
+            in_list = False
+
+        if not stripped:
+            continue
+        if stripped.startswith("#"):
+            level = min(len(stripped) - len(stripped.lstrip("#")), 6)
+            body.append(f"<h{level}>{html.escape(stripped[level:].strip())}</h{level}>")
+        elif stripped.startswith("|"):
+            body.append(f"<pre>{html.escape(line)}</pre>")
+        else:
+            body.append(f"<p>{html.escape(stripped)}</p>")
+
+    if in_list:
+        body.append("</ul>")
+
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+        "<title>SaaS Revenue Metrics Report</title></head>\n<body>\n"
+        + "\n".join(body)
+        + "\n</body></html>\n"
+    )
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate the metrics report for all metrics and windows.")
+    parser.add_argument("--dataset", default=None, help="Tenant dataset name (default: DATASET env var or default data)")
+    parser.add_argument("--output", type=Path, default=PROJECT_ROOT / "reports" / "metrics_report.md")
+    parser.add_argument("--format", choices=["md", "html"], default=None,
+                        help="Defaults to the output file extension")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max concurrent LLM calls")
+    parser.add_argument("--prompt-workers", type=int, default=4, help="Threads used to build prompts")
+    parser.add_argument("--question", default=None, help="Optional question added to every prompt")
+    parser.add_argument("--metrics", nargs="*", default=None, help="Metric columns to include (default: all)")
+    parser.add_argument("--windows", nargs="*", default=None, help="Window labels to include (default: all)")
+    parser.add_argument("--no-llm", action="store_true", help="Only compute facts, skip LLM calls")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses")
+    parser.add_argument("--cache-dir", type=Path, default=None)
+    return parser.parse_args(argv)
+
+# Compute metrics once, fan out prompts and LLM calls, write the report
+def main(argv: list[str] | None = None) -> None:
+    # Provider, request options and dataset settings may come from .env
+    load_env()
+    args = parse_args(argv)
+    timer = StepTimer()
+
+    metric_options = {
+        label: col for label, col in METRIC_OPTIONS.items()
+        if args.metrics is None or col in args.metrics
+    }
+    window_options = {
+        label: n for label, n in WINDOW_OPTIONS.items()
+        if args.windows is None or label in args.windows
+    }
+
+    dataset = get_dataset(args.dataset)
+    # Read once: prompt facts and table fragments are memoized per data version
+    data_version = read_data_version(dataset.processed_dir)
+    metrics_df = timer.run(f"compute metrics ({dataset.name})", compute_metrics, dataset)
+    anomalies_df = load_metric_anomalies(dataset)
+    tasks = build_tasks(metric_options, window_options)
+
+    prompts = timer.run(
+        f"build {len(tasks)} prompts",
+        build_prompts, tasks, metrics_df, args.question, args.prompt_workers, anomalies_df, data_version,
+    )
+    items = [ReportItem(task=task, prompt=prompt) for task, prompt in zip(tasks, prompts)]
+
+    provider = None
+    if not args.no_llm:
+        provider = get_llm_provider()
+        client = get_llm_client()
+        cache = None if args.no_cache else ResponseCache(args.cache_dir or DEFAULT_CACHE_DIR)
+        timer.run(
+            f"generate {len(items)} responses",
+            generate_responses, items, client, provider, cache, args.concurrency,
+        )
+
+    output_format = args.format or ("html" if args.output.suffix.lower() in (".html", ".htm") else "md")
+    report = timer.run("render report", render_markdown, items, metrics_df, provider)
+    if output_format == "html":
+        report = markdown_to_html(report)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(report, encoding="utf-8")
+
+    print(f"Saved report to {args.output}")
+    if provider is not None:
+        cached = sum(item.cached for item in items)
+        errors = sum(item.error is not None for item in items)
+        print(f"LLM responses: {len(items) - cached - errors} generated, {cached} cached, {errors} errors")
+    for name, seconds in timer.steps.items():
+        print(f"  {name:<28} {seconds:>8.2f}s")
+
+if __name__ == "__main__":
+    main()
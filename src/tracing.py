@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# TRACING_ENABLED=1 turns tracing on; TRACE_FILE=<path> also writes a Chrome trace at exit
+TRACE_ENV_VAR = "TRACING_ENABLED"
+TRACE_FILE_ENV_VAR = "TRACE_FILE"
+
+# Oldest spans are dropped beyond this, so long-running dashboards stay bounded
+MAX_SPANS = 100_000
+
+_enabled = False
+
+# One finished span (times in microseconds since the tracer's epoch)
+@dataclass(frozen=True)
+class Span:
+    name: str
+    category: str
+    start_us: float
+    duration_us: float
+    thread_id: int
+    args: dict = field(default_factory=dict)
+
+# Process-wide span buffer
+class Tracer:
+    def __init__(self, max_spans: int = MAX_SPANS) -> None:
+        self.epoch = time.perf_counter()
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+_tracer = Tracer()
+
+# Shared do-nothing context manager returned while tracing is disabled
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+_NOOP_SPAN = _NoopSpan()
+
+class _ActiveSpan:
+    __slots__ = ("name", "category", "args", "_start")
+
+    def __init__(self, name: str, category: str, args: dict) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self) -> "_ActiveSpan":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args = {**self.args, "error": exc_type.__name__}
+        _tracer.record(
+            Span(
+                name=self.name,
+                category=self.category,
+                start_us=(self._start - _tracer.epoch) * 1e6,
+                duration_us=(end - self._start) * 1e6,
+                thread_id=threading.get_ident(),
+                args=self.args,
+            )
+        )
+
+# Time a block: `with span("read_csv", "io", path=...):`
+def span(name: str, category: str = "app", **args):
+    if not _enabled:
+        return _NOOP_SPAN
+    return _ActiveSpan(name, category, args)
+
+# Time every call of a function (name defaults to module.qualname)
+def traced(name: str | None = None, category: str = "app"):
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _ActiveSpan(span_name, category, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+# (Re)read TRACING_ENABLED, e.g. after .env has been loaded
+def enable_from_env() -> bool:
+    if os.getenv(TRACE_ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on"):
+        enable()
+    return _enabled
+
+def get_spans() -> list[Span]:
+    return _tracer.spans()
+
+def clear() -> None:
+    _tracer.clear()
+
+# Spans as Chrome trace-event JSON (load in chrome://tracing or Perfetto)
+def chrome_trace(spans: list[Span] | None = None) -> dict:
+    spans = get_spans() if spans is None else spans
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": s.name,
+                "cat": s.category,
+                "ph": "X",
+                "ts": round(s.start_us, 3),
+                "dur": round(s.duration_us, 3),
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": {k: str(v) for k, v in s.args.items()},
+            }
+            for s in spans
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+def export_chrome_trace(path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(chrome_trace()), encoding="utf-8")
+    return path
+
+# Aggregate spans by name: calls, total/self/mean/max time (ms), slowest first
+def flat_profile(spans: list[Span] | None = None) -> list[dict]:
+    spans = get_spans() if spans is None else spans
+
+    # Self time = duration minus directly nested spans on the same thread
+    child_us = [0.0] * len(spans)
+    by_thread: dict[int, list[int]] = {}
+    for i, s in enumerate(spans):
+        by_thread.setdefault(s.thread_id, []).append(i)
+
+    for indices in by_thread.values():
+        indices.sort(key=lambda i: (spans[i].start_us, -spans[i].duration_us))
+        stack: list[int] = []
+        for i in indices:
+            start = spans[i].start_us
+            while stack and spans[stack[-1]].start_us + spans[stack[-1]].duration_us <= start:
+                stack.pop()
+            if stack:
+                child_us[stack[-1]] += spans[i].duration_us
+            stack.append(i)
+
+    rows: dict[str, dict] = {}
+    for i, s in enumerate(spans):
+        row = rows.setdefault(
+            s.name,
+            {"name": s.name, "category": s.category, "calls": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0},
+        )
+        ms = s.duration_us / 1000
+        row["calls"] += 1
+        row["total_ms"] += ms
+        row["self_ms"] += max(s.duration_us - child_us[i], 0.0) / 1000
+        row["max_ms"] = max(row["max_ms"], ms)
+
+    for row in rows.values():
+        row["mean_ms"] = row["total_ms"] / row["calls"]
+
+    return sorted(rows.values(), key=lambda r: -r["total_ms"])
+
+# Plain-text table of the flat profile
+def format_profile(rows: list[dict]) -> str:
+    lines = [f"{'span':<48}{'calls':>7}{'total ms':>11}{'self ms':>11}{'mean ms':>10}{'max ms':>10}"]
+    for r in rows:
+        lines.append(
+            f"{r['name']:<48}{r['calls']:>7}{r['total_ms']:>11.1f}{r['self_ms']:>11.1f}"
+            f"{r['mean_ms']:>10.2f}{r['max_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+def _export_at_exit() -> None:
+    path = os.getenv(TRACE_FILE_ENV_VAR, "").strip()
+    if _enabled and path and get_spans():
+        export_chrome_trace(Path(path))
+        print(f"Trace written to {path}")
+        print(format_profile(flat_profile()))
+
+enable_from_env()
+atexit.register(_export_at_exit)
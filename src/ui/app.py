@@ -1,119 +1,87 @@
 import streamlit as st
 import pandas as pd
+import atexit
 import sys
 import os
-
-from dotenv import load_dotenv
+import json
 
 # Get path to project root 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from src.llm.client import LLMRequest
-from src.llm.factory import get_llm_client, get_llm_provider
-from src.llm.prompts import build_metrics_prompt, build_executive_summary_prompt
-
-load_dotenv()
-
+from src import tracing
+from src.config import Dataset, get_dataset, list_datasets, load_env
+from src.data_version import read_data_version
+from src.metrics.cache import TenantMetricsCache
 from src.metrics.core import (
+    METRIC_OPTIONS,
+    WINDOW_OPTIONS,
+    COMPONENT_COLUMNS,
     load_customer_month_mrr,
     load_revenue_events,
-    get_mrr_by_month,
-    get_mrr_components_by_month,
-    get_net_new_mrr,
-    get_revenue_churn_rate,
-    get_active_customers,
+    load_metric_anomalies,
+    load_daily_mrr,
+    compute_metrics_from_frames,
+    build_drilldown_index,
+    DrillDownIndex,
 )
+from src.metrics.forecast import FORECAST_METRICS, ForecastCache, forecast_dataset
+from src.metrics.scenario import Adjustment, ScenarioEngine
+from src.metrics.formatting import format_currency, format_metric_value, format_percent
 
-# Compute all monthly metrics in one table
-def compute_metrics() -> pd.DataFrame:
-    customer_month_mrr_df = load_customer_month_mrr()
-    events_df = load_revenue_events()
-
-    mrr_by_month = get_mrr_by_month(customer_month_mrr_df)
-    components = get_mrr_components_by_month(events_df)
-    net_new = get_net_new_mrr(components)
-    active = get_active_customers(customer_month_mrr_df)
-    churn_rate = get_revenue_churn_rate(components, mrr_by_month)
-
-    metrics_df = (
-        mrr_by_month
-        .merge(components, on="month", how="left")
-        .merge(net_new, on="month", how="left")
-        .merge(active, on="month", how="left")
-        .merge(churn_rate, on="month", how="left")
-    )
+# Parse .env once per process (no-op on script reruns)
+load_env()
+tracing.enable_from_env()
 
-    # Convert month label to datetime for plotting
-    metrics_df["month_date"] = pd.to_datetime(metrics_df["month"] + "-01")
-    metrics_df = metrics_df.sort_values("month_date")
-
-    return metrics_df
-
-# Format currency values
-def format_currency(value: float) -> str:
-    abs_val = abs(value)
-    if abs_val >= 1_000_000_000:
-        return f"${value/1_000_000_000:.2f}B"
-    if abs_val >= 1_000_000:
-        return f"${value/1_000_000:.2f}M"
-    if abs_val >= 1_000:
-        return f"${value/1_000:.2f}K"
-    return f"${value:,.0f}"
-
-# Format metric value
-def format_metric_value(metric_col: str, value: float) -> str:
-    if metric_col == "revenue_churn_rate":
-        return format_percent(float(value))
-    return format_currency(float(value))
-
-# Value is in decimal form (e.g., 0.0123 -> 1.23%)
-def format_percent(value: float) -> str:
-    return f"{value*100:.2f}%"
-
-# Cleanup LLM output to remove common formatting issues
-def cleanup_llm_output(text: str, provider: str) -> str:
-    """
-    Fix common formatting issues from local models.
-    """
-    cleaned = text.strip()
-
-    if provider == "ollama":
-        # Remove triple backtick code fences if the model accidentally uses them
-        cleaned = cleaned.replace("```", "")
-
-        # Some models repeat "Top 3 takeaways" twice; keep the first occurrence
-        marker = "Top 3 takeaways"
-        first = cleaned.find(marker)
-        if first != -1:
-            second = cleaned.find(marker, first + 1)
-            if second != -1:
-                cleaned = cleaned[:second].strip()
-
-    return cleaned
-
-# Sanitize Markdown text to prevent Streamlit from treating underscores as italics
-def sanitize_markdown(text: str) -> str:
-    """
-    Escape underscores only outside inline code blocks marked by backticks.
-    This prevents accidental italics while keeping `mrr_total` clean.
-    """
-    result = []
-    in_code = False
-
-    for ch in text:
-        if ch == "`":
-            in_code = not in_code
-            result.append(ch)
-            continue
-
-        if (not in_code) and ch == "_":
-            result.append("\\_")
-        else:
-            result.append(ch)
+# Retrieved snippets added to the prompt for a user question
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_TOP_EXPLANATIONS = 2
+RETRIEVAL_MIN_RELATIVE_SCORE = 0.5
+
+# Indexed answers are written to disk in batches (and at exit), not after every answer
+EXPLANATION_SAVE_BATCH = 8
+
+# How long a dashboard click waits for the shared LLM gateway (queue + generation)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+
+# Memory budget for cached tenant tables (all sessions share one cache)
+TENANT_CACHE_MAX_BYTES = int(os.getenv("TENANT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Load one dataset and build its metrics table, drill-down index, anomaly flags and scenario engine
+@tracing.traced(category="metrics")
+def compute_tenant_tables(dataset: Dataset) -> tuple[pd.DataFrame, DrillDownIndex, pd.DataFrame, ScenarioEngine]:
+    customer_month_mrr_df = load_customer_month_mrr(dataset)
+    events_df = load_revenue_events(dataset)
+
+    metrics_df = compute_metrics_from_frames(customer_month_mrr_df, events_df)
+    drilldown = build_drilldown_index(events_df, customer_month_mrr_df)
+
+    anomalies_df = load_metric_anomalies(dataset)
+    scenario_engine = ScenarioEngine.from_metrics(metrics_df, events_df)
 
-    return "".join(result)
+    return metrics_df, drilldown, anomalies_df, scenario_engine
+
+# Forecast table for a dataset version (fitted parameters are also cached on disk)
+@st.cache_data(show_spinner="Fitting forecasts...")
+def compute_forecast(dataset_name: str, data_version: str, horizon: int) -> pd.DataFrame:
+    _, forecast_df = forecast_dataset(get_dataset(dataset_name), horizon, cache=ForecastCache())
+    return forecast_df
+
+# Daily company MRR and active customers for a dataset version
+@st.cache_data(show_spinner=False)
+def load_daily_table(dataset_name: str, data_version: str) -> pd.DataFrame:
+    return load_daily_mrr(get_dataset(dataset_name))
+
+# Per-dataset retrieval index shared by all sessions (loaded on the first LLM request)
+@st.cache_resource
+def get_retrieval_index(dataset_name: str):
+    from src.llm.retrieval import RetrievalIndex
+    from src.llm.snippets import index_dir
+
+    index = RetrievalIndex.load(index_dir(get_dataset(dataset_name)))
+    atexit.register(index.save_if_due)
+    return index
 
 # Run the Streamlit metrics explorer
 def main() -> None:
@@ -124,24 +92,40 @@ def main() -> None:
 
     st.title("SaaS Revenue Metrics Explorer")
 
-    # Cache metrics computation
-    @st.cache_data
-    def get_metrics_df() -> pd.DataFrame:
-        return compute_metrics()
-    
+    # Process-wide LRU of tenant tables, keyed on tenant + processed-data version:
+    # a new data drop rebuilds once, unchanged data never recomputes
+    @st.cache_resource
+    def get_tenant_cache() -> TenantMetricsCache:
+        return TenantMetricsCache(max_bytes=TENANT_CACHE_MAX_BYTES)
+
+    tenant_cache = get_tenant_cache()
+
+    # Select tenant (?tenant=<name> pins it, e.g. for per-client links)
+    datasets = list_datasets()
+    default_dataset = st.query_params.get("tenant") or get_dataset().name
+    if default_dataset not in datasets:
+        default_dataset = datasets[0]
+
+    if len(datasets) > 1:
+        dataset_name = st.sidebar.selectbox(
+            "Dataset",
+            datasets,
+            index=datasets.index(default_dataset),
+        )
+    else:
+        dataset_name = default_dataset
+
+    dataset = get_dataset(dataset_name)
+    data_version = read_data_version(dataset.processed_dir)
+
     with st.spinner("Loading metrics..."):
-        metrics_df = get_metrics_df()
-
-    metric_options = {
-        "Total MRR": "mrr_total",
-        "New MRR": "new_mrr",
-        "Expansion MRR": "expansion_mrr",
-        "Contraction MRR": "contraction_mrr",
-        "Churn MRR": "churn_mrr",
-        "Net New MRR": "net_new_mrr",
-        "Active Customers": "active_customers",
-        "Revenue Churn Rate": "revenue_churn_rate",
-    }
+        metrics_df, drilldown, anomalies_df, scenario_engine = tenant_cache.get(
+            dataset.name,
+            data_version,
+            lambda: compute_tenant_tables(dataset),
+        )
+
+    metric_options = METRIC_OPTIONS
 
     st.sidebar.header("Controls")
     selected_label = st.sidebar.selectbox(
@@ -153,16 +137,15 @@ def main() -> None:
     # Select time window
     window_choice = st.sidebar.selectbox(
         "Time window",
-        options=["Last 6 months", "Last 12 months", "Last 24 months", "All"],
+        options=list(WINDOW_OPTIONS.keys()),
         index=1,
     )
 
-    window_map = {
-        "Last 6 months": 6,
-        "Last 12 months": 12,
-        "Last 24 months": 24,
-        "All": None,
-    }
+    st.sidebar.caption(f"Data version: {data_version}")
+    with st.sidebar.expander("Metrics cache"):
+        st.json(tenant_cache.as_dict())
+
+    window_map = WINDOW_OPTIONS
     n_months = window_map[window_choice]
 
     plot_df = metrics_df.copy() 
@@ -204,6 +187,21 @@ def main() -> None:
 
     st.line_chart(chart_df)
 
+    # Precomputed anomaly flags for this metric in the window (built at ingestion)
+    window_anomalies = anomalies_df[anomalies_df["month"].astype(str).isin(plot_df["month"].astype(str))]
+    metric_anomalies = window_anomalies[window_anomalies["metric"] == selected_column]
+    company_flags = metric_anomalies[metric_anomalies["dimension"] == "all"]
+    if not company_flags.empty:
+        st.caption("Flagged months: " + ", ".join(
+            f"{row.month} ({row.direction})" for row in company_flags.itertuples(index=False)
+        ))
+
+    with st.expander(f"Anomaly flags ({len(metric_anomalies)})"):
+        if metric_anomalies.empty:
+            st.info("No anomalies flagged for this metric in the selected window.")
+        else:
+            st.dataframe(metric_anomalies, use_container_width=True, hide_index=True)
+
     st.markdown("### Monthly values")
     display_df = plot_df[["month", selected_column]].copy()
     display_df = display_df.rename(columns={selected_column: selected_label})
@@ -215,6 +213,122 @@ def main() -> None:
 
     st.dataframe(display_df, use_container_width=True)
 
+    # Day-level view: mid-month upgrades and churns that monthly rounding hides
+    with st.expander("Daily MRR"):
+        daily_df = load_daily_table(dataset.name, data_version)
+        if daily_df.empty:
+            st.info("No daily table yet. Run `python -m src.ingestion.build_daily_mrr`.")
+        else:
+            window_start = pd.Timestamp(plot_df["month_date"].min())
+            daily_window = daily_df[daily_df["date"] >= window_start].set_index("date")
+            st.line_chart(daily_window["mrr"], y_label="MRR")
+            st.line_chart(daily_window["active_customers"], y_label="Active customers")
+            st.caption("Subscriptions count from their start date until the day before their end date.")
+
+    # Drill down into the customers behind a month
+    with st.expander("Customer drill-down"):
+        window_months = [m for m in plot_df["month"].astype(str) if m in drilldown.event_offsets]
+
+        d1, d2 = st.columns(2)
+
+        with d1:
+            if window_months:
+                movers_month = st.selectbox(
+                    "Top movers in month",
+                    options=window_months[::-1],
+                )
+                movers_df = drilldown.top_movers(movers_month)
+                st.dataframe(
+                    movers_df[["customer_id", "event_type", "mrr_delta", "mrr_after_event"]],
+                    use_container_width=True,
+                    hide_index=True,
+                )
+            else:
+                st.info("No revenue events in the selected window.")
+
+        with d2:
+            customer_id = st.text_input("Customer history (customer_id)", value="").strip()
+            if customer_id:
+                history_df = drilldown.customer_history(customer_id)
+                if history_df.empty:
+                    st.warning(f"No MRR history for {customer_id}.")
+                else:
+                    st.line_chart(history_df.set_index("month")["mrr"])
+                    st.dataframe(history_df, use_container_width=True, hide_index=True)
+
+    # What-if: scale one revenue component over a month range and compare
+    with st.expander("What-if scenario"):
+        all_months = list(scenario_engine.months)
+
+        s1, s2 = st.columns(2)
+        event_type = s1.selectbox("Component", options=list(COMPONENT_COLUMNS))
+        month_range = s2.select_slider(
+            "Months",
+            options=all_months,
+            value=(all_months[max(len(all_months) - 3, 0)], all_months[-1]),
+        )
+
+        s3, s4 = st.columns(2)
+        change_pct = s3.slider("Change (%)", min_value=-100, max_value=100, value=0, step=5)
+        growth_pct = s4.number_input("Monthly growth (%)", min_value=-50.0, max_value=50.0, value=0.0, step=0.5)
+
+        scenario_df = scenario_engine.run([
+            Adjustment(
+                event_type=event_type,
+                start_month=month_range[0],
+                end_month=month_range[1],
+                factor=1.0 + change_pct / 100.0,
+                monthly_growth=growth_pct / 100.0,
+            )
+        ])
+        comparison_df = scenario_engine.compare(scenario_df, selected_column)
+        if n_months is not None:
+            comparison_df = comparison_df.tail(n_months)
+
+        b1, b2 = st.columns(2)
+        b1.metric("Baseline (end of window)", fmt(float(comparison_df["baseline"].iloc[-1])))
+        b2.metric(
+            "Scenario (end of window)",
+            fmt(float(comparison_df["scenario"].iloc[-1])),
+            fmt(float(comparison_df["difference"].iloc[-1])),
+        )
+
+        st.line_chart(comparison_df.set_index("month")[["baseline", "scenario"]])
+
+        display_comparison = comparison_df.copy()
+        for col in ("baseline", "scenario", "difference"):
+            display_comparison[col] = display_comparison[col].apply(lambda v: format_metric_value(selected_column, v))
+        st.dataframe(display_comparison, use_container_width=True, hide_index=True)
+
+    # Forecast MRR / churn rate for the company or one segment. Expander bodies run on every
+    # rerun, so the fit over all segments only happens once the user turns it on.
+    with st.expander("Forecast"):
+        if selected_column not in FORECAST_METRICS:
+            st.info("Forecasts are available for MRR and revenue churn rate.")
+        elif not st.toggle("Fit forecasts", key="forecast_enabled"):
+            st.caption("Fits every segment for this dataset; results are cached per data version.")
+        else:
+            f1, f2, f3 = st.columns(3)
+            horizon = f1.slider("Horizon (months)", min_value=3, max_value=12, value=6)
+
+            forecast_df = compute_forecast(dataset.name, data_version, horizon)
+            metric_forecast = forecast_df[forecast_df["metric"] == selected_column]
+
+            dimension = f2.selectbox("Segment by", options=list(metric_forecast["dimension"].unique()))
+            segments = list(metric_forecast.loc[metric_forecast["dimension"] == dimension, "segment"].unique())
+            segment = f3.selectbox("Segment", options=segments)
+
+            segment_df = metric_forecast[
+                (metric_forecast["dimension"] == dimension) & (metric_forecast["segment"] == segment)
+            ]
+            st.line_chart(segment_df.set_index("month")[["forecast", "lower", "upper"]])
+
+            display_forecast = segment_df[["month", "forecast", "lower", "upper"]].copy()
+            for col in ("forecast", "lower", "upper"):
+                display_forecast[col] = display_forecast[col].apply(lambda v: format_metric_value(selected_column, v))
+            st.dataframe(display_forecast, use_container_width=True, hide_index=True)
+            st.caption("Holt linear trend per segment; band is a 95% prediction interval.")
+
     st.markdown("---")
     st.subheader("AI Explanation")
 
@@ -229,16 +343,50 @@ def main() -> None:
     if explain_clicked or summary_clicked:
         try:
             with st.spinner("Thinking..."):
+                # LLM and prompt modules are only needed once a button is pressed
+                from src.llm.client import LLMRequest
+                from src.llm.factory import get_llm_client, get_llm_provider, get_max_concurrency, get_request_options
+                from src.llm.gateway import PRIORITY_INTERACTIVE, get_llm_gateway
+                from src.llm.formatting import cleanup_llm_output, sanitize_markdown
+                from src.llm.prompts import build_metrics_prompt, build_executive_summary_prompt
+                from src.llm.snippets import FACT_SOURCES, explanation_snippet, sync_fact_snippets
+
+                # Memoized: one client per provider configuration for the process
                 client = get_llm_client()
 
                 window_df = metrics_df.copy()
                 if n_months is not None:
                     window_df = window_df.tail(n_months)
 
+                # Ground free-form questions in indexed facts and earlier answers
+                retrieval_index = get_retrieval_index(dataset.name)
+                context_snippets = []
+                if user_question.strip():
+                    sync_fact_snippets(retrieval_index, dataset, data_version)
+                    query = f"{user_question} {selected_label}"
+
+                    # Facts and earlier answers are ranked separately: answers echo the question
+                    fact_hits = retrieval_index.search(
+                        query,
+                        k=RETRIEVAL_TOP_K,
+                        sources=FACT_SOURCES,
+                        min_relative_score=RETRIEVAL_MIN_RELATIVE_SCORE,
+                    )
+                    explanation_hits = retrieval_index.search(
+                        query,
+                        k=RETRIEVAL_TOP_EXPLANATIONS,
+                        sources={"explanation"},
+                        min_relative_score=RETRIEVAL_MIN_RELATIVE_SCORE,
+                    )
+                    context_snippets = [hit.text for hit in fact_hits + explanation_hits]
+
                 if summary_clicked:
                     prompt = build_executive_summary_prompt(
                         window_df=window_df,
                         user_question=user_question,
+                        anomalies=anomalies_df,
+                        data_version=data_version,
+                        context_snippets=context_snippets,
                     )
                 else:
                     prompt = build_metrics_prompt(
@@ -246,24 +394,27 @@ def main() -> None:
                         metric_label=selected_label,
                         metric_col=selected_column,
                         user_question=user_question,
+                        anomalies=anomalies_df,
+                        data_version=data_version,
+                        context_snippets=context_snippets,
                     )
 
                 # Configure LLM
                 provider = get_llm_provider()
-                temperature = 0.2
-                max_tokens = 1200
-
-                if provider == "ollama":
-                    temperature = 0.1
-                    max_tokens = 1000
+                options = get_request_options(provider)
 
-                # Generate response
-                response = client.generate(
+                # Generate through the process-wide gateway: sessions asking the same
+                # question share one call, and the provider's concurrency limit is respected
+                response = get_llm_gateway().generate(
+                    client,
                     LLMRequest(
                         prompt=prompt,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                    )
+                        **options,
+                    ),
+                    provider,
+                    priority=PRIORITY_INTERACTIVE,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    max_concurrency=get_max_concurrency(provider),
                 )
 
                 # Cleanup and display response
@@ -271,12 +422,52 @@ def main() -> None:
                 response = sanitize_markdown(response)
                 st.markdown(response if response else "No response returned by the model.")
 
+                # Index the answer so later questions can refer back to it
+                if response:
+                    retrieval_index.add([
+                        explanation_snippet(
+                            "Executive Summary" if summary_clicked else selected_label,
+                            str(window_df["month"].iloc[0]),
+                            str(window_df["month"].iloc[-1]),
+                            user_question,
+                            response,
+                        )
+                    ])
+                    retrieval_index.save_if_due(EXPLANATION_SAVE_BATCH)
+
             if show_prompt:
                 st.code(prompt)
 
         except Exception as e:
             st.error(f"LLM error: {e}")
 
+    # Per-stage timings collected by src.tracing (loaders, metrics, prompts, LLM calls)
+    with st.expander("Performance"):
+        # Gateway counters exist only once an LLM call imported it; don't import it just to show them
+        llm_stats = sys.modules["src.llm.gateway"].gateway_stats() if "src.llm.gateway" in sys.modules else []
+        if llm_stats:
+            st.caption("LLM gateway (all sessions): queue depth, shared calls and queue wait")
+            st.dataframe(pd.DataFrame(llm_stats), use_container_width=True, hide_index=True)
+
+        if not tracing.is_enabled():
+            st.caption(f"Tracing is off. Set {tracing.TRACE_ENV_VAR}=1 to collect timings.")
+        else:
+            profile = tracing.flat_profile()
+            if profile:
+                st.dataframe(pd.DataFrame(profile), use_container_width=True, hide_index=True)
+            else:
+                st.caption("No spans recorded yet.")
+
+            p1, p2 = st.columns(2)
+            p1.download_button(
+                "Download Chrome trace",
+                data=json.dumps(tracing.chrome_trace()),
+                file_name="trace.json",
+                mime="application/json",
+            )
+            if p2.button("Clear timings"):
+                tracing.clear()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import os
+import time
+from dataclasses import dataclass
+
+# Add project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Modules that must stay out of the dashboard's startup path
+DEFERRED_MODULES = [
+    "src.llm.factory",
+    "src.llm.gateway",
+    "src.llm.prompts",
+    "src.llm.ollama_client",
+    "src.llm.openrouter_client",
+    "src.llm.retrieval",
+    "src.llm.snippets",
+    "tabulate",
+]
+
+# One line of `python -X importtime` output
+@dataclass(frozen=True)
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+# Parse `-X importtime` stderr into records
+def parse_importtime(stderr: str) -> list[ImportRecord]:
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append(
+            ImportRecord(
+                module=name.strip(),
+                self_us=int(self_us.strip()),
+                cumulative_us=int(cumulative_us.strip()),
+                depth=depth,
+            )
+        )
+    return records
+
+# Import a module in a fresh interpreter with -X importtime
+def profile_import(module: str) -> tuple[list[ImportRecord], float]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - started
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    return parse_importtime(result.stderr), wall_seconds
+
+# Total import time (sum over top-level imports)
+def total_import_us(records: list[ImportRecord]) -> int:
+    return sum(r.cumulative_us for r in records if r.depth == 0)
+
+# Flat report: direct dependencies by cumulative time, then the slowest modules
+def format_report(records: list[ImportRecord], wall_seconds: float, top: int) -> str:
+    packages: dict[str, int] = {}
+    for record in records:
+        if record.depth <= 1:
+            package = record.module.split(".")[0]
+            own_us = record.cumulative_us if record.depth == 1 else record.self_us
+            packages[package] = packages.get(package, 0) + own_us
+
+    total_us = total_import_us(records)
+    lines = [
+        f"Interpreter wall time: {wall_seconds * 1000:.0f} ms",
+        f"Total import time:     {total_us / 1000:.0f} ms across {len(records)} modules",
+        "",
+        f"{'package':<32}{'cumulative ms':>14}",
+    ]
+    for package, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+        lines.append(f"{package:<32}{us / 1000:>14.1f}")
+
+    lines += ["", f"{'module (self time)':<48}{'self ms':>10}"]
+    for record in sorted(records, key=lambda r: -r.self_us)[:top]:
+        lines.append(f"{record.module:<48}{record.self_us / 1000:>10.1f}")
+
+    return "\n".join(lines)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Profile dashboard import time (-X importtime).")
+    parser.add_argument("--module", default="src.ui.app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="Best-of-N to reduce noise")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if total import time exceeds this budget")
+    args = parser.parse_args(argv)
+
+    best = None
+    for _ in range(args.runs):
+        records, wall_seconds = profile_import(args.module)
+        total_us = total_import_us(records)
+        if best is None or total_us < best[2]:
+            best = (records, wall_seconds, total_us)
+
+    records, wall_seconds, total_us = best
+    print(format_report(records, wall_seconds, args.top))
+
+    failures = []
+    imported = {r.module for r in records}
+    for module in DEFERRED_MODULES:
+        if module in imported:
+            failures.append(f"{module} is imported at startup (should be deferred)")
+
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        failures.append(f"import time {total_us / 1000:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: deferred modules are not imported at startup")
+
+if __name__ == "__main__":
+    main()